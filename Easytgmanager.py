@@ -1,24 +1,55 @@
 import sys
+import time
+
+# Start of the --profile-startup "import" phase
+_IMPORT_STARTED = time.perf_counter()
+
+import asyncio
 import json
-import base64
 import os
-import time
+import threading
+from collections import OrderedDict
 from datetime import datetime, timedelta
 from PyQt5.QtWidgets import (QApplication, QMainWindow, QTabWidget, QWidget, QVBoxLayout, 
                            QHBoxLayout, QLabel, QPushButton, QLineEdit, QTextEdit, 
                            QComboBox, QTableWidget, QTableWidgetItem, QFileDialog,
                            QMessageBox, QInputDialog, QHeaderView, QSplitter, QFrame,
                            QGroupBox, QFormLayout, QSpinBox, QCheckBox, QStatusBar,
-                           QTreeWidget, QTreeWidgetItem, QDialog, 
+                           QTreeWidget, QTreeWidgetItem, QDialog, QTableView, QAbstractItemView,
                            QVBoxLayout as QVBoxLayoutDialog, QHBoxLayout as QHBoxLayoutDialog,
                            QLabel as QLabelDialog, QLineEdit as QLineEditDialog,
                            QTextEdit as QTextEditDialog, QDialogButtonBox)
-from PyQt5.QtCore import Qt, QTimer, QThread, pyqtSignal, QUrl
+from PyQt5.QtCore import (Qt, QTimer, QThread, QObject, pyqtSignal, QUrl, QAbstractTableModel,
+                          QModelIndex, QSortFilterProxyModel, QEvent)
 from PyQt5.QtGui import QFont, QColor, QPalette, QDesktopServices
-import telebot
-from cryptography.fernet import Fernet
+from easytgbot.aio_runtime import AsyncBotRuntime, AsyncBot
+from easytgbot.control import ControlClient, RemoteBot, control_address, daemon_running
+from easytgbot.core import DEFAULT_CONFIG_FILE, new_bot_data, parse_bots, serialize_bots
+from easytgbot.badwords import BAD_WORDS
+from easytgbot.configwatch import ConfigWatcher
+from easytgbot.dispatch import ChatDispatcher, chat_key, dispatch_options, DEFAULT_WORKERS, DEFAULT_QUEUE_SIZE
+from easytgbot.filters import apply_filter
+from easytgbot.lifecycle import LifecycleController, LifecycleMixin, DRAIN_TIMEOUT, STOP_TIMEOUT, describe
+from easytgbot.messagestore import MessageStore, message_record, message_store_path, PAGE_SIZE
+from easytgbot.metrics import REGISTRY, MetricsHistory, MetricsServer, bot_metrics, percentile
+from easytgbot.logbuffer import (RingBuffer, LogQueue, make_record, format_record, DEFAULT_RETENTION,
+                                 DEFAULT_BATCH_SIZE, DEFAULT_FLUSH_INTERVAL)
+from easytgbot.profiling import PROFILER, no_mark, breakdown, write_collapsed
+from easytgbot.persistence import ConfigWriter, load_json_with_recovery
+from easytgbot.offsets import OffsetStore, offset_store_path, REFETCH_DELAY
+from easytgbot.routing import RoutedBotMixin, ROUTED_CONTENT_TYPES
+from easytgbot.sharding import ShardSupervisor, ShardedBot, default_shard_count
+from easytgbot.sendqueue import SendScheduler, PRIORITY_COMMAND, PRIORITY_AUTO_REPLY
+from easytgbot.spam import SPAM
+from easytgbot.startup import StartupProfile
+from easytgbot.webhook import WebhookServer, public_url, webhook_secret, DEFAULT_HOST, DEFAULT_PORT
+from easytgbot.userdirectory import UserDirectory, user_directory_path, PAGE_SIZE as USER_PAGE_SIZE
+from easytgbot.watchdog import BotHealth, Watchdog
+from easytgbot.transport import TransportConfig, DEFAULT_BASE_URL, configure_transport, active_transport
+
+WEBHOOK_RETRY_DELAY = 30  # seconds before retrying a failed setWebhook
 
-class BotWorker(QThread):
+class BotWorker(LifecycleMixin, RoutedBotMixin, QThread):
     """Thread for running a Telegram bot. Handles polling and emits signals back to the GUI."""
     log_signal = pyqtSignal(str, str)  # (level, message)
     status_signal = pyqtSignal(str, str)  # (bot_name, status)
@@ -35,102 +66,705 @@ class BotWorker(QThread):
         self.auto_replies = {}
         self.message_filters = {}
         self.commands = {}
+        self.send_scheduler = None
+        self.webhook_server = None
+        self.offsets = None  # OffsetStore shared by the app's workers
+        self.dispatch = {}  # "dispatch" entry of the bot's config (pool size, queue length)
+        self.dispatcher = None
+        self.update_log = None
+        self._process_updates = None
+        self.health = BotHealth()  # replaced by the app's Watchdog entry for the bot
+        self._mode_changed = threading.Event()
+        self._polling = False
+
+    def start(self):
+        self.wanted = True
+        self._set_lifecycle("starting")
+        super().start()
+
+    def stop(self):
+        """Ask the bot to stop and return at once; run() drains its handlers, then exits."""
+        self.wanted = False
+        self.running = False
+        if self.lifecycle != "stopped":
+            self._set_lifecycle("stopping")
+        self._mode_changed.set()
+        if self.dispatcher is not None:
+            self.dispatcher.close()  # also releases a poll blocked on a full queue
+        bot = self.bot
+        if bot is not None:
+            bot.stop_polling()
+            if self._polling:
+                # Cut the pending long-poll short instead of waiting out its timeout
+                threading.Thread(target=self._interrupt_poll, args=(bot,), daemon=True).start()
+
+    @staticmethod
+    def _interrupt_poll(bot):
+        # A getUpdates without an offset confirms nothing, and Telegram answers the
+        # other (pending) getUpdates of the token with a 409 conflict right away
+        try:
+            bot.get_updates(limit=1, timeout=10, long_polling_timeout=0)
+        except Exception:
+            pass
 
     def run(self):
         self.running = True
         try:
-            self.bot = telebot.TeleBot(self.token)
+            import telebot  # deferred: only needed once a bot actually starts
+            # Handlers run on the bot's ChatDispatcher, not on TeleBot's own pool
+            self.bot = telebot.TeleBot(self.token, threaded=False)
             self.bot.start_time = datetime.now()
 
-            # Single dynamic handler that checks commands, auto-replies and filters at runtime
-            @self.bot.message_handler(func=lambda message: True)
+            try:
+                self.bot_username = self.bot.get_me().username
+            except Exception:
+                self.bot_username = None
+
+            self._dispatch_updates()
+
+            # Single dynamic handler; the router is looked up per message so config edits apply immediately
+            @self.bot.message_handler(func=lambda message: True, content_types=ROUTED_CONTENT_TYPES)
             def _handle_message(message):
-                try:
-                    text = message.text or ""
-                except Exception:
-                    text = ""
+                self._handle_message(message)
 
-                # Filters
-                for ft, enabled in (self.message_filters or {}).items():
-                    try:
-                        if enabled and self.apply_filter(message, ft):
-                            self.log_signal.emit("filtered", f"[{self.bot_name}] Message filtered: {ft} from {getattr(message.from_user, 'id', 'unknown')}")
-                            return
-                    except Exception:
-                        continue
-
-                # Commands
-                if text.startswith('/'):
-                    cmd = text.split()[0].lstrip('/')
-                    resp = (self.commands or {}).get(cmd)
-                    if resp:
-                        self.log_signal.emit("command", f"[{self.bot_name}] Command /{cmd} from {getattr(message.from_user, 'id', 'unknown')}")
-                        try:
-                            self.bot.reply_to(message, resp)
-                        except Exception as e:
-                            self.log_signal.emit("error", f"[{self.bot_name}] Failed to reply to command /{cmd}: {e}")
-                        return
-
-                # Auto-replies
-                for trig, resp in (self.auto_replies or {}).items():
-                    try:
-                        if trig and trig.lower() in text.lower():
-                            self.log_signal.emit("auto_reply", f"[{self.bot_name}] Auto-reply triggered for '{trig}' from {getattr(message.from_user, 'id', 'unknown')}")
-                            try:
-                                self.bot.reply_to(message, resp)
-                            except Exception as e:
-                                self.log_signal.emit("error", f"[{self.bot_name}] Failed to send auto-reply for '{trig}': {e}")
-                            return
-                    except Exception:
-                        continue
-
-                # Default: emit message log
-                try:
-                    self.log_signal.emit("message", f"[{self.bot_name}] From {getattr(message.from_user, 'id', 'unknown')}: {text[:200]}")
-                except Exception:
-                    pass
+            if not self.running:
+                return  # stopped while connecting
+            self.status_signal.emit(self.bot_name, "Online")
+            self._set_lifecycle("online")
 
-            # Webhook handling: if webhook_url is set, configure webhook, otherwise ensure polling
-            if self.webhook_url:
-                try:
-                    self.bot.remove_webhook()
-                    self.bot.set_webhook(url=self.webhook_url)
-                    self.log_signal.emit("info", f"[{self.bot_name}] Webhook set to {self.webhook_url}")
-                except Exception as e:
-                    self.log_signal.emit("error", f"[{self.bot_name}] Failed to set webhook: {e}")
-            else:
+            # Webhook handling: if webhook_url is set, receive updates on the embedded
+            # webhook server, otherwise poll. apply_webhook() switches between the two.
+            while self.running:
+                if self.webhook_url and self.webhook_server is not None:
+                    self._serve_webhook()
+                    continue
+                if self.webhook_url:
+                    self.log_signal.emit("error", f"[{self.bot_name}] No webhook server available, falling back to polling")
                 try:
                     self.bot.remove_webhook()
                 except Exception:
                     pass
-
-            self.status_signal.emit(self.bot_name, "Online")
-            self.bot.polling(none_stop=True)
+                self._polling = True
+                self.health.set_polling(True)
+                try:
+                    self.bot.polling(none_stop=True)
+                finally:
+                    self._polling = False
+                    self.health.set_polling(False)
+                if not self.webhook_url:
+                    break
 
         except Exception as e:
             self.log_signal.emit("error", f"[{self.bot_name}] Error: {str(e)}")
-            self.status_signal.emit(self.bot_name, "Offline")
         finally:
             self.running = False
+            self._drain()
+            self.status_signal.emit(self.bot_name, "Offline")
+            self._set_lifecycle("stopped")
+
+    def _dispatch_updates(self):
+        """Route TeleBot's updates through the bot's ChatDispatcher: handlers keep their order
+        within a chat and run in parallel across chats. Updates are claimed in the bot's
+        UpdateLog first, so ones handled before (by this worker or an earlier one) are skipped."""
+        bot = self.bot
+        workers, queue_size = dispatch_options(self.dispatch)
+        self.dispatcher = ChatDispatcher(workers, queue_size, name=self.bot_name, on_error=self._handler_failed)
+        self.update_log = self.offsets.log(self.token) if self.offsets is not None else None
+        self._process_updates = bot.process_new_updates
+        get_updates = bot.get_updates
+
+        def get_updates_after_handled(*args, **kwargs):
+            # TeleBot polls from last_update_id + 1, which its handlers move past updates still
+            # running. Poll after the last handled update instead, also when coming back from
+            # webhook mode: Telegram then keeps what is not handled yet, and claim() skips the
+            # ones that are running.
+            update_log = self.update_log
+            if update_log is None or "offset" not in kwargs:
+                return get_updates(*args, **kwargs)  # e.g. _interrupt_poll, which confirms nothing
+            offset = kwargs["offset"] = update_log.resume_offset()
+            updates = get_updates(*args, **kwargs)
+            update_log.polled(offset, [update.update_id for update in updates])
+            return updates
+
+        def process_new_updates(updates):
+            self.health.polled()  # called after every getUpdates that returned
+            update_log = self.update_log
+            highest = update_log.highest if update_log is not None else None
+            for update in updates:
+                # Waits while the queue is full, holding back the next poll
+                if not self._submit(update):
+                    return  # stopping
+            if updates and highest is not None and update_log.highest == highest:
+                # Nothing new, only updates still running: give their handlers time
+                time.sleep(REFETCH_DELAY)
+
+        bot.get_updates = get_updates_after_handled
+        bot.process_new_updates = process_new_updates
+
+    def _submit(self, update, block=True):
+        """Queue one update; False if the queue is full (and ``block`` is false) or the bot is stopping."""
+        update_log = self.update_log
+        if update_log is not None and not update_log.claim(update.update_id):
+            return True
+        if self.dispatcher.put(chat_key(update), self._run_update, update, block=block):
+            self.health.polled()
+            return True
+        if update_log is not None:
+            update_log.release(update.update_id)
+        return False
+
+    def _run_update(self, update):
+        try:
+            self._process_updates([update])
+        finally:
+            if self.update_log is not None:
+                self.update_log.done(update.update_id)
+            # Handled updates count as progress while a full queue holds up polling
+            self.health.polled()
+
+    def _handler_failed(self, e):
+        self.log_signal.emit("error", f"[{self.bot_name}] Handler error: {e}")
+
+    def _drain(self):
+        """Let the dispatcher finish the updates already received, then end its threads."""
+        dispatcher = self.dispatcher
+        if dispatcher is None:
+            return
+        dispatcher.close()
+        for (update,) in dispatcher.join(DRAIN_TIMEOUT):
+            if self.update_log is not None:
+                self.update_log.release(update.update_id)  # not handled: the next poll fetches it again
+
+    def _handle_message(self, message):
+        started = time.perf_counter()
+        timer = PROFILER.begin()
+        mark = timer.mark if timer is not None else no_mark
+        route = self.router.route(message, self.bot_username, timer, self.bot_name)
+        user_id = getattr(message.from_user, 'id', 'unknown')
+        try:
+            if route.kind == "filtered":
+                self.log_signal.emit("filtered", f"[{self.bot_name}] Message filtered: {route.key} from {user_id}")
+                mark("handler;log_emit")
+                return
+
+            if route.kind == "command":
+                self.log_signal.emit("command", f"[{self.bot_name}] Command /{route.key} from {user_id}")
+                mark("handler;log_emit")
+                self.send_reply(message, route.response, PRIORITY_COMMAND,
+                                f"Failed to reply to command /{route.key}")
+                mark("handler;reply")
+                return
+
+            if route.kind == "auto_reply":
+                self.log_signal.emit("auto_reply", f"[{self.bot_name}] Auto-reply triggered for '{route.key}' from {user_id}")
+                mark("handler;log_emit")
+                self.send_reply(message, route.response, PRIORITY_AUTO_REPLY,
+                                f"Failed to send auto-reply for '{route.key}'")
+                mark("handler;reply")
+                return
+
+            # Default: emit message log
+            text = getattr(message, "text", None) or ""
+            self.log_signal.emit("message", f"[{self.bot_name}] From {user_id}: {text[:200]}")
+            mark("handler;log_emit")
+        finally:
+            self.message_signal.emit(self.bot_name, message_record(message, route.kind))
+            bot_metrics(self.bot_name).observe(route.kind, time.perf_counter() - started)
+            PROFILER.commit(self.bot_name, timer)
 
     def apply_filter(self, message, filter_type):
-        # Implement different filter types
+        return apply_filter(message, filter_type)
+
+    def send_reply(self, message, text, priority, error_text):
+        """Queue a reply on the shared send scheduler so the handler never waits on the network."""
+        def on_error(e):
+            self.log_signal.emit("error", f"[{self.bot_name}] {error_text}: {e}")
+
+        bot = self.bot
+        if self.send_scheduler is None:
+            try:
+                bot.reply_to(message, text)
+            except Exception as e:
+                bot_metrics(self.bot_name).send_errors.inc()
+                on_error(e)
+            return
+        self.send_scheduler.submit(self.bot_name, message.chat.id, lambda: bot.reply_to(message, text),
+                                   priority, blocking=True, on_error=on_error)
+
+    def _serve_webhook(self):
+        url = self.webhook_url
+        self._mode_changed.clear()
         try:
-            text = message.text or ""
-        except Exception:
-            text = ""
-
-        if filter_type == "spam":
-            # Simple spam filter - block messages with too many URLs
-            url_count = text.count("http")
-            return url_count > 3
-        elif filter_type == "bad_words":
-            # Bad words filter
-            bad_words = ["badword1", "badword2", "badword3"]
-            for w in bad_words:
-                if w in text.lower():
-                    return True
-        return False
+            self.webhook_server.register(self.bot_name, self.token, self._dispatch_update)
+            self.webhook_server.start()
+            self.bot.remove_webhook()
+            self.bot.set_webhook(url=public_url(url, self.token), secret_token=webhook_secret(self.token))
+            self.log_signal.emit("info", f"[{self.bot_name}] Webhook set to {url}")
+        except Exception as e:
+            self.webhook_server.unregister(self.token)
+            self.log_signal.emit("error", f"[{self.bot_name}] Failed to set webhook: {e}")
+            self._mode_changed.wait(WEBHOOK_RETRY_DELAY)
+            return
+        while self.running and self.webhook_url == url:
+            self._mode_changed.wait(1)
+        self.webhook_server.unregister(self.token)
+
+    def _dispatch_update(self, update):
+        # Called on the webhook server loop; goes through the UpdateLog, so webhook
+        # retries are handled once. A full queue is waited out on an executor thread,
+        # which holds Telegram's next delivery until the handlers catch up.
+        from telebot import types
+        update = types.Update.de_json(update)
+        if self._submit(update, block=False):
+            return True
+        if self.dispatcher.closed:
+            return False
+        return asyncio.get_running_loop().run_in_executor(None, self._submit, update)
+
+    def apply_webhook(self, url):
+        if self.bot is None:
+            return
+        if url:
+            # Leave the polling loop (or re-register with the new URL)
+            self.bot.stop_polling()
+        # run() notices the new webhook_url; it removes the webhook itself before polling again
+        self._mode_changed.set()
+
+class WorkerSignals(QObject):
+    """Signals for bots hosted on the shared async runtime, delivered to the GUI thread."""
+    log_signal = pyqtSignal(str, str)  # (level, message)
+    status_signal = pyqtSignal(str, str)  # (bot_name, status)
+    message_signal = pyqtSignal(str, dict)  # (bot_name, message_data)
+
+class LogTableModel(QAbstractTableModel):
+    """Table model over a fixed-capacity ring buffer of LogRecords; views only fetch visible rows."""
+    COLUMNS = ["Time", "Type", "Bot", "User", "Message"]
+    FIELDS = ["time", "level", "bot", "user", "message"]
+
+    def __init__(self, capacity=DEFAULT_RETENTION, parent=None):
+        super().__init__(parent)
+        self.buffer = RingBuffer(capacity)
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.buffer)
+
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.COLUMNS)
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid():
+            return None
+        record = self.buffer[index.row()]
+        if role == Qt.DisplayRole:
+            return getattr(record, self.FIELDS[index.column()])
+        if role == Qt.ToolTipRole and index.column() == 4:
+            return record.message
+        if role == Qt.ForegroundRole and record.level == "error":
+            return QColor("#ff6b6b")
+        return None
+
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        if role == Qt.DisplayRole and orientation == Qt.Horizontal:
+            return self.COLUMNS[section]
+        return None
+
+    def append_records(self, records):
+        if not records:
+            return
+        records = records[-self.buffer.capacity:]
+        evicted = self.buffer.overflow(len(records))
+        if evicted:
+            # Evict before inserting so attached proxies see consistent row numbers
+            self.beginRemoveRows(QModelIndex(), 0, evicted - 1)
+            self.buffer.drop_oldest(evicted)
+            self.endRemoveRows()
+        first = len(self.buffer)
+        self.beginInsertRows(QModelIndex(), first, first + len(records) - 1)
+        self.buffer.extend(records)
+        self.endInsertRows()
+
+    def set_capacity(self, capacity):
+        self.beginResetModel()
+        self.buffer.resize(capacity)
+        self.endResetModel()
+
+    def clear(self):
+        self.beginResetModel()
+        self.buffer.clear()
+        self.endResetModel()
+
+class MessageHistoryModel(QAbstractTableModel):
+    """Message history read from the MessageStore one page at a time; the view asks
+    for the next page (fetchMore) only when it scrolls to the bottom."""
+    COLUMNS = ["Time", "Bot", "Chat", "User", "Type", "Message"]
+    TEXT_COLUMN = 5
+
+    def __init__(self, store, parent=None):
+        super().__init__(parent)
+        self.store = store
+        self.filters = {}
+        self.rows = []
+        self.exhausted = True
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.rows)
+
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.COLUMNS)
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid():
+            return None
+        _, bot, chat_id, user_id, _, date, kind, text = self.rows[index.row()]
+        if role == Qt.DisplayRole:
+            column = index.column()
+            if column == 0:
+                return datetime.fromtimestamp(date).strftime("%Y-%m-%d %H:%M:%S")
+            if column == self.TEXT_COLUMN:
+                return (text or "").replace("\n", " ")[:200]
+            return (None, bot, chat_id, user_id, kind)[column]
+        if role == Qt.ToolTipRole and index.column() == self.TEXT_COLUMN:
+            return text
+        return None
+
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        if role == Qt.DisplayRole and orientation == Qt.Horizontal:
+            return self.COLUMNS[section]
+        return None
+
+    def search(self, bot_name=None, chat_id=None, user_id=None):
+        """Start over from the newest message matching the filters."""
+        self.beginResetModel()
+        self.filters = {"bot_name": bot_name, "chat_id": chat_id, "user_id": user_id}
+        self.rows = self.store.query(limit=PAGE_SIZE, **self.filters)
+        self.exhausted = len(self.rows) < PAGE_SIZE
+        self.endResetModel()
+
+    def canFetchMore(self, parent=QModelIndex()):
+        return not parent.isValid() and not self.exhausted
+
+    def fetchMore(self, parent=QModelIndex()):
+        if parent.isValid() or self.exhausted or not self.rows:
+            return
+        last = self.rows[-1]
+        page = self.store.query(before=(last[5], last[0]), limit=PAGE_SIZE, **self.filters)
+        self.exhausted = len(page) < PAGE_SIZE
+        if page:
+            self.beginInsertRows(QModelIndex(), len(self.rows), len(self.rows) + len(page) - 1)
+            self.rows.extend(page)
+            self.endInsertRows()
+
+class UserTableModel(QAbstractTableModel):
+    """Virtualized view of the UserDirectory: rowCount comes from a COUNT query and
+    rows are loaded a page at a time when the view first paints them."""
+    COLUMNS = ["ID", "Username", "First Name", "Last Name", "Bots", "Messages", "Last Seen"]
+    MAX_PAGES = 32  # pages kept in memory
+
+    def __init__(self, directory, parent=None):
+        super().__init__(parent)
+        self.directory = directory
+        self.search = ""
+        self.total = 0
+        self.generation = None
+        self.pages = OrderedDict()  # page number -> rows
+        self.page_ends = {}  # page number -> sort key of its last row, to continue without an OFFSET
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else self.total
+
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.COLUMNS)
+
+    def row(self, number):
+        page_number, offset = divmod(number, USER_PAGE_SIZE)
+        page = self.pages.get(page_number)
+        if page is None:
+            after = self.page_ends.get(page_number - 1)
+            if after is not None:
+                page = self.directory.page(self.search, after=after)
+            else:
+                page = self.directory.page(self.search, offset=page_number * USER_PAGE_SIZE)
+            if page:
+                self.page_ends[page_number] = page[-1][0]
+            self.pages[page_number] = page
+            while len(self.pages) > self.MAX_PAGES:
+                self.pages.popitem(last=False)
+        else:
+            self.pages.move_to_end(page_number)
+        return page[offset] if offset < len(page) else None
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid() or role not in (Qt.DisplayRole, Qt.ToolTipRole):
+            return None
+        row = self.row(index.row())
+        if row is None:
+            return None
+        _, user_id, username, first_name, last_name, messages, last_seen, bots = row
+        column = index.column()
+        if column == 1:
+            return f"@{username}" if username else ""
+        if column == 6:
+            return datetime.fromtimestamp(last_seen).strftime("%Y-%m-%d %H:%M") if last_seen else "never"
+        return (user_id, None, first_name, last_name, bots, messages)[column]
+
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        if role == Qt.DisplayRole and orientation == Qt.Horizontal:
+            return self.COLUMNS[section]
+        return None
+
+    def user_id(self, number):
+        row = self.row(number)
+        return row[1] if row is not None else None
+
+    def set_search(self, text):
+        self.beginResetModel()
+        self.search = text
+        self.total = self.directory.count(text)
+        self.generation = self.directory.generation
+        self.pages.clear()
+        self.page_ends.clear()
+        self.endResetModel()
+
+    def refresh(self):
+        """Reload after the directory changed, keeping the view's scroll position."""
+        if self.generation == self.directory.generation:
+            return
+        self.generation = self.directory.generation
+        self.pages.clear()
+        self.page_ends.clear()
+        total = self.directory.count(self.search)
+        if total > self.total:
+            self.beginInsertRows(QModelIndex(), self.total, total - 1)
+            self.total = total
+            self.endInsertRows()
+        elif total < self.total:
+            self.beginRemoveRows(QModelIndex(), total, self.total - 1)
+            self.total = total
+            self.endRemoveRows()
+        if total:
+            # Only the visible rows are re-read
+            self.dataChanged.emit(self.index(0, 0), self.index(total - 1, len(self.COLUMNS) - 1))
+
+class BotTableModel(QAbstractTableModel):
+    """Bot profiles table. refresh() diffs against what the view last saw and only
+    signals the rows and cells that changed; uptime is formatted on demand, so
+    only visible rows pay for it."""
+    COLUMNS = ["Name", "Status", "Uptime", "Token", "Admin ID", "Webhook", "Queue", "Send Latency",
+               "Updates/s", "Handler p99", "Activity"]
+    STATUS_COLUMN = 1
+    UPTIME_COLUMN = 2
+    QUEUE_COLUMN = 6
+    ACTIVITY_COLUMN = 10
+
+    def __init__(self, app):
+        super().__init__(app)
+        self.app = app
+        self.names = []
+        self.rows = []  # per-row tuple of the cell texts (uptime excluded)
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.names)
+
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.COLUMNS)
+
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        if role == Qt.DisplayRole and orientation == Qt.Horizontal:
+            return self.COLUMNS[section]
+        return None
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid():
+            return None
+        name = self.names[index.row()]
+        if role == Qt.DisplayRole:
+            if index.column() == self.UPTIME_COLUMN:
+                return self.uptime(self.app.bots.get(name, {}))
+            return self.rows[index.row()][index.column()]
+        if role == Qt.ToolTipRole and index.column() == self.STATUS_COLUMN:
+            lines = []
+            health = self.app.watchdog.health.get(name)
+            if health is not None:
+                lines.append(health.describe())
+            transition = self.app.lifecycle.transitions.get(name)
+            if transition is not None:
+                lines.append(describe(transition))
+            return "\n".join(lines) or None
+        if role == Qt.ToolTipRole and index.column() == self.QUEUE_COLUMN:
+            stats = self.app.send_scheduler.stats(name)
+            if stats is not None:
+                return f"Sent: {stats.sent}  Failed: {stats.failed}  Rate limited (429): {stats.rate_limited}"
+        if role == Qt.ToolTipRole and index.column() == self.ACTIVITY_COLUMN:
+            metrics = self.app.metrics_history.snapshots.get(name)
+            if metrics is not None:
+                return (f"Updates: {metrics['updates_received']}  Filtered: {metrics['updates_filtered']}  "
+                        f"Commands: {metrics['commands']}  Auto-replies: {metrics['auto_replies']}\n"
+                        f"Send errors: {metrics['send_errors']}  Rate limited (429): {metrics['rate_limited']}")
+        return None
+
+    @staticmethod
+    def uptime(bot):
+        start_time = bot.get("start_time")
+        if bot.get("status") == "Online" and start_time:
+            try:
+                return str(datetime.now() - start_time).split('.')[0]
+            except Exception:
+                pass
+        return "0:00:00"
+
+    def row_values(self, name, bot):
+        # Mask token
+        token = bot.get("token", "")
+        masked_token = token[:4] + "****" + token[-4:] if len(token) >= 8 else token
+
+        # Outbound queue metrics
+        stats = self.app.send_scheduler.stats(name)
+        if stats is not None:
+            queue, latency = str(stats.depth + stats.in_flight), f"{stats.avg_latency * 1000:.0f} ms"
+        else:
+            queue, latency = "0", "-"
+
+        # Handler metrics, as of the last refresh tick
+        history = self.app.metrics_history
+        metrics = history.snapshots.get(name)
+        p99 = percentile(metrics["handler_latency"], 99) if metrics is not None else None
+        handler_p99 = f"{p99 * 1000:.1f} ms" if p99 is not None else "-"
+
+        # Problems found by the watchdog show next to the status
+        status = bot.get("status", "Offline")
+        health = self.app.watchdog.health.get(name)
+        if health is not None and health.state in ("degraded", "stalled", "crashed"):
+            status = f"{status} ({health.state})"
+
+        return (name, status, None, masked_token, str(bot.get("admin_id", "")),
+                bot.get("webhook_url") or "None", queue, latency,
+                f"{history.rate(name):.1f}", handler_p99, history.sparkline(name))
+
+    def refresh(self):
+        """Sync with app.bots; returns True if bots were added or removed."""
+        names = list(self.app.bots)
+        structure_changed = names != self.names
+        if structure_changed:
+            self._sync_rows(names)
+
+        new_rows = [self.row_values(name, self.app.bots[name]) for name in names]
+        for row, (old, new) in enumerate(zip(self.rows, new_rows)):
+            if old != new:
+                changed = [col for col in range(len(new)) if old[col] != new[col]]
+                self.rows[row] = new
+                self.dataChanged.emit(self.index(row, changed[0]), self.index(row, changed[-1]))
+
+        self.refresh_uptime()
+        return structure_changed
+
+    def refresh_uptime(self):
+        # One signal for the whole uptime column; views only re-query visible cells
+        if self.names:
+            self.dataChanged.emit(self.index(0, self.UPTIME_COLUMN), self.index(len(self.names) - 1, self.UPTIME_COLUMN))
+
+    def _sync_rows(self, names):
+        wanted = set(names)
+        for row in range(len(self.names) - 1, -1, -1):
+            if self.names[row] not in wanted:
+                self.beginRemoveRows(QModelIndex(), row, row)
+                del self.names[row]
+                del self.rows[row]
+                self.endRemoveRows()
+        if self.names == names[:len(self.names)]:
+            if len(names) > len(self.names):
+                first = len(self.names)
+                self.beginInsertRows(QModelIndex(), first, len(names) - 1)
+                for name in names[first:]:
+                    self.names.append(name)
+                    self.rows.append(self.row_values(name, self.app.bots[name]))
+                self.endInsertRows()
+        else:
+            # Reordered (e.g. a restored config): start over
+            self.beginResetModel()
+            self.names = list(names)
+            self.rows = [self.row_values(name, self.app.bots[name]) for name in names]
+            self.endResetModel()
+
+class RefreshScheduler(QObject):
+    """Periodic UI refresh at the configured update interval.
+
+    Ticks back off while the window is hidden or minimized, and a tick only
+    re-diffs the bot table when something marked it dirty; otherwise it just
+    advances the uptime column. The cost of each rendering tick is measured.
+    """
+    BACKGROUND_FACTOR = 5
+    MAX_BACKGROUND_INTERVAL = 60000  # ms
+
+    def __init__(self, window, interval_ms):
+        super().__init__(window)
+        self.window = window
+        self.interval = interval_ms
+        self.dirty = True
+        self.ticks = 0
+        self.skipped = 0
+        self.last_cost = 0.0  # seconds
+        self.avg_cost = 0.0
+        self.max_cost = 0.0
+        self.timer = QTimer(self)
+        self.timer.timeout.connect(self.tick)
+
+    def start(self):
+        self.timer.start(self.interval)
+
+    def set_interval(self, interval_ms):
+        self.interval = interval_ms
+        self.timer.setInterval(self.current_interval())
+
+    def mark_dirty(self):
+        self.dirty = True
+
+    def in_background(self):
+        return not self.window.isVisible() or self.window.isMinimized()
+
+    def current_interval(self):
+        if self.in_background():
+            return min(self.interval * self.BACKGROUND_FACTOR, max(self.interval, self.MAX_BACKGROUND_INTERVAL))
+        return self.interval
+
+    def wake(self):
+        """Refresh right away and resume the normal interval (e.g. when the window is restored)."""
+        self.timer.setInterval(self.current_interval())
+        self.tick()
+
+    def tick(self):
+        interval = self.current_interval()
+        if self.timer.interval() != interval:
+            self.timer.setInterval(interval)
+
+        self.window.check_bot_status()
+        if self.in_background():
+            self.skipped += 1
+            return
+
+        start = time.perf_counter()
+        self.window.refresh_views(self.dirty)
+        self.dirty = False
+        self.last_cost = time.perf_counter() - start
+        self.max_cost = max(self.max_cost, self.last_cost)
+        self.avg_cost = self.last_cost if not self.ticks else self.avg_cost * 0.9 + self.last_cost * 0.1
+        self.ticks += 1
+        self.window.show_refresh_cost(self)
+
+class LogFilterProxy(QSortFilterProxyModel):
+    """Shows only records whose level is in ``levels`` (None shows everything)."""
+
+    def __init__(self, levels=None, parent=None):
+        super().__init__(parent)
+        self.levels = levels
+
+    def set_levels(self, levels):
+        self.levels = levels
+        self.invalidateFilter()
+
+    def filterAcceptsRow(self, source_row, source_parent):
+        if self.levels is None:
+            return True
+        return self.sourceModel().buffer[source_row].level in self.levels
 
 class DarkDialog(QDialog):
     def __init__(self, title, parent=None):
@@ -327,9 +961,121 @@ class DeleteBotDialog(DarkDialog):
     def get_confirmation(self):
         return self.result() == QDialog.Accepted
 
+class UserDialog(DarkDialog):
+    def __init__(self, title, parent=None):
+        super().__init__(title, parent)
+        
+        layout = QVBoxLayout(self)
+        
+        self.user_id_input = QLineEdit()
+        self.user_id_input.setPlaceholderText("Telegram User ID")
+        layout.addWidget(QLabel("User ID:"))
+        layout.addWidget(self.user_id_input)
+        
+        self.username_input = QLineEdit()
+        self.username_input.setPlaceholderText("Username (without @)")
+        layout.addWidget(QLabel("Username:"))
+        layout.addWidget(self.username_input)
+        
+        self.first_name_input = QLineEdit()
+        self.first_name_input.setPlaceholderText("First Name")
+        layout.addWidget(QLabel("First Name:"))
+        layout.addWidget(self.first_name_input)
+        
+        self.last_name_input = QLineEdit()
+        self.last_name_input.setPlaceholderText("Last Name")
+        layout.addWidget(QLabel("Last Name:"))
+        layout.addWidget(self.last_name_input)
+        
+        buttons = QDialogButtonBox(QDialogButtonBox.Ok | QDialogButtonBox.Cancel)
+        buttons.accepted.connect(self.accept)
+        buttons.rejected.connect(self.reject)
+        layout.addWidget(buttons)
+        
+    def set_user_data(self, user_id, user):
+        self.user_id_input.setText(str(user_id))
+        self.user_id_input.setReadOnly(True)
+        self.username_input.setText(user.get("username") or "")
+        self.first_name_input.setText(user.get("first_name") or "")
+        self.last_name_input.setText(user.get("last_name") or "")
+        
+    def get_user_data(self):
+        user_id_text = self.user_id_input.text().strip()
+        try:
+            user_id = int(user_id_text)
+        except ValueError:
+            QMessageBox.warning(self, "Validation Error", "User ID must be a valid number!")
+            return None
+        return {
+            "user_id": user_id,
+            "username": self.username_input.text().strip().lstrip("@"),
+            "first_name": self.first_name_input.text().strip(),
+            "last_name": self.last_name_input.text().strip()
+        }
+
+class StageBreakdownDialog(DarkDialog):
+    """Per-bot, per-stage handler timings collected by the stage profiler."""
+    def __init__(self, parent=None):
+        super().__init__("Stage Breakdown", parent)
+        self.setModal(False)
+        self.resize(700, 450)
+        
+        layout = QVBoxLayout(self)
+        self.summary_label = QLabel()
+        layout.addWidget(self.summary_label)
+        
+        self.tree = QTreeWidget()
+        self.tree.setHeaderLabels(["Bot / Stage", "Samples", "Avg (ms)", "Share of handler"])
+        layout.addWidget(self.tree)
+        
+        buttons = QDialogButtonBox(QDialogButtonBox.Close)
+        refresh_btn = buttons.addButton("Refresh", QDialogButtonBox.ActionRole)
+        refresh_btn.clicked.connect(self.refresh)
+        buttons.rejected.connect(self.reject)
+        layout.addWidget(buttons)
+        self.refresh()
+        
+    def refresh(self):
+        totals = PROFILER.export()
+        rate = PROFILER.sample_rate
+        self.summary_label.setText(f"Sampling {rate:.0%} of messages" if rate else
+                                   "Profiling is off; choose a sample rate in Settings > Profiling")
+        self.tree.clear()
+        for bot_name in sorted(totals):
+            bot_item = QTreeWidgetItem([bot_name])
+            for stage, samples, avg, share in breakdown(totals[bot_name]):
+                bot_item.addChild(QTreeWidgetItem([stage, str(samples), f"{avg * 1000:.3f}",
+                                                   f"{share:.1%}" if share is not None else ""]))
+            self.tree.addTopLevelItem(bot_item)
+            bot_item.setExpanded(True)
+        for column in range(4):
+            self.tree.resizeColumnToContents(column)
+
 class BotManagerApp(QMainWindow):
-    def __init__(self):
+    # Log levels shown in "Recent Messages" and per activity filter
+    MESSAGE_LEVELS = {"message", "command", "auto_reply", "filtered"}
+    LOG_FILTERS = {
+        "All": None,
+        "Errors": {"error"},
+        "Messages": {"message"},
+        "Commands": {"command"},
+        "Auto-replies": {"auto_reply"},
+        "Filtered": {"filtered"},
+    }
+    # Choices of the profiler sample rate
+    PROFILE_RATES = [("Off", 0.0), ("1%", 0.01), ("10%", 0.1), ("All", 1.0)]
+    # Emitted from the background thread that installs the HTTP transport
+    transport_ready = pyqtSignal()
+    # Emitted from the watchdog thread for a stalled or crashed bot
+    restart_requested = pyqtSignal(str)
+    # Emitted from the config watcher thread with (config, ConfigDiff) after bots.easytg was edited
+    config_changed = pyqtSignal(object, object)
+    # Emitted once the local workers let go of their tokens, with (names to start on the daemon, all stopped)
+    local_bots_stopped = pyqtSignal(list, bool)
+
+    def __init__(self, startup_profile=None):
         super().__init__()
+        self.startup_profile = startup_profile or StartupProfile()
         self.setWindowTitle("Telegram Bot Manager Pro")
         
         # Set dark theme - comprehensive styling
@@ -454,16 +1200,110 @@ class BotManagerApp(QMainWindow):
         # Initialize data
         self.bots = {}
         self.bot_workers = {}
-        self.config_file = "bots.easytg"
+        self.config_file = DEFAULT_CONFIG_FILE
+        # "thread" runs one BotWorker QThread per bot, "async" hosts every bot on one event loop,
+        # "process" spreads the bots over shard processes
+        self.runtime_mode = "thread"
+        self.shard_count = default_shard_count()
+        self.shard_supervisor = None
+        # Set while attached to a headless daemon (python -m easytgbot) that runs the bots
+        self.daemon_client = None
+        self.async_runtime = AsyncBotRuntime()
+        self.transport = TransportConfig()
+        # Worker log lines are queued here and moved to the log view in batches
+        self.log_queue = LogQueue()
+        # Bulk start/stop/restart run here, off the GUI thread
+        self.lifecycle = LifecycleController(on_log=self.log_queue.put)
+        # Probes the bots' health off the GUI thread and asks for restarts of stuck ones
+        self.watchdog = Watchdog(self.async_runtime, self.watched_workers, self.restart_requested.emit,
+                                 on_log=self.log_queue.put)
+        self.send_scheduler = SendScheduler(self.async_runtime)
+        self.webhook_server = WebhookServer(self.async_runtime)
+        # Per-bot counters and latency histograms: sampled for the bot table, optionally served on /metrics
+        self.metrics_history = MetricsHistory()
+        self.metrics_server = MetricsServer(REGISTRY)
+        # Every routed message is queued here and written to SQLite in batches
+        self.message_store = MessageStore(
+            message_store_path(self.config_file),
+            on_error=lambda e: self.log_queue.put("error", f"Message history: {e}"))
+        # Last handled update per bot, so restarts resume without replaying or dropping updates
+        self.offset_store = OffsetStore(
+            offset_store_path(self.config_file),
+            on_error=lambda e: self.log_queue.put("error", f"Update offsets: {e}"))
+        # Word lists compile in the background; unreadable list files are reported here
+        BAD_WORDS.on_error = lambda bot_name, message: self.log_queue.put("error", f"[{bot_name}] {message}")
+        # Senders of those messages, coalesced into one row per user
+        self.user_directory = UserDirectory(
+            user_directory_path(self.config_file),
+            on_error=lambda e: self.log_queue.put("error", f"User directory: {e}"))
+        # Saves are debounced and written atomically off the GUI thread
+        self.config_writer = ConfigWriter(
+            on_error=lambda filename, e: self.log_queue.put("error", f"Failed to save {filename}: {e}"))
+        # Edits to the config file made outside the app are parsed and diffed off the GUI thread
+        self.config_watcher = ConfigWatcher(self.config_file, self.config_changed.emit,
+                                            on_error=lambda message: self.log_queue.put("error", message))
+        self.config_writer.on_write = self.config_watcher.written
+        
+        # Saved bots are started from the event loop, i.e. after the window is shown
+        self.startup_done = False
+        self.pending_starts = []
         
         # Setup UI
-        self.setup_ui()
+        with self.startup_profile.phase("widget construction"):
+            self.setup_ui()
         
         # Load configuration
         self.load_config()
         
         # Setup timers
         self.setup_timers()
+        self.transport_ready.connect(self.start_workers)
+        self.restart_requested.connect(self.restart_bot)
+        self.config_changed.connect(self.apply_config)
+        self.local_bots_stopped.connect(self.finish_attach_daemon)
+        QTimer.singleShot(0, self.start_pending_bots)
+        
+    def apply_transport(self):
+        # Install the shared HTTP transport before any bot makes a request
+        if active_transport() is None or self.transport.to_settings() != active_transport().to_settings():
+            configure_transport(self.transport)
+            
+    def start_pending_bots(self):
+        self.startup_done = True
+        self.startup_profile.milestone("event loop running")
+        # Importing the HTTP stack and building the pools takes a few hundred ms; keep it off the GUI thread
+        threading.Thread(target=self._install_transport, name="easytg-transport", daemon=True).start()
+        
+    def _install_transport(self):
+        with self.startup_profile.phase("transport setup (background)"):
+            self.apply_transport()
+        self.transport_ready.emit()
+        self.watchdog.start()
+        self.config_watcher.start()
+        
+    def start_workers(self):
+        pending, self.pending_starts = self.pending_starts, []
+        with self.startup_profile.phase("worker start"):
+            for name in pending:
+                worker = self.bot_workers.get(name)
+                if worker is None:
+                    continue
+                try:
+                    worker.start()
+                except RuntimeError:
+                    # Thread already started or unable to start; log and continue
+                    self.add_log("error", f"Failed to start worker for {name}")
+        if not pending:
+            self.report_startup_profile()
+        elif self.startup_profile.enabled:
+            # Report anyway if no bot comes online (bad token, no network...)
+            QTimer.singleShot(30000, self.report_startup_profile)
+            
+    def report_startup_profile(self):
+        text = self.startup_profile.report()
+        if text:
+            for line in text.splitlines():
+                self.add_log("info", line)
         
     def setup_ui(self):
         # Main widget and layout
@@ -479,6 +1319,7 @@ class BotManagerApp(QMainWindow):
         self.statistics_tab = QWidget()
         self.command_tab = QWidget()
         self.user_tab = QWidget()
+        self.history_tab = QWidget()
         self.backup_tab = QWidget()
         self.settings_tab = QWidget()
         
@@ -486,6 +1327,7 @@ class BotManagerApp(QMainWindow):
         self.tabs.addTab(self.statistics_tab, "📊 Statistics")
         self.tabs.addTab(self.command_tab, "⚙️ Command Manager")
         self.tabs.addTab(self.user_tab, "👥 User Management")
+        self.tabs.addTab(self.history_tab, "📜 Message History")
         self.tabs.addTab(self.backup_tab, "💾 Backup/Restore")
         self.tabs.addTab(self.settings_tab, "⚙️ Settings")
         
@@ -493,6 +1335,7 @@ class BotManagerApp(QMainWindow):
         self.setup_statistics_tab()
         self.setup_command_tab()
         self.setup_user_tab()
+        self.setup_history_tab()
         self.setup_backup_tab()
         self.setup_settings_tab()
         
@@ -500,6 +1343,11 @@ class BotManagerApp(QMainWindow):
         self.status_bar = QStatusBar()
         self.setStatusBar(self.status_bar)
         self.status_bar.showMessage("Ready")
+        self.log_queue_label = QLabel()
+        self.status_bar.addPermanentWidget(self.log_queue_label)
+        self.refresh_cost_label = QLabel()
+        self.status_bar.addPermanentWidget(self.refresh_cost_label)
+        self._log_queue_status = None
         
     def setup_statistics_tab(self):
         layout = QVBoxLayout(self.statistics_tab)
@@ -514,9 +1362,12 @@ class BotManagerApp(QMainWindow):
         bot_profiles_layout.addWidget(add_bot_btn)
         
         # Bot profiles table
-        self.bot_table = QTableWidget()
-        self.bot_table.setColumnCount(6)
-        self.bot_table.setHorizontalHeaderLabels(["Name", "Status", "Uptime", "Token", "Admin ID", "Webhook"])
+        self.bot_model = BotTableModel(self)
+        self.bot_table = QTableView()
+        self.bot_table.setModel(self.bot_model)
+        self.bot_table.setEditTriggers(QAbstractItemView.NoEditTriggers)
+        self.bot_table.setSelectionBehavior(QAbstractItemView.SelectRows)
+        self.bot_table.verticalHeader().setSectionResizeMode(QHeaderView.Fixed)
         self.bot_table.horizontalHeader().setSectionResizeMode(QHeaderView.Stretch)
         self.bot_table.horizontalHeader().setSectionResizeMode(0, QHeaderView.ResizeToContents)
         self.bot_table.horizontalHeader().setSectionResizeMode(1, QHeaderView.ResizeToContents)
@@ -524,6 +1375,11 @@ class BotManagerApp(QMainWindow):
         self.bot_table.horizontalHeader().setSectionResizeMode(3, QHeaderView.ResizeToContents)
         self.bot_table.horizontalHeader().setSectionResizeMode(4, QHeaderView.ResizeToContents)
         self.bot_table.horizontalHeader().setSectionResizeMode(5, QHeaderView.Stretch)
+        self.bot_table.horizontalHeader().setSectionResizeMode(6, QHeaderView.ResizeToContents)
+        self.bot_table.horizontalHeader().setSectionResizeMode(7, QHeaderView.ResizeToContents)
+        self.bot_table.horizontalHeader().setSectionResizeMode(8, QHeaderView.ResizeToContents)
+        self.bot_table.horizontalHeader().setSectionResizeMode(9, QHeaderView.ResizeToContents)
+        self.bot_table.horizontalHeader().setSectionResizeMode(10, QHeaderView.ResizeToContents)
         bot_profiles_layout.addWidget(self.bot_table)
         
         # Bot controls
@@ -563,10 +1419,14 @@ class BotManagerApp(QMainWindow):
         filter_layout.addWidget(export_log_btn)
         activity_layout.addLayout(filter_layout)
         
-        # Log display
-        self.log_text = QTextEdit()
-        self.log_text.setReadOnly(True)
-        activity_layout.addWidget(self.log_text)
+        # Log display: a view over the ring-buffered log model, filtered by the combo above
+        self.log_model = LogTableModel(DEFAULT_RETENTION, self)
+        self.log_proxy = LogFilterProxy(None, self)
+        self.log_proxy.setSourceModel(self.log_model)
+        self.log_view = self.create_log_view(self.log_proxy)
+        self.log_view.setColumnHidden(2, True)
+        self.log_view.setColumnHidden(3, True)
+        activity_layout.addWidget(self.log_view)
         
         activity_group.setLayout(activity_layout)
         layout.addWidget(activity_group)
@@ -575,15 +1435,32 @@ class BotManagerApp(QMainWindow):
         messages_group = QGroupBox("Recent Messages")
         messages_layout = QVBoxLayout()
         
-        self.messages_table = QTableWidget()
-        self.messages_table.setColumnCount(5)
-        self.messages_table.setHorizontalHeaderLabels(["Bot", "User", "Message", "Time", "Type"])
-        self.messages_table.horizontalHeader().setSectionResizeMode(QHeaderView.Stretch)
+        self.messages_proxy = LogFilterProxy(self.MESSAGE_LEVELS, self)
+        self.messages_proxy.setSourceModel(self.log_model)
+        self.messages_table = self.create_log_view(self.messages_proxy)
+        # Same model as the activity log, shown as Bot, User, Message, Time, Type
+        self.messages_table.horizontalHeader().moveSection(0, 4)
+        self.messages_table.horizontalHeader().moveSection(0, 4)
         messages_layout.addWidget(self.messages_table)
         
         messages_group.setLayout(messages_layout)
         layout.addWidget(messages_group)
         
+    def create_log_view(self, model):
+        view = QTableView()
+        view.setModel(model)
+        view.setEditTriggers(QAbstractItemView.NoEditTriggers)
+        view.setSelectionBehavior(QAbstractItemView.SelectRows)
+        view.setWordWrap(False)
+        view.verticalHeader().setVisible(False)
+        # Fixed row heights let the view compute scrolling without measuring every row
+        view.verticalHeader().setSectionResizeMode(QHeaderView.Fixed)
+        view.verticalHeader().setDefaultSectionSize(22)
+        header = view.horizontalHeader()
+        header.setSectionResizeMode(QHeaderView.Interactive)
+        header.setStretchLastSection(True)
+        return view
+        
     def setup_command_tab(self):
         layout = QVBoxLayout(self.command_tab)
         
@@ -631,20 +1508,100 @@ class BotManagerApp(QMainWindow):
         user_group = QGroupBox("User Management")
         user_layout = QVBoxLayout()
         
-        # Add user button
+        # Search and user buttons
+        user_controls_layout = QHBoxLayout()
+        self.user_search_input = QLineEdit()
+        self.user_search_input.setPlaceholderText("Search by ID or @username prefix")
+        # Debounced: each keystroke would otherwise run a count query
+        self.user_search_timer = QTimer(self)
+        self.user_search_timer.setSingleShot(True)
+        self.user_search_timer.setInterval(200)
+        self.user_search_timer.timeout.connect(lambda: self.user_model.set_search(self.user_search_input.text()))
+        self.user_search_input.textChanged.connect(self.user_search_timer.start)
         add_user_btn = QPushButton("➕ Add User")
         add_user_btn.clicked.connect(self.add_user_dialog)
-        user_layout.addWidget(add_user_btn)
+        edit_user_btn = QPushButton("✏️ Edit User")
+        edit_user_btn.clicked.connect(self.edit_user_dialog)
+        delete_user_btn = QPushButton("🗑️ Delete User")
+        delete_user_btn.clicked.connect(self.delete_user)
+        user_controls_layout.addWidget(self.user_search_input)
+        user_controls_layout.addWidget(add_user_btn)
+        user_controls_layout.addWidget(edit_user_btn)
+        user_controls_layout.addWidget(delete_user_btn)
+        user_layout.addLayout(user_controls_layout)
         
         # User table
-        self.user_table = QTableWidget()
-        self.user_table.setColumnCount(5)
-        self.user_table.setHorizontalHeaderLabels(["ID", "Username", "First Name", "Last Name", "Actions"])
-        self.user_table.horizontalHeader().setSectionResizeMode(QHeaderView.Stretch)
+        self.user_model = UserTableModel(self.user_directory, self)
+        self.user_table = self.create_log_view(self.user_model)
+        self.user_table.doubleClicked.connect(self.edit_user_dialog)
         user_layout.addWidget(self.user_table)
         
         user_group.setLayout(user_layout)
         layout.addWidget(user_group)
+        self.tabs.currentChanged.connect(self.user_tab_shown)
+        
+    def user_tab_shown(self, index):
+        if self.tabs.widget(index) is self.user_tab:
+            self.user_model.refresh()
+        
+    def setup_history_tab(self):
+        layout = QVBoxLayout(self.history_tab)
+        
+        history_group = QGroupBox("Message History")
+        history_layout = QVBoxLayout()
+        
+        # Filters
+        filter_layout = QHBoxLayout()
+        self.history_bot_combo = QComboBox()
+        self.history_chat_input = QLineEdit()
+        self.history_chat_input.setPlaceholderText("Chat ID")
+        self.history_user_input = QLineEdit()
+        self.history_user_input.setPlaceholderText("User ID")
+        history_search_btn = QPushButton("🔍 Search")
+        history_search_btn.clicked.connect(self.search_history)
+        self.history_chat_input.returnPressed.connect(self.search_history)
+        self.history_user_input.returnPressed.connect(self.search_history)
+        filter_layout.addWidget(QLabel("Bot:"))
+        filter_layout.addWidget(self.history_bot_combo)
+        filter_layout.addWidget(self.history_chat_input)
+        filter_layout.addWidget(self.history_user_input)
+        filter_layout.addWidget(history_search_btn)
+        history_layout.addLayout(filter_layout)
+        
+        self.history_model = MessageHistoryModel(self.message_store, self)
+        self.history_view = self.create_log_view(self.history_model)
+        history_layout.addWidget(self.history_view)
+        
+        history_group.setLayout(history_layout)
+        layout.addWidget(history_group)
+        self.tabs.currentChanged.connect(self.history_tab_shown)
+        
+    def history_tab_shown(self, index):
+        if self.tabs.widget(index) is not self.history_tab:
+            return
+        # Offer every bot that has history, including deleted ones
+        current = self.history_bot_combo.currentText()
+        names = sorted(set(self.message_store.bot_names()) | set(self.bots))
+        self.history_bot_combo.clear()
+        self.history_bot_combo.addItems(["All bots"] + names)
+        if current in names:
+            self.history_bot_combo.setCurrentText(current)
+        self.search_history()
+        
+    def search_history(self):
+        ids = []
+        for field in (self.history_chat_input, self.history_user_input):
+            text = field.text().strip()
+            try:
+                ids.append(int(text) if text else None)
+            except ValueError:
+                QMessageBox.warning(self, "Error", f"'{text}' is not a numeric ID")
+                return
+        bot_name = self.history_bot_combo.currentText()
+        bot_name = bot_name if bot_name and bot_name != "All bots" else None
+        # Whatever is still queued should show up in the first page
+        self.message_store.flush(1)
+        self.history_model.search(bot_name, *ids)
         
     def setup_backup_tab(self):
         layout = QVBoxLayout(self.backup_tab)
@@ -679,6 +1636,13 @@ class BotManagerApp(QMainWindow):
         self.auto_start_checkbox.setChecked(True)
         settings_layout.addRow("Auto-start on boot:", self.auto_start_checkbox)
         
+        self.auto_restart_checkbox = QCheckBox()
+        self.auto_restart_checkbox.setChecked(True)
+        self.auto_restart_checkbox.setToolTip("Restart bots whose polling is stuck or that crashed, "
+                                              "waiting longer after each attempt")
+        self.auto_restart_checkbox.toggled.connect(lambda on: setattr(self.watchdog, "auto_restart", on))
+        settings_layout.addRow("Restart stuck bots:", self.auto_restart_checkbox)
+        
         self.log_level_spin = QSpinBox()
         self.log_level_spin.setRange(1, 5)
         self.log_level_spin.setValue(3)
@@ -689,6 +1653,36 @@ class BotManagerApp(QMainWindow):
         self.update_interval_spin.setValue(5)
         settings_layout.addRow("Update interval (seconds):", self.update_interval_spin)
         
+        self.log_retention_spin = QSpinBox()
+        self.log_retention_spin.setRange(100, 1000000)
+        self.log_retention_spin.setSingleStep(1000)
+        self.log_retention_spin.setValue(DEFAULT_RETENTION)
+        self.log_retention_spin.valueChanged.connect(self.log_model.set_capacity)
+        settings_layout.addRow("Log retention (entries):", self.log_retention_spin)
+        
+        self.log_batch_size_spin = QSpinBox()
+        self.log_batch_size_spin.setRange(1, 100000)
+        self.log_batch_size_spin.setValue(DEFAULT_BATCH_SIZE)
+        settings_layout.addRow("Log batch size (entries per tick):", self.log_batch_size_spin)
+        
+        self.log_flush_interval_spin = QSpinBox()
+        self.log_flush_interval_spin.setRange(10, 5000)
+        self.log_flush_interval_spin.setValue(DEFAULT_FLUSH_INTERVAL)
+        self.log_flush_interval_spin.valueChanged.connect(self.set_log_flush_interval)
+        settings_layout.addRow("Log flush interval (ms):", self.log_flush_interval_spin)
+        
+        self.runtime_mode_combo = QComboBox()
+        self.runtime_mode_combo.addItems(["thread", "async", "process"])
+        self.runtime_mode_combo.setToolTip("async hosts every bot on a single event loop, process spreads "
+                                           "them over worker processes (applies on restart)")
+        settings_layout.addRow("Bot runtime:", self.runtime_mode_combo)
+        
+        self.shard_count_spin = QSpinBox()
+        self.shard_count_spin.setRange(1, 256)
+        self.shard_count_spin.setValue(self.shard_count)
+        self.shard_count_spin.setToolTip("Number of worker processes in process mode (applies on restart)")
+        settings_layout.addRow("Worker processes:", self.shard_count_spin)
+        
         settings_group.setLayout(settings_layout)
         layout.addWidget(settings_group)
         
@@ -700,6 +1694,16 @@ class BotManagerApp(QMainWindow):
         self.webhook_url_input.setPlaceholderText("https://your-domain.com/webhook")
         webhook_layout.addRow("Webhook URL:", self.webhook_url_input)
         
+        # The embedded receiver; the public webhook URL should proxy to it
+        self.webhook_host_input = QLineEdit()
+        self.webhook_host_input.setPlaceholderText(DEFAULT_HOST)
+        webhook_layout.addRow("Listen address:", self.webhook_host_input)
+        
+        self.webhook_port_spin = QSpinBox()
+        self.webhook_port_spin.setRange(1, 65535)
+        self.webhook_port_spin.setValue(DEFAULT_PORT)
+        webhook_layout.addRow("Listen port:", self.webhook_port_spin)
+        
         set_webhook_btn = QPushButton("Set Webhook")
         set_webhook_btn.clicked.connect(self.set_webhook)
         webhook_layout.addRow(set_webhook_btn)
@@ -711,6 +1715,102 @@ class BotManagerApp(QMainWindow):
         webhook_group.setLayout(webhook_layout)
         layout.addWidget(webhook_group)
         
+        # Per-chat handler pool of the selected bot (applied on its next start)
+        dispatch_group = QGroupBox("Update Dispatch")
+        dispatch_layout = QFormLayout()
+        
+        self.dispatch_workers_spin = QSpinBox()
+        self.dispatch_workers_spin.setRange(1, 256)
+        self.dispatch_workers_spin.setValue(DEFAULT_WORKERS)
+        self.dispatch_workers_spin.setToolTip("Chats handled in parallel; each chat's updates stay in order")
+        dispatch_layout.addRow("Handler pool size:", self.dispatch_workers_spin)
+        
+        self.dispatch_queue_spin = QSpinBox()
+        self.dispatch_queue_spin.setRange(1, 1000000)
+        self.dispatch_queue_spin.setValue(DEFAULT_QUEUE_SIZE)
+        self.dispatch_queue_spin.setToolTip("Updates waiting for a handler before the bot stops fetching more")
+        dispatch_layout.addRow("Queue length:", self.dispatch_queue_spin)
+        
+        set_dispatch_btn = QPushButton("Apply to Selected Bot")
+        set_dispatch_btn.clicked.connect(self.set_dispatch)
+        dispatch_layout.addRow(set_dispatch_btn)
+        
+        self.bot_select_combo.currentTextChanged.connect(self.show_dispatch_settings)
+        dispatch_group.setLayout(dispatch_layout)
+        layout.addWidget(dispatch_group)
+        
+        # Network settings (shared by every bot, applied on restart)
+        network_group = QGroupBox("Network")
+        network_layout = QFormLayout()
+        
+        self.api_base_url_input = QLineEdit()
+        self.api_base_url_input.setPlaceholderText(DEFAULT_BASE_URL)
+        network_layout.addRow("Bot API base URL:", self.api_base_url_input)
+        
+        self.pool_size_spin = QSpinBox()
+        self.pool_size_spin.setRange(1, 1000)
+        self.pool_size_spin.setValue(self.transport.pool_size)
+        network_layout.addRow("Connection pool size:", self.pool_size_spin)
+        
+        self.per_host_limit_spin = QSpinBox()
+        self.per_host_limit_spin.setRange(0, 10000)
+        self.per_host_limit_spin.setSpecialValueText("Unlimited")
+        self.per_host_limit_spin.setValue(self.transport.per_host_limit)
+        network_layout.addRow("Connections per host:", self.per_host_limit_spin)
+        
+        network_group.setLayout(network_layout)
+        layout.addWidget(network_group)
+        
+        # Headless daemon running the same config
+        daemon_group = QGroupBox("Daemon")
+        daemon_layout = QFormLayout()
+        self.daemon_address_label = QLabel(control_address(self.config_file))
+        daemon_layout.addRow("Control socket:", self.daemon_address_label)
+        self.attach_daemon_btn = QPushButton("Attach to Daemon")
+        self.attach_daemon_btn.clicked.connect(self.toggle_daemon)
+        daemon_layout.addRow(self.attach_daemon_btn)
+        daemon_group.setLayout(daemon_layout)
+        layout.addWidget(daemon_group)
+        
+        # Prometheus exporter on localhost
+        metrics_group = QGroupBox("Metrics")
+        metrics_layout = QFormLayout()
+        self.metrics_enabled_checkbox = QCheckBox()
+        self.metrics_enabled_checkbox.setToolTip("Serve per-bot counters and handler latency at "
+                                                 "http://127.0.0.1:<port>/metrics in Prometheus format")
+        self.metrics_enabled_checkbox.toggled.connect(self.apply_metrics_server)
+        metrics_layout.addRow("Serve /metrics:", self.metrics_enabled_checkbox)
+        self.metrics_port_spin = QSpinBox()
+        self.metrics_port_spin.setRange(1, 65535)
+        self.metrics_port_spin.setValue(self.metrics_server.port)
+        self.metrics_port_spin.editingFinished.connect(self.apply_metrics_server)
+        metrics_layout.addRow("Metrics port:", self.metrics_port_spin)
+        metrics_group.setLayout(metrics_layout)
+        layout.addWidget(metrics_group)
+        
+        # Stage profiling of the message handler (opt-in, sampled)
+        profiling_group = QGroupBox("Profiling")
+        profiling_layout = QFormLayout()
+        self.profile_rate_combo = QComboBox()
+        for label, rate in self.PROFILE_RATES:
+            self.profile_rate_combo.addItem(label, rate)
+        self.profile_rate_combo.setToolTip("Share of messages whose handler stages are timed")
+        self.profile_rate_combo.currentIndexChanged.connect(lambda _: self.apply_profile_rate())
+        profiling_layout.addRow("Sample messages:", self.profile_rate_combo)
+        profiling_buttons = QHBoxLayout()
+        breakdown_btn = QPushButton("Stage Breakdown")
+        breakdown_btn.clicked.connect(self.show_stage_breakdown)
+        flamegraph_btn = QPushButton("Save Flamegraph Stacks")
+        flamegraph_btn.clicked.connect(self.export_flamegraph)
+        reset_profile_btn = QPushButton("Reset")
+        reset_profile_btn.clicked.connect(lambda: self.apply_profile_rate(reset=True))
+        profiling_buttons.addWidget(breakdown_btn)
+        profiling_buttons.addWidget(flamegraph_btn)
+        profiling_buttons.addWidget(reset_profile_btn)
+        profiling_layout.addRow(profiling_buttons)
+        profiling_group.setLayout(profiling_layout)
+        layout.addWidget(profiling_group)
+        
         # Message filtering
         filter_group = QGroupBox("Message Filtering")
         filter_layout = QFormLayout()
@@ -740,15 +1840,58 @@ class BotManagerApp(QMainWindow):
         layout.addWidget(auto_reply_group)
         
     def setup_timers(self):
-        # Timer for updating UI
-        self.update_timer = QTimer()
-        self.update_timer.timeout.connect(self.update_ui)
-        self.update_timer.start(1000)  # Update every second
-        
-        # Timer for checking bot status
-        self.status_timer = QTimer()
-        self.status_timer.timeout.connect(self.check_bot_status)
-        self.status_timer.start(5000)  # Check every 5 seconds
+        # Refreshes status and the bot table every "Update interval" seconds
+        self.refresh_scheduler = RefreshScheduler(self, self.update_interval_spin.value() * 1000)
+        self.update_interval_spin.valueChanged.connect(lambda v: self.refresh_scheduler.set_interval(v * 1000))
+        self.refresh_scheduler.start()
+        self._send_stats_version = None
+        self._watchdog_version = None
+        
+        # Timer for draining worker log records into the log view
+        self.log_flush_timer = QTimer()
+        self.log_flush_timer.timeout.connect(self.flush_log_queue)
+        self.log_flush_timer.start(self.log_flush_interval_spin.value())
+        
+    def set_log_flush_interval(self, interval):
+        if hasattr(self, 'log_flush_timer'):
+            self.log_flush_timer.setInterval(interval)
+        
+    def create_worker(self, name, bot_data):
+        """Build a worker for the configured runtime mode and wire its signals."""
+        if self.daemon_client is not None:
+            worker = RemoteBot(name, bot_data.get("token"), bot_data.get("admin_id"),
+                               self.daemon_client, WorkerSignals())
+        elif self.runtime_mode == "async":
+            worker = AsyncBot(name, bot_data.get("token"), bot_data.get("admin_id"),
+                              self.async_runtime, WorkerSignals())
+        elif self.runtime_mode == "process":
+            worker = ShardedBot(name, bot_data.get("token"), bot_data.get("admin_id"),
+                                self.get_shard_supervisor(), WorkerSignals())
+        else:
+            worker = BotWorker(name, bot_data.get("token"), bot_data.get("admin_id"))
+        # Restore runtime settings
+        worker.auto_replies = bot_data.get("auto_replies", {}) or {}
+        worker.message_filters = bot_data.get("message_filters", {}) or {}
+        worker.commands = bot_data.get("commands", {}) or {}
+        worker.webhook_url = bot_data.get("webhook_url")
+        worker.dispatch = bot_data.get("dispatch") or {}
+        worker.send_scheduler = self.send_scheduler
+        worker.webhook_server = self.webhook_server
+        worker.offsets = self.offset_store
+        worker.health = self.watchdog.health_of(name)
+        # Direct connection: the worker thread only appends to log_queue, no Qt event per line
+        worker.log_signal.connect(self.log_queue.put, Qt.DirectConnection)
+        worker.status_signal.connect(self.update_bot_status)
+        # Direct connection as well: add_message only queues the message for the history writer
+        worker.message_signal.connect(self.add_message, Qt.DirectConnection)
+        return worker
+        
+    def get_shard_supervisor(self):
+        if self.shard_supervisor is None:
+            self.shard_supervisor = ShardSupervisor(self.shard_count, self.transport.to_settings(),
+                                                    on_log=self.log_queue.put,
+                                                    offsets_path=self.offset_store.path)
+        return self.shard_supervisor
         
     def add_bot_dialog(self):
         dialog = AddBotDialog(self)
@@ -767,32 +1910,11 @@ class BotManagerApp(QMainWindow):
             return
             
         # Add to config
-        self.bots[name] = {
-            "token": token,
-            "admin_id": admin_id,
-            "status": "Offline",
-            "start_time": None,
-            "uptime": 0,
-            "webhook_url": None,
-            "auto_replies": {},
-            "message_filters": {
-                "spam": False,
-                "bad_words": False
-            },
-            "commands": {}
-        }
+        self.bots[name] = new_bot_data(token, admin_id)
         
         # Start bot worker
         try:
-            worker = BotWorker(name, token, admin_id)
-            # Restore any runtime settings into the worker
-            worker.commands = self.bots[name].get("commands", {})
-            worker.auto_replies = self.bots[name].get("auto_replies", {})
-            worker.message_filters = self.bots[name].get("message_filters", {})
-            worker.webhook_url = self.bots[name].get("webhook_url")
-            worker.log_signal.connect(self.add_log)
-            worker.status_signal.connect(self.update_bot_status)
-            worker.message_signal.connect(self.add_message)
+            worker = self.create_worker(name, self.bots[name])
             worker.start()
             self.bot_workers[name] = worker
             
@@ -823,12 +1945,8 @@ class BotManagerApp(QMainWindow):
                     return
                     
                 self.bots[current_bot]["commands"][command_data["command"]] = command_data["response"]
-                # If worker is running for this bot, update its commands mapping so it responds dynamically
-                if current_bot in self.bot_workers:
-                    try:
-                        self.bot_workers[current_bot].commands = self.bots[current_bot]["commands"]
-                    except Exception:
-                        pass
+                # If worker is running for this bot, swap in a rebuilt router so it responds dynamically
+                self.push_routing(current_bot)
                 self.save_config()
                 self.update_command_tree()
                 self.add_log("info", f"Command /{command_data['command']} added to {current_bot}")
@@ -856,7 +1974,10 @@ class BotManagerApp(QMainWindow):
         if dialog.exec_():
             command_data = dialog.get_command_data()
             if command_data:
+                if command_data["command"] != command:
+                    self.bots[current_bot]["commands"].pop(command, None)
                 self.bots[current_bot]["commands"][command_data["command"]] = command_data["response"]
+                self.push_routing(current_bot)
                 self.save_config()
                 self.update_command_tree()
                 self.add_log("info", f"Command /{command_data['command']} updated for {current_bot}")
@@ -884,11 +2005,25 @@ class BotManagerApp(QMainWindow):
         if reply == QMessageBox.Yes:
             if command in self.bots[current_bot]["commands"]:
                 del self.bots[current_bot]["commands"][command]
+                self.push_routing(current_bot)
                 self.save_config()
                 self.update_command_tree()
                 self.add_log("info", f"Command /{command} deleted from {current_bot}")
                 QMessageBox.information(self, "Success", "Command deleted successfully!")
                 
+    def push_routing(self, bot_name):
+        """Rebuild the worker's router from the bot's config and swap it in."""
+        worker = self.bot_workers.get(bot_name)
+        if worker is None or bot_name not in self.bots:
+            return
+        bot_data = self.bots[bot_name]
+        try:
+            worker.update_routing(commands=bot_data.get("commands") or {},
+                                  auto_replies=bot_data.get("auto_replies") or {},
+                                  message_filters=bot_data.get("message_filters") or {})
+        except Exception as e:
+            self.add_log("error", f"Failed to update routing for {bot_name}: {e}")
+                
     def update_command_tree(self):
         self.command_tree.clear()
         current_bot = self.bot_select_combo.currentText()
@@ -911,11 +2046,7 @@ class BotManagerApp(QMainWindow):
                 self.bots[current_bot]["auto_replies"][trigger] = response
                 self.save_config()
                 # Update running worker if present
-                if current_bot in self.bot_workers:
-                    try:
-                        self.bot_workers[current_bot].auto_replies = self.bots[current_bot]["auto_replies"]
-                    except Exception:
-                        pass
+                self.push_routing(current_bot)
                 self.add_log("info", f"Auto-reply added for '{trigger}' in {current_bot}")
                 QMessageBox.information(self, "Success", "Auto-reply added successfully!")
                 
@@ -932,21 +2063,38 @@ class BotManagerApp(QMainWindow):
             self.add_log("info", f"Webhook URL set for {current_bot}")
             QMessageBox.information(self, "Success", "Webhook URL set successfully!")
             # Update running worker if present
-            if current_bot in self.bot_workers:
-                try:
-                    w = self.bot_workers[current_bot]
-                    w.webhook_url = url
-                    if w.bot is not None:
-                        try:
-                            w.bot.remove_webhook()
-                            w.bot.set_webhook(url=url)
-                        except Exception as e:
-                            self.add_log("error", f"Failed to set webhook for {current_bot}: {e}")
-                except Exception:
-                    pass
+            w = self.bot_workers.get(current_bot)
+            if w is not None:
+                w.webhook_url = url
+                if w.running:
+                    try:
+                        w.apply_webhook(url)
+                    except Exception as e:
+                        self.add_log("error", f"Failed to set webhook for {current_bot}: {e}")
         else:
             QMessageBox.warning(self, "Validation Error", "Webhook URL cannot be empty!")
             
+    def show_dispatch_settings(self, bot_name):
+        bot_data = self.bots.get(bot_name)
+        workers, queue_size = dispatch_options(bot_data.get("dispatch") if bot_data else None)
+        self.dispatch_workers_spin.setValue(workers)
+        self.dispatch_queue_spin.setValue(queue_size)
+
+    def set_dispatch(self):
+        current_bot = self.bot_select_combo.currentText()
+        if not current_bot or current_bot not in self.bots:
+            QMessageBox.warning(self, "Warning", "Please select a bot first")
+            return
+            
+        dispatch = {"workers": self.dispatch_workers_spin.value(),
+                    "queue_size": self.dispatch_queue_spin.value()}
+        self.bots[current_bot]["dispatch"] = dispatch
+        self.save_config()
+        if current_bot in self.bot_workers:
+            self.bot_workers[current_bot].dispatch = dispatch
+        self.add_log("info", f"Update dispatch for {current_bot}: {dispatch['workers']} handlers, "
+                             f"queue of {dispatch['queue_size']} (applies on the next start)")
+            
     def remove_webhook(self):
         current_bot = self.bot_select_combo.currentText()
         if not current_bot or current_bot not in self.bots:
@@ -958,132 +2106,275 @@ class BotManagerApp(QMainWindow):
         self.add_log("info", f"Webhook removed for {current_bot}")
         QMessageBox.information(self, "Success", "Webhook removed successfully!")
         # Update running worker if present
-        if current_bot in self.bot_workers:
-            try:
-                w = self.bot_workers[current_bot]
-                w.webhook_url = None
-                if w.bot is not None:
-                    try:
-                        w.bot.remove_webhook()
-                    except Exception as e:
-                        self.add_log("error", f"Failed to remove webhook for {current_bot}: {e}")
-            except Exception:
-                pass
+        w = self.bot_workers.get(current_bot)
+        if w is not None:
+            w.webhook_url = None
+            if w.running:
+                try:
+                    w.apply_webhook(None)
+                except Exception as e:
+                    self.add_log("error", f"Failed to remove webhook for {current_bot}: {e}")
         
     def add_log(self, level, message):
-        timestamp = datetime.now().strftime("%H:%M:%S")
-        self.log_text.append(f"[{timestamp}] {level.upper()}: {message}")
-        
-        # Add to messages table
-        row = self.messages_table.rowCount()
-        self.messages_table.insertRow(row)
-        self.messages_table.setItem(row, 0, QTableWidgetItem("Bot Name"))  # Will be updated
-        self.messages_table.setItem(row, 1, QTableWidgetItem("User ID"))    # Will be updated
-        self.messages_table.setItem(row, 2, QTableWidgetItem(message[:50]))
-        self.messages_table.setItem(row, 3, QTableWidgetItem(timestamp))
-        self.messages_table.setItem(row, 4, QTableWidgetItem(level))
+        self.append_log_records([make_record(level, message)])
+        
+    def flush_log_queue(self):
+        records = self.log_queue.drain(self.log_batch_size_spin.value())
+        if records:
+            self.append_log_records(records)
+        status = (len(self.log_queue), self.log_queue.dropped)
+        if status != self._log_queue_status:
+            self._log_queue_status = status
+            self.log_queue_label.setText(f"Log backlog: {status[0]}  Dropped: {status[1]}")
+        
+    def append_log_records(self, records):
+        # Keep following the newest rows only if the user hasn't scrolled up
+        follow = [view for view in (self.log_view, self.messages_table)
+                  if view.verticalScrollBar().value() >= view.verticalScrollBar().maximum()]
+        self.log_model.append_records(records)
+        for view in follow:
+            view.scrollToBottom()
         
     def add_message(self, bot_name, message_data):
-        # This would be called when a message is received
-        pass
+        # Called on the worker's thread; the store and the directory write in the background
+        self.message_store.add(bot_name, message_data)
+        self.user_directory.observe(bot_name, message_data)
         
     def update_bot_status(self, bot_name, status):
         if bot_name in self.bots:
             self.bots[bot_name]["status"] = status
             if status == "Online" and bot_name not in self.bot_workers:
                 # Start the worker if it's not already running
-                bot_data = self.bots[bot_name]
-                worker = BotWorker(bot_name, bot_data["token"], bot_data["admin_id"])
-                worker.log_signal.connect(self.add_log)
-                worker.status_signal.connect(self.update_bot_status)
-                worker.message_signal.connect(self.add_message)
-                worker.commands = bot_data["commands"]
-                worker.auto_replies = bot_data["auto_replies"]
-                worker.message_filters = bot_data["message_filters"]
+                worker = self.create_worker(bot_name, self.bots[bot_name])
                 worker.start()
                 self.bot_workers[bot_name] = worker
                 
             if status == "Online":
                 self.bots[bot_name]["start_time"] = datetime.now()
-            self.update_ui()
+                if not self.startup_profile.reported:
+                    self.startup_profile.milestone("first bot online")
+                    self.report_startup_profile()
+            # Rendered on the next refresh tick, so bursts of status changes cost one redraw
+            self.mark_dirty()
             
     def update_ui(self):
-        # Update bot table and selection combo
-        self.bot_table.setRowCount(len(self.bots))
+        # Update bot table and, only when the set of bots changed, the selection combo
+        if self.bot_model.refresh():
+            self.refresh_bot_combo()
+            
+    def refresh_views(self, dirty):
+        # Queue/latency columns change without any signal; compare the scheduler's version
+        if self.send_scheduler.version != self._send_stats_version:
+            self._send_stats_version = self.send_scheduler.version
+            dirty = True
+        # Likewise the metrics columns: one registry sample per tick feeds rates and sparklines
+        if self.metrics_history.sample(REGISTRY.export()):
+            dirty = True
+        if dirty:
+            self.update_ui()
+        else:
+            self.bot_model.refresh_uptime()
+        # The directory commits about once a second; only a visible user table follows it
+        if self.tabs.currentWidget() is self.user_tab:
+            self.user_model.refresh()
+            
+    def show_refresh_cost(self, scheduler):
+        self.refresh_cost_label.setText(f"UI tick: {scheduler.last_cost * 1000:.1f} ms (avg {scheduler.avg_cost * 1000:.1f})")
+            
+    def mark_dirty(self):
+        if hasattr(self, 'refresh_scheduler'):
+            self.refresh_scheduler.mark_dirty()
+            
+    def changeEvent(self, event):
+        if event.type() == QEvent.WindowStateChange and hasattr(self, 'refresh_scheduler') and not self.isMinimized():
+            self.refresh_scheduler.wake()
+        super().changeEvent(event)
+            
+    def refresh_bot_combo(self):
+        current = self.bot_select_combo.currentText()
+        self.bot_select_combo.blockSignals(True)
         self.bot_select_combo.clear()
-
-        for i, (name, bot) in enumerate(self.bots.items()):
-            self.bot_table.setItem(i, 0, QTableWidgetItem(name))
-            self.bot_table.setItem(i, 1, QTableWidgetItem(bot.get("status", "Offline")))
-
-            # Calculate uptime
-            start_time = bot.get("start_time")
-            if bot.get("status") == "Online" and start_time:
-                try:
-                    uptime = datetime.now() - start_time
-                    self.bot_table.setItem(i, 2, QTableWidgetItem(str(uptime).split('.')[0]))
-                except Exception:
-                    self.bot_table.setItem(i, 2, QTableWidgetItem("0:00:00"))
-            else:
-                self.bot_table.setItem(i, 2, QTableWidgetItem("0:00:00"))
-
-            # Mask token
-            token = bot.get("token", "")
-            masked_token = token[:4] + "****" + token[-4:] if len(token) >= 8 else token
-            self.bot_table.setItem(i, 3, QTableWidgetItem(masked_token))
-            self.bot_table.setItem(i, 4, QTableWidgetItem(str(bot.get("admin_id", ""))))
-
-            # Webhook status
-            webhook_status = bot.get("webhook_url") or "None"
-            self.bot_table.setItem(i, 5, QTableWidgetItem(webhook_status))
-
-            # Add to bot selection combo
-            self.bot_select_combo.addItem(name)
+        self.bot_select_combo.addItems(list(self.bots))
+        if current in self.bots:
+            self.bot_select_combo.setCurrentText(current)
+        self.bot_select_combo.blockSignals(False)
+        if self.bot_select_combo.currentText() != current:
+            self.update_command_tree()
             
     def start_all_bots(self):
-        for name, worker in self.bot_workers.items():
-            if not worker.running:
-                worker.start()
+        self.lifecycle.start([self.fresh_worker(name) for name, worker in list(self.bot_workers.items())
+                              if worker.lifecycle == "stopped"])
                 
     def stop_all_bots(self):
-        for worker in self.bot_workers.values():
-            if worker.running:
-                worker.terminate()
+        self.lifecycle.stop([worker for worker in self.bot_workers.values() if worker.lifecycle != "stopped"])
                 
     def restart_all_bots(self):
+        pairs = []
+        for name in list(self.bot_workers):
+            old = self.bot_workers[name]
+            pairs.append((old, self.fresh_worker(name)))
+        self.lifecycle.restart(pairs)
+        
+    def restart_bot(self, bot_name):
+        if bot_name in self.bot_workers and self.daemon_client is None:
+            self.lifecycle.restart([(self.bot_workers[bot_name], self.fresh_worker(bot_name))])
+            
+    def watched_workers(self):
+        # Called on the watchdog thread; a daemon watches the bots it runs itself
+        return {} if self.daemon_client is not None else dict(self.bot_workers)
+        
+    def fresh_worker(self, name):
+        """The bot's worker, ready for start(). A QThread that has already run is
+        replaced: its TeleBot and handler threads were torn down when it stopped."""
+        worker = self.bot_workers[name]
+        if isinstance(worker, QThread) and (worker.isRunning() or worker.isFinished()):
+            self.retire_worker(worker)
+            worker = self.bot_workers[name] = self.create_worker(name, self.bots[name])
+        return worker
+        
+    def toggle_daemon(self):
+        if self.daemon_client is None:
+            self.attach_daemon()
+        else:
+            self.detach_daemon()
+            
+    def attach_daemon(self):
+        """Hand the bots over to a running daemon; the GUI then only mirrors and controls them."""
+        wanted = [name for name, worker in self.bot_workers.items() if worker.running]
+        stopping = [worker for worker in self.bot_workers.values() if worker.lifecycle != "stopped"]
         self.stop_all_bots()
-        time.sleep(2)
-        self.start_all_bots()
-        
-    def check_bot_status(self):
-        for name, worker in self.bot_workers.items():
-            if worker.running:
-                self.bots[name]["status"] = "Online"
+        self.attach_daemon_btn.setEnabled(False)
+        # A worker still in its long-poll would poll the token alongside the daemon (409 Conflict),
+        # so the daemon only starts the bots once the local ones have stopped
+        threading.Thread(target=self._wait_local_stopped, args=(stopping, wanted),
+                         name="easytg-attach", daemon=True).start()
+
+    def _wait_local_stopped(self, workers, wanted):
+        # Every stop gives up after STOP_TIMEOUT, so this returns however many bots there are
+        self.lifecycle.wait()
+        self.local_bots_stopped.emit(wanted, all(worker.lifecycle == "stopped" for worker in workers))
+
+    def finish_attach_daemon(self, wanted, stopped):
+        self.attach_daemon_btn.setEnabled(True)
+        if not stopped:
+            self.add_log("error", "Not attached to the daemon: local bots are still stopping, try again")
+            return
+        client = ControlClient.for_config(self.config_file, on_log=self.log_queue.put)
+        # Wire every proxy before connecting so the daemon's status snapshot finds them all
+        self.daemon_client = client
+        self.replace_workers([])
+        try:
+            client.connect()
+        except Exception as e:
+            self.daemon_client = None
+            self.replace_workers(wanted)
+            QMessageBox.warning(self, "Daemon", f"Could not attach to the daemon at "
+                                                f"{client.address}:\n{e}")
+            return
+        for name in wanted:
+            self.bot_workers[name].start()
+        self.attach_daemon_btn.setText("Detach from Daemon")
+        self.add_log("info", f"Attached to daemon at {client.address}")
+        
+    def detach_daemon(self):
+        # The daemon keeps running its bots; local workers are rebuilt stopped to avoid running them twice
+        client, self.daemon_client = self.daemon_client, None
+        client.close()
+        self.replace_workers([])
+        for bot_data in self.bots.values():
+            bot_data["status"] = "Offline"
+        self.attach_daemon_btn.setText("Attach to Daemon")
+        self.add_log("info", "Detached from daemon")
+        self.mark_dirty()
+        
+    def retire_worker(self, worker):
+        """Free a dropped worker's Qt objects from the event loop.
+
+        Workers sit in reference cycles, and a QObject freed by the cyclic GC in the
+        middle of a signal connect() can deadlock on Qt's connection lock.
+        """
+        if isinstance(worker, QThread):
+            if worker.isRunning():
+                worker.finished.connect(worker.deleteLater)
             else:
-                self.bots[name]["status"] = "Offline"
-        self.update_ui()
+                worker.deleteLater()
+        elif isinstance(getattr(worker, "signals", None), QObject):
+            worker.signals.deleteLater()
+            
+    def replace_workers(self, start_names):
+        for worker in self.bot_workers.values():
+            self.retire_worker(worker)
+        self.bot_workers = {}
+        for name, bot_data in self.bots.items():
+            worker = self.create_worker(name, bot_data)
+            self.bot_workers[name] = worker
+            if name in start_names:
+                worker.start()
+            
+    def check_bot_status(self):
+        if self.daemon_client is not None and not self.daemon_client.connected:
+            self.add_log("error", "Lost connection to the daemon")
+            self.detach_daemon()
+        # Statuses arrive through status_signal; health states come from the watchdog
+        if self.watchdog.version != self._watchdog_version:
+            self._watchdog_version = self.watchdog.version
+            self.mark_dirty()
         
     def filter_logs(self, filter_type):
-        # Implementation for filtering logs
-        pass
+        self.log_proxy.set_levels(self.LOG_FILTERS.get(filter_type))
+        self.log_view.scrollToBottom()
         
     def clear_logs(self):
-        self.log_text.clear()
+        self.log_model.clear()
         
     def export_logs(self):
         filename, _ = QFileDialog.getSaveFileName(self, "Export Log", "", "Text Files (*.txt)")
         if filename:
             with open(filename, 'w') as f:
-                f.write(self.log_text.toPlainText())
+                for record in self.log_model.buffer:
+                    f.write(format_record(record) + "\n")
                 
     def add_user_dialog(self):
-        # Implementation for adding users
-        pass
+        dialog = UserDialog("Add User", self)
+        if dialog.exec_():
+            self.save_user(dialog.get_user_data())
+            
+    def edit_user_dialog(self):
+        row = self.user_table.currentIndex().row()
+        user_id = self.user_model.user_id(row) if row >= 0 else None
+        if user_id is None:
+            QMessageBox.warning(self, "Error", "Please select a user first!")
+            return
+        dialog = UserDialog("Edit User", self)
+        dialog.set_user_data(user_id, self.user_directory.get(user_id) or {})
+        if dialog.exec_():
+            self.save_user(dialog.get_user_data())
+            
+    def save_user(self, user_data):
+        if not user_data:
+            return
+        self.user_directory.add_user(user_data["user_id"], user_data["username"],
+                                     user_data["first_name"], user_data["last_name"])
+        self.user_directory.flush(1)
+        self.user_model.refresh()
+        
+    def delete_user(self):
+        row = self.user_table.currentIndex().row()
+        user_id = self.user_model.user_id(row) if row >= 0 else None
+        if user_id is None:
+            QMessageBox.warning(self, "Error", "Please select a user first!")
+            return
+        reply = QMessageBox.question(self, "Confirm", f"Delete user {user_id}? They are added again when they next message a bot.",
+                                     QMessageBox.Yes | QMessageBox.No)
+        if reply == QMessageBox.Yes:
+            self.user_directory.remove_user(user_id)
+            self.user_directory.flush(1)
+            self.user_model.refresh()
         
     def backup_now(self):
         filename, _ = QFileDialog.getSaveFileName(self, "Backup Configuration", "", "EasyTG Files (*.easytg)")
         if filename:
-            self.save_config(filename)
+            self.save_config(filename, wait=True)
             QMessageBox.information(self, "Backup", "Configuration backed up successfully!")
             
     def restore_config(self):
@@ -1097,16 +2388,62 @@ class BotManagerApp(QMainWindow):
         # Implementation for scheduled backups
         pass
         
-    def save_config(self, filename=None):
+    def transport_settings(self):
+        settings = self.transport.to_settings()
+        settings["base_url"] = self.api_base_url_input.text().strip() or DEFAULT_BASE_URL
+        settings["pool_size"] = self.pool_size_spin.value()
+        settings["per_host_limit"] = self.per_host_limit_spin.value()
+        return settings
+        
+    def apply_metrics_server(self):
+        """Start, stop or move the /metrics endpoint to match the settings."""
+        port = self.metrics_port_spin.value()
+        if self.metrics_server.running and (not self.metrics_enabled_checkbox.isChecked()
+                                            or self.metrics_server.port != port):
+            self.metrics_server.stop()
+        if self.metrics_enabled_checkbox.isChecked() and not self.metrics_server.running:
+            self.metrics_server.port = port
+            try:
+                self.metrics_server.start()
+            except OSError as e:
+                self.add_log("error", f"Failed to serve metrics on port {port}: {e}")
+                return
+            self.add_log("info", f"Serving metrics on http://{self.metrics_server.host}:{port}/metrics")
+        
+    def apply_profile_rate(self, reset=False):
+        """Push the selected sample rate (and optionally a reset) to every process hosting bots."""
+        rate = self.profile_rate_combo.currentData() or 0.0
+        PROFILER.set_sample_rate(rate)
+        if reset:
+            PROFILER.reset()
+        message = ("profiling", rate, reset)
+        if self.shard_supervisor is not None:
+            self.shard_supervisor.broadcast(message)
+        if self.daemon_client is not None:
+            self.daemon_client.send(None, message)
+        
+    def show_stage_breakdown(self):
+        StageBreakdownDialog(self).show()
+        
+    def export_flamegraph(self):
+        totals = PROFILER.export()
+        if not totals:
+            QMessageBox.information(self, "Profiling", "No samples yet. Choose a sample rate in Settings > Profiling first.")
+            return
+        filename, _ = QFileDialog.getSaveFileName(self, "Save Flamegraph Stacks", "easytg.folded",
+                                                  "Collapsed stacks (*.folded *.txt)")
+        if filename:
+            try:
+                write_collapsed(filename, totals)
+            except OSError as e:
+                QMessageBox.warning(self, "Profiling", f"Failed to write {filename}: {e}")
+        
+    def save_config(self, filename=None, wait=False):
         if not filename:
             filename = self.config_file
             
-        # Convert datetime objects to strings for JSON serialization
-        bots_for_save = {}
-        for name, bot_data in self.bots.items():
-            bots_for_save[name] = bot_data.copy()
-            if bot_data["start_time"] is not None:
-                bots_for_save[name]["start_time"] = bot_data["start_time"].isoformat()
+        # The writer thread serializes later, so hand it a deep copy rather than live dicts
+        bots_for_save = serialize_bots(self.bots)
         
         # Encrypt configuration
         config_data = {
@@ -1114,14 +2451,34 @@ class BotManagerApp(QMainWindow):
             "bots": bots_for_save,
             "settings": {
                 "auto_start": self.auto_start_checkbox.isChecked(),
+                "auto_restart": self.auto_restart_checkbox.isChecked(),
                 "log_level": self.log_level_spin.value(),
-                "update_interval": self.update_interval_spin.value()
+                "update_interval": self.update_interval_spin.value(),
+                "log_retention": self.log_retention_spin.value(),
+                "log_batch_size": self.log_batch_size_spin.value(),
+                "log_flush_interval": self.log_flush_interval_spin.value(),
+                "runtime_mode": self.runtime_mode_combo.currentText(),
+                "shard_count": self.shard_count_spin.value(),
+                "transport": self.transport_settings(),
+                "metrics": {
+                    "enabled": self.metrics_enabled_checkbox.isChecked(),
+                    "port": self.metrics_port_spin.value()
+                },
+                "profiling": {
+                    "sample_rate": self.profile_rate_combo.currentData() or 0.0
+                },
+                "webhook_listen": {
+                    "host": self.webhook_host_input.text().strip() or DEFAULT_HOST,
+                    "port": self.webhook_port_spin.value()
+                }
             }
         }
         
         # For simplicity, saving as JSON (add encryption for production)
-        with open(filename, 'w') as f:
-            json.dump(config_data, f, indent=2)
+        if wait:
+            self.config_writer.write_now(filename, config_data)
+        else:
+            self.config_writer.submit(filename, config_data)
             
     def load_config(self, filename=None):
         if not filename:
@@ -1129,8 +2486,8 @@ class BotManagerApp(QMainWindow):
             
         if os.path.exists(filename):
             try:
-                with open(filename, 'r') as f:
-                    config_data = json.load(f)
+                with self.startup_profile.phase("config read"):
+                    config_data, loaded_from = load_json_with_recovery(filename, self.config_writer.generations)
             except json.JSONDecodeError:
                 # Backup the corrupted config and continue with defaults
                 try:
@@ -1151,55 +2508,105 @@ class BotManagerApp(QMainWindow):
                 self.bots = {}
                 return
 
+            if loaded_from != filename:
+                # The primary file is unreadable (e.g. truncated by a crash); keep it for inspection
+                try:
+                    ts = datetime.now().strftime("%Y%m%d_%H%M%S")
+                    corrupt_name = f"{filename}.corrupt.{ts}"
+                    os.replace(filename, corrupt_name)
+                except OSError:
+                    corrupt_name = filename
+                QMessageBox.warning(self, "Configuration Error",
+                                    f"Configuration file could not be read and was restored from:\n{loaded_from}\n"
+                                    f"The unreadable file was kept as:\n{corrupt_name}")
+                # Put the recovered copy back in place so the next start finds it
+                self.config_writer.submit(filename, config_data)
+
+            if filename == self.config_file:
+                self.config_watcher.expect(config_data)
             bots_data = config_data.get("bots", {})
             settings = config_data.get("settings", {})
 
             # Convert string timestamps back to datetime objects
-            self.bots = {}
-            for name, bot_data in bots_data.items():
-                self.bots[name] = bot_data.copy()
-                if bot_data.get("start_time") is not None:
-                    try:
-                        self.bots[name]["start_time"] = datetime.fromisoformat(bot_data["start_time"])
-                    except (ValueError, TypeError):
-                        self.bots[name]["start_time"] = None
+            with self.startup_profile.phase("config parse"):
+                self.bots = parse_bots(bots_data)
+
+            if settings.get("runtime_mode") in ("thread", "async", "process"):
+                self.runtime_mode = settings["runtime_mode"]
+            if settings.get("shard_count"):
+                self.shard_count = int(settings["shard_count"])
 
-            if "auto_start" in settings and hasattr(self, 'auto_start_checkbox'):
-                self.auto_start_checkbox.setChecked(settings["auto_start"])
-            if "log_level" in settings and hasattr(self, 'log_level_spin'):
-                self.log_level_spin.setValue(settings["log_level"])
-            if "update_interval" in settings and hasattr(self, 'update_interval_spin'):
-                self.update_interval_spin.setValue(settings["update_interval"])
+            # Installed right before bots start (see start_pending_bots)
+            self.transport = TransportConfig.from_settings(settings.get("transport"))
+
+            # Listen address of the embedded webhook server (takes effect before it first starts)
+            listen = settings.get("webhook_listen") or {}
+            self.webhook_server.host = listen.get("host") or DEFAULT_HOST
+            self.webhook_server.port = int(listen.get("port") or DEFAULT_PORT)
+            self.show_settings(settings)
+
+            # Bots already run by a daemon must not be started a second time here
+            daemon = daemon_running(filename)
+            if daemon:
+                self.add_log("info", "A daemon is running this configuration; attach to it from Settings")
 
             # Recreate BotWorker instances for saved bots and optionally auto-start them
-            for name, bot_data in self.bots.items():
-                try:
-                    worker = BotWorker(name, bot_data.get("token"), bot_data.get("admin_id"))
-                    # Restore runtime settings
-                    worker.auto_replies = bot_data.get("auto_replies", {}) or {}
-                    worker.message_filters = bot_data.get("message_filters", {}) or {}
-                    worker.commands = bot_data.get("commands", {}) or {}
-                    worker.webhook_url = bot_data.get("webhook_url")
-                    worker.log_signal.connect(self.add_log)
-                    worker.status_signal.connect(self.update_bot_status)
-                    worker.message_signal.connect(self.add_message)
-                    self.bot_workers[name] = worker
-
-                    # Auto-start if setting enabled or the bot was previously Online
-                    should_start = False
-                    if hasattr(self, 'auto_start_checkbox') and self.auto_start_checkbox.isChecked():
-                        should_start = True
-                    if bot_data.get("status") == "Online":
-                        should_start = True
-
-                    if should_start:
-                        try:
-                            worker.start()
-                        except RuntimeError:
-                            # Thread already started or unable to start; log and continue
-                            self.add_log("error", f"Failed to start worker for {name}")
-                except Exception as e:
-                    self.add_log("error", f"Failed to recreate worker for {name}: {e}")
+            with self.startup_profile.phase("worker construction"):
+                for name, bot_data in self.bots.items():
+                    try:
+                        worker = self.create_worker(name, bot_data)
+                        self.bot_workers[name] = worker
+
+                        # Auto-start if setting enabled or the bot was previously Online
+                        should_start = False
+                        if hasattr(self, 'auto_start_checkbox') and self.auto_start_checkbox.isChecked():
+                            should_start = True
+                        if bot_data.get("status") == "Online":
+                            should_start = True
+
+                        if should_start and not daemon:
+                            self.pending_starts.append(name)
+                    except Exception as e:
+                        self.add_log("error", f"Failed to recreate worker for {name}: {e}")
+            if self.startup_done:
+                self.start_pending_bots()
+                
+    def show_settings(self, settings):
+        """Fill the Settings tab from the config's settings section."""
+        if not hasattr(self, 'auto_start_checkbox'):
+            return
+        if "auto_start" in settings:
+            self.auto_start_checkbox.setChecked(settings["auto_start"])
+        if "auto_restart" in settings:
+            self.auto_restart_checkbox.setChecked(settings["auto_restart"])
+        if "log_level" in settings:
+            self.log_level_spin.setValue(settings["log_level"])
+        if "update_interval" in settings:
+            self.update_interval_spin.setValue(settings["update_interval"])
+        if "log_retention" in settings:
+            self.log_retention_spin.setValue(settings["log_retention"])
+        if "log_batch_size" in settings:
+            self.log_batch_size_spin.setValue(settings["log_batch_size"])
+        if "log_flush_interval" in settings:
+            self.log_flush_interval_spin.setValue(settings["log_flush_interval"])
+        if settings.get("runtime_mode") in ("thread", "async", "process"):
+            self.runtime_mode_combo.setCurrentText(settings["runtime_mode"])
+        if settings.get("shard_count"):
+            self.shard_count_spin.setValue(int(settings["shard_count"]))
+        listen = settings.get("webhook_listen") or {}
+        self.webhook_host_input.setText("" if (listen.get("host") or DEFAULT_HOST) == DEFAULT_HOST else listen["host"])
+        self.webhook_port_spin.setValue(int(listen.get("port") or DEFAULT_PORT))
+        metrics = settings.get("metrics") or {}
+        self.metrics_port_spin.setValue(int(metrics.get("port") or self.metrics_port_spin.value()))
+        # Toggling starts the server
+        self.metrics_enabled_checkbox.setChecked(bool(metrics.get("enabled")))
+        profiling = settings.get("profiling") or {}
+        index = self.profile_rate_combo.findData(float(profiling.get("sample_rate") or 0.0))
+        self.profile_rate_combo.setCurrentIndex(max(0, index))
+        transport = TransportConfig.from_settings(settings.get("transport"))
+        self.api_base_url_input.setText("" if transport.base_url == DEFAULT_BASE_URL else transport.base_url)
+        self.pool_size_spin.setValue(transport.pool_size)
+        self.per_host_limit_spin.setValue(transport.per_host_limit)
                 
     def delete_bot_dialog(self):
         current_bot = self.bot_select_combo.currentText()
@@ -1212,31 +2619,160 @@ class BotManagerApp(QMainWindow):
             self.delete_bot(current_bot)
             
     def delete_bot(self, bot_name):
+        if bot_name in self.bots:
+            self.discard_bot(bot_name)
+            
+            # Save config
+            self.save_config()
+            self.update_ui()
+            
+            QMessageBox.information(self, "Success", f"Bot '{bot_name}' deleted successfully!")
+            
+    def discard_bot(self, bot_name):
+        """Stop a bot and forget it and its runtime state, without saving."""
         if bot_name in self.bots:
             # Stop the bot worker
             if bot_name in self.bot_workers:
                 worker = self.bot_workers[bot_name]
-                if worker.running:
-                    worker.terminate()
+                worker.stop()
                 del self.bot_workers[bot_name]
+                self.retire_worker(worker)
+            self.send_scheduler.discard(bot_name)
+            REGISTRY.remove(bot_name)
+            PROFILER.remove(bot_name)
+            SPAM.remove(bot_name)
+            BAD_WORDS.remove(bot_name)
+            self.watchdog.remove(bot_name)
+            self.offset_store.remove(self.bots[bot_name].get("token"))
+            if self.shard_supervisor is not None:
+                self.shard_supervisor.remove(bot_name)
+            if self.daemon_client is not None:
+                self.daemon_client.remove(bot_name)
                 
             # Remove from config
             del self.bots[bot_name]
             
-            # Save config
-            self.save_config()
-            self.update_ui()
-            
-            QMessageBox.information(self, "Success", f"Bot '{bot_name}' deleted successfully!")
-            
+    def apply_config(self, config, diff):
+        """Apply an edit of the config file made outside the app (see easytgbot.configwatch).
+
+        Only the bots in ``diff`` are touched. Routing changes are swapped into the
+        running worker; a bot is restarted only when its token or the transport changed.
+        """
+        self.add_log("info", f"{os.path.basename(self.config_file)} changed: {diff.summary()}")
+        bots = parse_bots(config.get("bots"))
+        if diff.settings:
+            settings = config.get("settings") or {}
+            self.show_settings(settings)
+            if diff.restart_all and self.daemon_client is None:
+                # Before any bot is added or replaced, so those start once, on the new transport
+                self.transport = TransportConfig.from_settings(settings.get("transport"))
+                self.apply_transport()
+                if self.shard_supervisor is not None:
+                    self.shard_supervisor.set_transport(self.transport.to_settings())
+                replaced = set(diff.removed) | {name for name, change in diff.changed.items() if change.restart}
+                self.lifecycle.restart([(worker, self.fresh_worker(name))
+                                        for name, worker in list(self.bot_workers.items())
+                                        if name not in replaced and worker.lifecycle != "stopped"])
+        if self.daemon_client is not None:
+            # The daemon watches the same file and applies the edit to its bots itself
+            self.mirror_config(bots, diff)
+        else:
+            for name in diff.removed:
+                self.discard_bot(name)
+            for name in diff.added:
+                if name in self.bots:
+                    continue
+                self.bots[name] = bots[name]
+                worker = self.bot_workers[name] = self.create_worker(name, self.bots[name])
+                # Same rule as at startup
+                if self.auto_start_checkbox.isChecked() or self.bots[name].get("status") == "Online":
+                    worker.start()
+            for name, change in diff.changed.items():
+                if name in self.bots:
+                    self.apply_bot_change(name, bots[name], change)
+        self.update_ui()
+        self.show_dispatch_settings(self.bot_select_combo.currentText())
+        self.update_command_tree()
+        
+    def apply_bot_change(self, name, bot_data, change):
+        worker = self.bot_workers.get(name)
+        if change.restart:
+            # Another token is another Telegram bot: replace it like a deleted and re-added one
+            was_running = worker is not None and worker.lifecycle != "stopped"
+            self.discard_bot(name)
+            self.bots[name] = bot_data
+            worker = self.bot_workers[name] = self.create_worker(name, bot_data)
+            if was_running:
+                self.lifecycle.start([worker])
+            return
+        current = self.bots[name]
+        if change.routing:
+            current.update(change.routing)
+            self.push_routing(name)
+        for key, value in change.fields.items():
+            if value is None:
+                current.pop(key, None)
+            else:
+                current[key] = value
+            if worker is None:
+                continue
+            if key == "webhook_url":
+                worker.webhook_url = value
+                if worker.running:
+                    try:
+                        worker.apply_webhook(value)
+                    except Exception as e:
+                        self.add_log("error", f"Failed to set webhook for {name}: {e}")
+            elif key == "dispatch":
+                worker.dispatch = value or {}
+            elif key == "admin_id":
+                worker.admin_id = value
+                
+    def mirror_config(self, bots, diff):
+        """Follow a config edit while attached: update the bots shown, not the daemon's."""
+        for name in diff.removed:
+            worker = self.bot_workers.pop(name, None)
+            if worker is not None:
+                self.retire_worker(worker)
+            self.bots.pop(name, None)
+        for name in diff.added:
+            self.bots[name] = bots[name]
+            self.bot_workers[name] = self.create_worker(name, bots[name])
+        for name, change in diff.changed.items():
+            if name in self.bots:
+                for key in change.routing.keys() | change.fields.keys():
+                    self.bots[name][key] = bots[name].get(key)
+                
     def closeEvent(self, event):
-        # Stop all bots before closing
+        # Detach first: bots hosted by a daemon keep running after the GUI exits
+        if self.daemon_client is not None:
+            self.daemon_client.close()
+        # Stop all bots before closing, giving them a moment to finish their handlers
+        self.config_watcher.stop()
+        self.watchdog.stop()
         self.stop_all_bots()
+        self.lifecycle.wait(STOP_TIMEOUT)
+        self.lifecycle.shutdown()
+        self.webhook_server.stop()
+        self.metrics_server.stop()
+        if self.shard_supervisor is not None:
+            self.shard_supervisor.shutdown()
+        self.async_runtime.shutdown()
+        self.send_scheduler.shutdown()
+        self.message_store.close()
+        self.user_directory.close()
+        self.offset_store.close()
         self.save_config()
+        self.config_writer.stop()
         event.accept()
 
 if __name__ == "__main__":
-    app = QApplication(sys.argv)
-    window = BotManagerApp()
-    window.show()
+    profile = StartupProfile(_IMPORT_STARTED, enabled="--profile-startup" in sys.argv)
+    profile.add_phase("import", time.perf_counter() - _IMPORT_STARTED)
+    with profile.phase("QApplication"):
+        app = QApplication(sys.argv)
+    window = BotManagerApp(profile)
+    with profile.phase("window show"):
+        window.show()
+    profile.milestone("window shown")
     sys.exit(app.exec_())
\ No newline at end of file
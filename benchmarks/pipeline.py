@@ -0,0 +1,376 @@
+"""Throughput benchmark for the bot message pipeline.
+
+Runs N bots against a local stub Bot API (benchmarks/stub_api.py), feeds
+them synthetic updates and measures, per update, the time from being
+queued at the stub until the bot logged it as handled and, for commands
+and auto-replies, until the reply reached the stub's sendMessage. Needs no
+network access.
+
+    python benchmarks/pipeline.py --runtime async --bots 1,10,100,1000 --output results.json
+
+Each bot count runs in a fresh subprocess. Results go to stdout (or
+--output) as JSON; a summary table goes to stderr.
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCH_DIR))
+
+from easytgbot.logbuffer import make_record  # noqa: E402
+
+DEFAULT_BOT_COUNTS = "1,10,100,1000"
+DEFAULT_MIX = "command=0.4,auto_reply=0.3,filtered=0.1,plain=0.2"
+HANDLED_LEVELS = {"command", "auto_reply", "filtered", "message"}
+REPLY_KINDS = {"command", "auto_reply"}
+
+BOT_CONFIG = {
+    "commands": {"start": "Welcome!", "help": "Try /start"},
+    "auto_replies": {"hello": "Hi there", "price": "It's free"},
+    "message_filters": {"spam": True, "bad_words": True},
+}
+TEXTS = {
+    "command": ["/start", "/help", "/start ref42"],
+    "auto_reply": ["hello everyone", "what is the price?", "well hello"],
+    "filtered": ["http://a http://b http://c http://d", "you badword1"],
+    "plain": ["just chatting", "nothing to see here", "another message"],
+}
+
+
+def parse_mix(text):
+    mix = {}
+    for part in text.split(","):
+        kind, _, weight = part.partition("=")
+        kind = kind.strip()
+        if kind not in TEXTS:
+            raise argparse.ArgumentTypeError(f"unknown message kind {kind!r} (choose from {', '.join(TEXTS)})")
+        mix[kind] = float(weight or 1)
+    if not sum(mix.values()) > 0:
+        raise argparse.ArgumentTypeError("mix weights must add up to more than 0")
+    return mix
+
+
+class UpdateGenerator:
+    """Synthetic private-chat messages in a configurable command/auto-reply/filter/plain mix.
+
+    Every message gets a unique sequence number used as message id, user id and chat id,
+    so log lines and replies can be traced back to it without rate limits of one chat
+    serialising the run.
+    """
+
+    def __init__(self, mix, seed=1):
+        self.kinds = list(mix)
+        self.weights = [mix[k] for k in self.kinds]
+        self.random = random.Random(seed)
+        self.seq = 0
+
+    def make(self):
+        self.seq += 1
+        kind = self.random.choices(self.kinds, self.weights)[0]
+        text = self.random.choice(TEXTS[kind])
+        seq = self.seq
+        user = {"id": seq, "is_bot": False, "first_name": "Bench"}
+        message = {"message_id": seq, "date": int(time.time()), "text": text, "from": user,
+                   "chat": {"id": seq, "type": "private", "first_name": "Bench"}}
+        if kind == "command":
+            message["entities"] = [{"type": "bot_command", "offset": 0, "length": len(text.split()[0])}]
+        elif "http" in text:
+            message["entities"] = [{"type": "url", "offset": text.index(word), "length": len(word)}
+                                   for word in text.split() if word.startswith("http")]
+        return seq, kind, {"message": message}
+
+
+def percentile(sorted_values, p):
+    if not sorted_values:
+        return None
+    index = min(len(sorted_values) - 1, max(0, int(round(p / 100.0 * len(sorted_values) + 0.5)) - 1))
+    return sorted_values[index]
+
+
+def latency_summary(samples):
+    values = sorted(samples)
+    ms = lambda v: None if v is None else round(v * 1000, 3)  # noqa: E731
+    return {
+        "count": len(values),
+        "p50": ms(percentile(values, 50)),
+        "p99": ms(percentile(values, 99)),
+        "max": ms(values[-1] if values else None),
+        "mean": ms(sum(values) / len(values) if values else None),
+    }
+
+
+class Scenario:
+    """One run: ``bot_count`` bots of one runtime against a fresh stub API."""
+
+    def __init__(self, runtime, bot_count, updates_per_bot, mix, rate, send_limits, timeout, seed):
+        self.runtime = runtime
+        self.bot_count = bot_count
+        self.updates_per_bot = updates_per_bot
+        self.mix = mix
+        self.rate = rate
+        self.send_limits = send_limits
+        self.timeout = timeout
+        self.generator = UpdateGenerator(mix, seed)
+        self.online = set()
+        self.handled = {}  # seq -> perf_counter when the bot logged it
+        self.errors = 0
+        self.injected = {}  # seq -> (perf_counter, kind, token)
+        self.workers = []
+
+    # Bot callbacks, called on runtime threads
+    def on_log(self, level, message):
+        now = time.perf_counter()
+        if level == "error":
+            self.errors += 1
+            return
+        if level in HANDLED_LEVELS:
+            user = make_record(level, message).user
+            if user:
+                self.handled.setdefault(int(user), now)
+
+    def on_status(self, bot_name, status):
+        if status == "Online":
+            self.online.add(bot_name)
+
+    def setup(self):
+        from stub_api import StubBotAPI
+        from easytgbot.transport import TransportConfig, configure_transport
+        from easytgbot import sendqueue
+
+        self.stub = StubBotAPI().start()
+        self.transport = TransportConfig(base_url=self.stub.base_url, max_connections=max(1000, self.bot_count * 2))
+        configure_transport(self.transport)
+        if not self.send_limits:
+            # Measure our pipeline, not Telegram's per-bot/per-chat caps (in-process runtimes only)
+            sendqueue.BOT_RATE = sendqueue.CHAT_RATE = sendqueue.GROUP_RATE = 1e9
+            sendqueue.BOT_BURST = sendqueue.CHAT_BURST = sendqueue.GROUP_BURST = 1e9
+        getattr(self, "_setup_" + self.runtime)()
+        for i, worker in enumerate(self.workers):
+            worker.commands = BOT_CONFIG["commands"]
+            worker.auto_replies = BOT_CONFIG["auto_replies"]
+            worker.message_filters = BOT_CONFIG["message_filters"]
+
+    def _tokens(self):
+        return [(f"bench{i}", f"{100000 + i}:bench") for i in range(self.bot_count)]
+
+    def _setup_async(self):
+        from easytgbot.aio_runtime import AsyncBotRuntime, AsyncBot
+        from easytgbot.sendqueue import SendScheduler
+
+        self.async_runtime = AsyncBotRuntime()
+        scheduler = SendScheduler(self.async_runtime)
+        for name, token in self._tokens():
+            worker = AsyncBot(name, token, "", self.async_runtime)
+            worker.send_scheduler = scheduler
+            worker.log_signal.connect(self.on_log)
+            worker.status_signal.connect(self.on_status)
+            self.workers.append(worker)
+
+    def _setup_thread(self):
+        os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+        from PyQt5.QtCore import QCoreApplication, Qt
+        from easytgbot.aio_runtime import AsyncBotRuntime
+        from easytgbot.sendqueue import SendScheduler
+        from Easytgmanager import BotWorker
+
+        self.app = QCoreApplication.instance() or QCoreApplication([])
+        scheduler = SendScheduler(AsyncBotRuntime())
+        for name, token in self._tokens():
+            worker = BotWorker(name, token, "")
+            worker.send_scheduler = scheduler
+            worker.log_signal.connect(self.on_log, Qt.DirectConnection)
+            worker.status_signal.connect(self.on_status, Qt.DirectConnection)
+            self.workers.append(worker)
+
+    def _setup_process(self):
+        from easytgbot.sharding import ShardSupervisor, ShardedBot
+
+        self.supervisor = ShardSupervisor(transport_settings=self.transport.to_settings(), on_log=self.on_log)
+        for name, token in self._tokens():
+            worker = ShardedBot(name, token, "", self.supervisor)
+            worker.status_signal.connect(self.on_status)
+            self.workers.append(worker)
+
+    def run(self):
+        started = time.perf_counter()
+        self.setup()
+        for worker in self.workers:
+            worker.start()
+        deadline = time.perf_counter() + self.timeout
+        while len(self.online) < self.bot_count and time.perf_counter() < deadline:
+            time.sleep(0.01)
+        startup = time.perf_counter() - started
+
+        self.inject()
+        expected_replies = sum(1 for _, kind, _ in self.injected.values() if kind in REPLY_KINDS)
+        while time.perf_counter() < deadline:
+            if len(self.handled) >= len(self.injected) and len({sent[3] for sent in list(self.stub.sent)}) >= expected_replies:
+                break
+            time.sleep(0.005)
+        return self.results(startup, expected_replies)
+
+    def inject(self):
+        tokens = [token for _, token in self._tokens()]
+        total = self.bot_count * self.updates_per_bot
+        interval = 1.0 / self.rate if self.rate else 0
+        # Round-robin over bots; with --rate updates are paced, otherwise sent as one burst per bot
+        batches = {token: [] for token in tokens}
+        for n in range(total):
+            token = tokens[n % len(tokens)]
+            seq, kind, update = self.generator.make()
+            if interval:
+                target = self.first_inject + n * interval if n else None
+                if target is not None:
+                    delay = target - time.perf_counter()
+                    if delay > 0:
+                        time.sleep(delay)
+                now = time.perf_counter()
+                if n == 0:
+                    self.first_inject = now
+                self.injected[seq] = (now, kind, token)
+                self.stub.inject(token, [update])
+            else:
+                batches[token].append((seq, kind, update))
+        if not interval:
+            self.first_inject = time.perf_counter()
+            for token, batch in batches.items():
+                now = time.perf_counter()
+                for seq, kind, _ in batch:
+                    self.injected[seq] = (now, kind, token)
+                self.stub.inject(token, [update for _, _, update in batch])
+
+    def results(self, startup, expected_replies):
+        handled_latency = []
+        last = self.first_inject
+        for seq, at in self.handled.items():
+            if seq in self.injected:
+                handled_latency.append(at - self.injected[seq][0])
+                last = max(last, at)
+        replied = {}
+        for at, _, _, reply_to, _ in list(self.stub.sent):
+            if reply_to in self.injected and reply_to not in replied:  # retried sends count once
+                replied[reply_to] = at
+        reply_latency = []
+        for seq, at in replied.items():
+            reply_latency.append(at - self.injected[seq][0])
+            last = max(last, at)
+        duration = max(last - self.first_inject, 1e-9)
+        by_kind = {}
+        for _, kind, _ in self.injected.values():
+            by_kind[kind] = by_kind.get(kind, 0) + 1
+        return {
+            "runtime": self.runtime,
+            "bots": self.bot_count,
+            "updates": len(self.injected),
+            "updates_by_kind": by_kind,
+            "handled": len(handled_latency),
+            "replies": len(reply_latency),
+            "expected_replies": expected_replies,
+            "errors": self.errors,
+            "complete": len(handled_latency) == len(self.injected) and len(reply_latency) >= expected_replies,
+            "startup_s": round(startup, 3),
+            "duration_s": round(duration, 3),
+            "msgs_per_sec": round(len(handled_latency) / duration, 1),
+            "replies_per_sec": round(len(reply_latency) / duration, 1),
+            "handled_latency_ms": latency_summary(handled_latency),
+            "reply_latency_ms": latency_summary(reply_latency),
+        }
+
+
+def environment():
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=BENCH_DIR, capture_output=True,
+                                text=True, timeout=5).stdout.strip() or None
+    except Exception:
+        commit = None
+    return {
+        "python": platform.python_version(),
+        "implementation": platform.python_implementation(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "commit": commit,
+    }
+
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--runtime", choices=["async", "thread", "process"], default="async")
+    parser.add_argument("--bots", default=DEFAULT_BOT_COUNTS, help="comma-separated bot counts (default: %(default)s)")
+    parser.add_argument("--updates-per-bot", type=int, default=20)
+    parser.add_argument("--mix", type=parse_mix, default=parse_mix(DEFAULT_MIX),
+                        help="message kind weights (default: %(default)s)".replace("%(default)s", DEFAULT_MIX))
+    parser.add_argument("--rate", type=float, default=0, help="total updates/sec to inject, 0 = one burst")
+    parser.add_argument("--send-limits", action="store_true",
+                        help="keep Telegram's send rate limits (always on in process mode)")
+    parser.add_argument("--timeout", type=float, default=120, help="seconds per scenario")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--output", help="write JSON results here instead of stdout")
+    parser.add_argument("--scenario", type=int, help=argparse.SUPPRESS)  # internal: run one bot count
+    return parser.parse_args(argv)
+
+
+def run_one(args):
+    scenario = Scenario(args.runtime, args.scenario, args.updates_per_bot, args.mix, args.rate,
+                        args.send_limits, args.timeout, args.seed)
+    result = scenario.run()
+    print(json.dumps(result), flush=True)
+    # Bots and runtimes are not torn down; the process exit does it faster and never hangs
+    os._exit(0)
+
+
+def main(argv=None):
+    args = parse_args(sys.argv[1:] if argv is None else argv)
+    if args.scenario is not None:
+        run_one(args)
+        return 0
+
+    passthrough = ["--runtime", args.runtime, "--updates-per-bot", str(args.updates_per_bot),
+                   "--mix", ",".join(f"{k}={v}" for k, v in args.mix.items()), "--rate", str(args.rate),
+                   "--timeout", str(args.timeout), "--seed", str(args.seed)]
+    if args.send_limits:
+        passthrough.append("--send-limits")
+    results = []
+    for count in [int(c) for c in args.bots.split(",") if c.strip()]:
+        proc = subprocess.run([sys.executable, os.path.abspath(__file__), "--scenario", str(count)] + passthrough,
+                              capture_output=True, text=True, timeout=args.timeout + 60)
+        lines = [line for line in proc.stdout.splitlines() if line.startswith("{")]
+        if proc.returncode != 0 or not lines:
+            result = {"runtime": args.runtime, "bots": count, "error": (proc.stderr or "no output").strip()[-2000:]}
+        else:
+            result = json.loads(lines[-1])
+        results.append(result)
+        print(format_row(result), file=sys.stderr, flush=True)
+
+    report = {
+        "benchmark": "pipeline",
+        "environment": environment(),
+        "config": {"runtime": args.runtime, "updates_per_bot": args.updates_per_bot, "mix": args.mix,
+                   "rate": args.rate, "send_limits": args.send_limits or args.runtime == "process"},
+        "results": results,
+    }
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+    return 0 if all(r.get("complete") for r in results) else 1
+
+
+def format_row(result):
+    if "error" in result:
+        return f"{result['bots']:>5} bots  FAILED: {result['error'].splitlines()[-1] if result['error'] else ''}"
+    h, r = result["handled_latency_ms"], result["reply_latency_ms"]
+    return (f"{result['bots']:>5} bots  {result['handled']:>6}/{result['updates']:<6} handled  "
+            f"{result['msgs_per_sec']:>9.1f} msg/s  handled p50 {h['p50']} ms p99 {h['p99']} ms  "
+            f"reply p50 {r['p50']} ms p99 {r['p99']} ms" + ("" if result["complete"] else "  INCOMPLETE"))
+
+
+if __name__ == "__main__":
+    sys.exit(main())
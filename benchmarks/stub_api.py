@@ -0,0 +1,169 @@
+"""Local fake Telegram Bot API for offline benchmarks.
+
+Serves ``getMe``, ``getUpdates`` (long-polling, honouring ``offset``; like
+Telegram, a new call ends the token's pending one with a 409 conflict),
+``sendMessage``, ``setWebhook`` and ``deleteWebhook`` for any token on an
+aiohttp server running on its own thread. Updates are queued with
+inject(); every sendMessage is timestamped so the benchmark can match
+replies to the update they answer.
+"""
+import asyncio
+import itertools
+import json
+import threading
+import time
+from urllib.parse import parse_qsl
+
+from aiohttp import web
+
+MAX_UPDATES_PER_POLL = 100
+
+
+class _BotState:
+    def __init__(self):
+        self.pending = []  # Update dicts not yet confirmed by offset
+        self.event = asyncio.Event()
+        self.webhook_url = ""
+        self.polls = 0  # getUpdates calls so far; a pending one that is no longer the latest conflicts
+
+
+class _Conflict(Exception):
+    pass
+
+
+class StubBotAPI:
+    def __init__(self, host="127.0.0.1", port=0):
+        self.host = host
+        self.port = port
+        self.loop = None
+        self.bots = {}
+        self.sent = []  # (perf_counter, token, chat_id, reply_to_message_id, text)
+        self.requests = 0
+        self._update_ids = itertools.count(1)
+        self._runner = None
+        self._thread = None
+        self._ready = threading.Event()
+
+    @property
+    def base_url(self):
+        return f"http://{self.host}:{self.port}"
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="stub-bot-api", daemon=True)
+        self._thread.start()
+        self._ready.wait()
+        return self
+
+    def stop(self):
+        if self.loop is not None:
+            asyncio.run_coroutine_threadsafe(self._runner.cleanup(), self.loop).result(5)
+            self.loop.call_soon_threadsafe(self.loop.stop)
+            self._thread.join(5)
+
+    def inject(self, token, updates):
+        """Queue update dicts for ``token`` (``update_id`` is assigned here). Thread-safe."""
+        updates = [dict(u, update_id=next(self._update_ids)) for u in updates]
+        self.loop.call_soon_threadsafe(self._inject, token, updates)
+        return updates
+
+    def _inject(self, token, updates):
+        state = self._state(token)
+        state.pending.extend(updates)
+        state.event.set()
+
+    def _state(self, token):
+        state = self.bots.get(token)
+        if state is None:
+            state = self.bots[token] = _BotState()
+        return state
+
+    def _run(self):
+        self.loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self.loop)
+        app = web.Application()
+        app.router.add_route("*", "/bot{token}/{method}", self._handle)
+        self._runner = web.AppRunner(app, access_log=None)
+        self.loop.run_until_complete(self._runner.setup())
+        site = web.TCPSite(self._runner, self.host, self.port, backlog=4096)
+        self.loop.run_until_complete(site.start())
+        self.port = self._runner.addresses[0][1]
+        self.loop.call_soon(self._ready.set)
+        self.loop.run_forever()
+
+    async def _params(self, request):
+        params = dict(request.query)
+        if request.can_read_body:
+            # telebot sends getUpdates as a GET with a form body, which request.post() ignores
+            if request.content_type == "application/json":
+                params.update(await request.json())
+            elif request.content_type.startswith("multipart/"):
+                reader = await request.multipart()
+                async for part in reader:
+                    params[part.name] = await part.text()
+            else:
+                params.update(parse_qsl(await request.text()))
+        return params
+
+    async def _handle(self, request):
+        self.requests += 1
+        token = request.match_info["token"]
+        method = request.match_info["method"]
+        params = await self._params(request)
+        handler = getattr(self, "_" + method, None)
+        if handler is None:
+            return self._reply(None, ok=False, description=f"Unknown method {method}", code=404)
+        try:
+            return self._reply(await handler(token, params))
+        except _Conflict:
+            return self._reply(None, ok=False, code=409,
+                               description="Conflict: terminated by other getUpdates request")
+
+    @staticmethod
+    def _reply(result, ok=True, description=None, code=200):
+        body = {"ok": ok, "result": result} if ok else {"ok": False, "error_code": code, "description": description}
+        return web.Response(text=json.dumps(body), status=code, content_type="application/json")
+
+    async def _getMe(self, token, params):
+        bot_id = token.split(":", 1)[0]
+        return {"id": int(bot_id) if bot_id.isdigit() else 1, "is_bot": True,
+                "first_name": f"Bench {bot_id}", "username": f"bench_{bot_id}_bot"}
+
+    async def _getUpdates(self, token, params):
+        state = self._state(token)
+        state.polls += 1
+        poll = state.polls
+        state.event.set()  # wakes the previous poll, if any, to fail with a conflict
+        offset = int(params.get("offset") or 0)
+        if offset:
+            state.pending = [u for u in state.pending if u["update_id"] >= offset]
+        if not state.pending:
+            state.event.clear()
+            try:
+                await asyncio.wait_for(state.event.wait(), float(params.get("timeout") or 0))
+            except asyncio.TimeoutError:
+                pass
+            if state.polls != poll:
+                raise _Conflict()
+        limit = int(params.get("limit") or MAX_UPDATES_PER_POLL)
+        return state.pending[:limit]
+
+    async def _sendMessage(self, token, params):
+        now = time.perf_counter()
+        reply_to = params.get("reply_to_message_id")
+        if reply_to is None and params.get("reply_parameters"):
+            reply_parameters = params["reply_parameters"]
+            if isinstance(reply_parameters, str):
+                reply_parameters = json.loads(reply_parameters)
+            reply_to = reply_parameters.get("message_id")
+        chat_id = params.get("chat_id")
+        self.sent.append((now, token, chat_id, int(reply_to) if reply_to is not None else None, params.get("text")))
+        return {"message_id": len(self.sent), "date": int(time.time()),
+                "chat": {"id": int(chat_id), "type": "private"}, "text": params.get("text")}
+
+    async def _setWebhook(self, token, params):
+        self._state(token).webhook_url = params.get("url", "")
+        return True
+
+    async def _deleteWebhook(self, token, params):
+        self._state(token).webhook_url = ""
+        return True
@@ -0,0 +1 @@
+"""GUI-free building blocks used by the EasyTG bot manager."""
@@ -0,0 +1,399 @@
+"""Async runtime: one asyncio event loop on a dedicated thread drives every bot.
+
+Instead of a QThread and a blocking ``polling()`` call per bot, each bot is a
+coroutine doing ``getUpdates`` long-polls on a shared loop, so hundreds of bots
+cost a few sockets and no extra thread stacks.
+"""
+import asyncio
+import threading
+import time
+from datetime import datetime
+
+from .dispatch import AsyncChatDispatcher, chat_key, dispatch_options
+from .lifecycle import LifecycleMixin, DRAIN_TIMEOUT
+from .messagestore import message_record
+from .metrics import bot_metrics
+from .offsets import REFETCH_DELAY
+from .profiling import PROFILER, no_mark
+from .routing import RoutedBotMixin, ROUTED_CONTENT_TYPES
+from .sendqueue import PRIORITY_COMMAND, PRIORITY_AUTO_REPLY
+from .transport import ensure_transport
+from .watchdog import BotHealth
+from .webhook import public_url, webhook_secret
+
+POLL_TIMEOUT = 25  # seconds Telegram holds a getUpdates long-poll open
+RETRY_DELAY = 3  # seconds to wait after a failed getUpdates
+WEBHOOK_RETRY_DELAY = 30  # seconds before retrying a failed setWebhook
+
+
+class Signal:
+    """Minimal stand-in for pyqtSignal when no Qt object is supplied."""
+
+    def __init__(self):
+        self._slots = []
+
+    def connect(self, slot):
+        self._slots.append(slot)
+
+    def emit(self, *args):
+        for slot in list(self._slots):
+            try:
+                slot(*args)
+            except Exception:
+                pass
+
+
+class SignalSet:
+    """Plain-Python equivalent of the log/status/message signals on BotWorker."""
+
+    def __init__(self):
+        self.log_signal = Signal()  # (level, message)
+        self.status_signal = Signal()  # (bot_name, status)
+        self.message_signal = Signal()  # (bot_name, message_data)
+
+
+class AsyncBotRuntime:
+    """Owns the event loop thread that hosts every AsyncBot."""
+
+    def __init__(self):
+        self.loop = None
+        self._thread = None
+        self._ready = threading.Event()
+        self._start_lock = threading.Lock()
+
+    def start(self):
+        # Worker threads call this concurrently; nobody may return before the loop exists
+        with self._start_lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            # The aiohttp session is created lazily on the loop thread; every bot keeps
+            # a long-poll open, so the shared pool must be configured before the first request.
+            ensure_transport()
+            self._ready.clear()
+            self._thread = threading.Thread(target=self._run, name="easytg-async-runtime", daemon=True)
+            self._thread.start()
+            self._ready.wait()
+
+    def _run(self):
+        self.loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self.loop)
+        self.loop.call_soon(self._ready.set)
+        try:
+            self.loop.run_forever()
+        finally:
+            try:
+                self.loop.run_until_complete(self._cleanup())
+            finally:
+                self.loop.close()
+
+    async def _cleanup(self):
+        from telebot import asyncio_helper
+        tasks = [t for t in asyncio.all_tasks() if t is not asyncio.current_task()]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        session = asyncio_helper.session_manager.session
+        if session is not None and not session.closed:
+            await session.close()
+
+    def submit(self, coro):
+        """Schedule a coroutine on the runtime loop from any thread."""
+        self.start()
+        return asyncio.run_coroutine_threadsafe(coro, self.loop)
+
+    def shutdown(self, timeout=5):
+        if self._thread is None or not self._thread.is_alive():
+            return
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self._thread.join(timeout)
+        self._thread = None
+
+
+class AsyncBot(LifecycleMixin, RoutedBotMixin):
+    """A bot hosted on an AsyncBotRuntime. Exposes the same interface as BotWorker."""
+
+    def __init__(self, bot_name, token, admin_id, runtime, signals=None):
+        self.bot_name = bot_name
+        self.token = token
+        self.admin_id = admin_id
+        self.runtime = runtime
+        self.bot = None
+        self.running = False
+        self.webhook_url = None
+        self.auto_replies = {}
+        self.message_filters = {}
+        self.commands = {}
+        self.send_scheduler = None
+        self.webhook_server = None
+        self.offsets = None  # OffsetStore shared by the runtime's bots
+        self.update_log = None
+        self.dispatch = {}  # "dispatch" entry of the bot's config (pool size, queue length)
+        self.dispatcher = None
+        self.health = BotHealth()  # replaced by the host's Watchdog entry for the bot
+        self._mode_changed = None
+        self._poll = None  # the in-flight getUpdates
+
+        # Keep a reference to the signal owner (a QObject in the GUI) alive
+        self.signals = signals if signals is not None else SignalSet()
+        self.log_signal = self.signals.log_signal
+        self.status_signal = self.signals.status_signal
+        self.message_signal = self.signals.message_signal
+        self._future = None
+
+    def start(self):
+        if self.running:
+            return
+        self.running = True
+        self.wanted = True
+        self._set_lifecycle("starting")
+        self._future = self.runtime.submit(self.run())
+
+    def stop(self):
+        """Ask the bot to stop and return at once. Handlers already running are
+        awaited; only the pending long-poll is cancelled."""
+        self.wanted = False
+        self.running = False
+        if self._future is None:
+            return
+        self._future = None
+        if self.lifecycle != "stopped":
+            self._set_lifecycle("stopping")
+        self.runtime.loop.call_soon_threadsafe(self._interrupt)
+
+    def _interrupt(self):
+        if self.dispatcher is not None:
+            self.dispatcher.close()  # also releases a poll waiting for room in the queue
+        if self._mode_changed is not None:
+            self._mode_changed.set()
+        if self._poll is not None:
+            self._poll.cancel()
+
+    def apply_webhook(self, url):
+        if self.bot is None or self._future is None or self._mode_changed is None:
+            return
+        # run() notices the new webhook_url and switches between polling and webhook mode
+        self.runtime.loop.call_soon_threadsafe(self._mode_changed.set)
+
+    async def run(self):
+        # telebot's async client pulls in aiohttp, so it is imported when the first bot starts
+        from telebot.async_telebot import AsyncTeleBot
+        try:
+            self.bot = AsyncTeleBot(self.token)
+            self.bot.start_time = datetime.now()
+            try:
+                self.bot_username = (await self.bot.get_me()).username
+            except Exception:
+                self.bot_username = None
+
+            if self.offsets is not None:
+                self.update_log = self.offsets.log(self.token)
+            workers, queue_size = dispatch_options(self.dispatch)
+            self.dispatcher = AsyncChatDispatcher(workers, queue_size, on_error=self._handler_failed)
+
+            @self.bot.message_handler(func=lambda message: True, content_types=ROUTED_CONTENT_TYPES)
+            async def _handle_message(message):
+                await self._handle_message(message)
+
+            self._mode_changed = asyncio.Event()
+            if not self.running:
+                return  # stopped while connecting
+            self.status_signal.emit(self.bot_name, "Online")
+            self._set_lifecycle("online")
+
+            # Webhook handling: if webhook_url is set, receive updates on the embedded
+            # webhook server, otherwise poll. apply_webhook() switches between the two.
+            while self.running:
+                if self.webhook_url and self.webhook_server is not None:
+                    await self._serve_webhook()
+                    continue
+                if self.webhook_url:
+                    self.log_signal.emit("error", f"[{self.bot_name}] No webhook server available, falling back to polling")
+                try:
+                    await self.bot.remove_webhook()
+                except Exception:
+                    pass
+                await self._poll_updates()
+
+        except Exception as e:
+            self.log_signal.emit("error", f"[{self.bot_name}] Error: {str(e)}")
+        finally:
+            self.running = False
+            await self._drain()
+            self.status_signal.emit(self.bot_name, "Offline")
+            self._set_lifecycle("stopped")
+
+    async def _serve_webhook(self):
+        url = self.webhook_url
+        self._mode_changed.clear()
+        try:
+            self.webhook_server.register(self.bot_name, self.token, self._dispatch_update)
+            await self.webhook_server.start_async()
+            await self.bot.remove_webhook()
+            await self.bot.set_webhook(url=public_url(url, self.token), secret_token=webhook_secret(self.token))
+            self.log_signal.emit("info", f"[{self.bot_name}] Webhook set to {url}")
+        except Exception as e:
+            self.webhook_server.unregister(self.token)
+            self.log_signal.emit("error", f"[{self.bot_name}] Failed to set webhook: {e}")
+            try:
+                await asyncio.wait_for(self._mode_changed.wait(), WEBHOOK_RETRY_DELAY)
+            except asyncio.TimeoutError:
+                pass
+            return
+        try:
+            while self.running and self.webhook_url == url:
+                self._mode_changed.clear()
+                await self._mode_changed.wait()
+        finally:
+            self.webhook_server.unregister(self.token)
+
+    def _dispatch_update(self, update):
+        # Returns a coroutine; the webhook server awaits it, i.e. until the update is queued
+        from telebot import types
+        return self._submit(types.Update.de_json(update))
+
+    async def _submit(self, update):
+        """Queue one update on the dispatcher, skipping it if it was handled before
+        (see offsets.UpdateLog); waits while the queue is full. False once stopping."""
+        update_log = self.update_log
+        if update_log is not None and not update_log.claim(update.update_id):
+            return True
+        if await self.dispatcher.put(chat_key(update), self._run_update, update):
+            self.health.polled()
+            return True
+        if update_log is not None:
+            update_log.release(update.update_id)
+        return False
+
+    async def _run_update(self, update):
+        update_log = self.update_log
+        try:
+            await self.bot.process_new_updates([update])
+        except asyncio.CancelledError:
+            # Cut off by the drain timeout: not handled, and still unconfirmed, so the next poll fetches it again
+            if update_log is not None:
+                update_log.release(update.update_id)
+            raise
+        except Exception:
+            if update_log is not None:
+                update_log.done(update.update_id)
+            raise
+        finally:
+            # Handled updates count as progress while a full queue holds up polling
+            self.health.polled()
+        if update_log is not None:
+            update_log.done(update.update_id)
+
+    def _handler_failed(self, e):
+        self.log_signal.emit("error", f"[{self.bot_name}] Handler error: {e}")
+
+    async def _drain(self):
+        """Give the handlers already queued DRAIN_TIMEOUT to finish; the rest is fetched again by the next poll."""
+        dispatcher = self.dispatcher
+        if dispatcher is None:
+            return
+        dispatcher.close()
+        for (update,) in await dispatcher.join(DRAIN_TIMEOUT):
+            if self.update_log is not None:
+                self.update_log.release(update.update_id)
+
+    async def _poll_updates(self):
+        # Continue after the last handled update, also when coming back from webhook mode
+        offset = self.update_log.resume_offset() if self.update_log is not None else None
+        self.health.set_polling(True)
+        try:
+            await self._poll_loop(offset)
+        finally:
+            self.health.set_polling(False)
+
+    async def _poll_loop(self, offset):
+        # Returns once webhook mode takes over (after the current long-poll)
+        update_log = self.update_log
+        while self.running and not (self.webhook_url and self.webhook_server is not None):
+            if update_log is not None:
+                # Never confirm an update before it is handled; running ones come back and are skipped
+                offset = update_log.resume_offset()
+            try:
+                updates = await self._interruptible(self.bot.get_updates(offset=offset, timeout=POLL_TIMEOUT,
+                                                                         request_timeout=POLL_TIMEOUT + 10))
+            except Exception as e:
+                self.log_signal.emit("error", f"[{self.bot_name}] Polling error: {e}")
+                await self._interruptible(asyncio.sleep(RETRY_DELAY))
+                continue
+            if updates is not None:
+                self.health.polled()
+                if update_log is not None:
+                    update_log.polled(offset, [update.update_id for update in updates])
+            if updates:
+                highest = update_log.highest if update_log is not None else None
+                offset = updates[-1].update_id + 1
+                for update in updates:
+                    if not await self._submit(update):
+                        break  # stopping
+                if highest is not None and update_log.highest == highest:
+                    # Nothing new, only updates still running: give their handlers time
+                    await self._interruptible(asyncio.sleep(REFETCH_DELAY))
+
+    async def _interruptible(self, awaitable):
+        """Await ``awaitable`` unless stop() cancels it, which returns None instead."""
+        self._poll = asyncio.ensure_future(awaitable)
+        try:
+            return await self._poll
+        except asyncio.CancelledError:
+            if self.running:
+                raise  # the whole bot is being cancelled, not just this wait
+            return None
+        finally:
+            self._poll = None
+
+    async def send_reply(self, message, text, priority, error_text):
+        """Queue a reply on the shared send scheduler, or send it inline without one."""
+        def on_error(e):
+            self.log_signal.emit("error", f"[{self.bot_name}] {error_text}: {e}")
+
+        bot = self.bot
+        if self.send_scheduler is None:
+            try:
+                await bot.reply_to(message, text)
+            except Exception as e:
+                bot_metrics(self.bot_name).send_errors.inc()
+                on_error(e)
+            return
+        self.send_scheduler.submit(self.bot_name, message.chat.id, lambda: bot.reply_to(message, text),
+                                   priority, on_error=on_error)
+
+    async def _handle_message(self, message):
+        started = time.perf_counter()
+        timer = PROFILER.begin()
+        mark = timer.mark if timer is not None else no_mark
+        route = self.router.route(message, self.bot_username, timer, self.bot_name)
+        user_id = getattr(message.from_user, 'id', 'unknown')
+        try:
+            if route.kind == "filtered":
+                self.log_signal.emit("filtered", f"[{self.bot_name}] Message filtered: {route.key} from {user_id}")
+                mark("handler;log_emit")
+                return
+
+            if route.kind == "command":
+                self.log_signal.emit("command", f"[{self.bot_name}] Command /{route.key} from {user_id}")
+                mark("handler;log_emit")
+                await self.send_reply(message, route.response, PRIORITY_COMMAND,
+                                      f"Failed to reply to command /{route.key}")
+                mark("handler;reply")
+                return
+
+            if route.kind == "auto_reply":
+                self.log_signal.emit("auto_reply", f"[{self.bot_name}] Auto-reply triggered for '{route.key}' from {user_id}")
+                mark("handler;log_emit")
+                await self.send_reply(message, route.response, PRIORITY_AUTO_REPLY,
+                                      f"Failed to send auto-reply for '{route.key}'")
+                mark("handler;reply")
+                return
+
+            # Default: emit message log
+            text = getattr(message, "text", None) or ""
+            self.log_signal.emit("message", f"[{self.bot_name}] From {user_id}: {text[:200]}")
+            mark("handler;log_emit")
+        finally:
+            self.message_signal.emit(self.bot_name, message_record(message, route.kind))
+            bot_metrics(self.bot_name).observe(route.kind, time.perf_counter() - started)
+            PROFILER.commit(self.bot_name, timer)
@@ -0,0 +1,88 @@
+"""Aho-Corasick multi-pattern matching, shared by auto-replies and word lists."""
+from collections import deque
+
+
+class AhoCorasick:
+    """Multi-pattern substring matcher over a fixed set of patterns.
+
+    ``search`` returns the index of the earliest-added pattern that occurs in
+    the text, in time linear in the text length whatever the pattern count;
+    ``finditer`` yields every occurrence.
+    """
+
+    def __init__(self, patterns):
+        self.lengths = []
+        self._goto = [{}]
+        self._fail = [0]
+        self._out = [None]  # lowest pattern index ending at (or via fail links of) each state
+        self._term = [None]  # lowest pattern index ending exactly at each state
+        self._next_out = [0]  # nearest state on the fail chain with a _term (0: none)
+        for index, pattern in enumerate(patterns):
+            self._add(pattern, index)
+        self._build()
+
+    def _add(self, pattern, index):
+        self.lengths.append(len(pattern))
+        state = 0
+        for ch in pattern:
+            nxt = self._goto[state].get(ch)
+            if nxt is None:
+                nxt = len(self._goto)
+                self._goto[state][ch] = nxt
+                self._goto.append({})
+                self._fail.append(0)
+                self._out.append(None)
+                self._term.append(None)
+                self._next_out.append(0)
+            state = nxt
+        if self._out[state] is None or index < self._out[state]:
+            self._out[state] = index
+        if self._term[state] is None:
+            self._term[state] = index
+
+    def _build(self):
+        queue = deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for ch, nxt in self._goto[state].items():
+                queue.append(nxt)
+                fallback = self._fail[state]
+                while fallback and ch not in self._goto[fallback]:
+                    fallback = self._fail[fallback]
+                target = self._goto[fallback].get(ch, 0)
+                self._fail[nxt] = target if target != nxt else 0
+                inherited = self._out[self._fail[nxt]]
+                if inherited is not None and (self._out[nxt] is None or inherited < self._out[nxt]):
+                    self._out[nxt] = inherited
+                fail = self._fail[nxt]
+                self._next_out[nxt] = fail if self._term[fail] is not None else self._next_out[fail]
+
+    def search(self, text):
+        goto, fail, out = self._goto, self._fail, self._out
+        state = 0
+        best = None
+        for ch in text:
+            while state and ch not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(ch, 0)
+            found = out[state]
+            if found is not None and (best is None or found < best):
+                best = found
+                if best == 0:
+                    break
+        return best
+
+    def finditer(self, text):
+        """(end, pattern index) of every occurrence, ``end`` exclusive, in order of ``end``."""
+        goto, fail, out, term, next_out = self._goto, self._fail, self._out, self._term, self._next_out
+        state = 0
+        for position, ch in enumerate(text):
+            while state and ch not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(ch, 0)
+            if out[state] is None:
+                continue
+            match = state if term[state] is not None else next_out[state]
+            while match:
+                yield position + 1, term[match]
+                match = next_out[match]
@@ -0,0 +1,227 @@
+"""Per-bot bad-word lists compiled into one Aho-Corasick automaton each.
+
+A bot's ``message_filters["bad_words"]`` is either ``true`` (the built-in
+list) or a spec::
+
+    {"files": ["words/en.txt"], "words": ["extra"], "whole_words": true}
+
+Files hold one entry per line (``#`` starts a comment). An entry matches as
+a whole word when ``whole_words`` is on (the default for lists of your own;
+the built-in list matches anywhere in the text unless the spec turns it on);
+a leading or trailing ``*`` drops the boundary on that side, so ``*word*``
+matches anywhere.
+
+Entries and messages go through the same normalization (NFKC, casefold,
+look-alike letters and leetspeak mapped to plain Latin), so "B4DW0RD" and
+"ｂａｄｗｏｒｄ" hit "badword". Matching walks the message once, whatever the
+list size. Lists are compiled on a background thread, which also re-reads
+the files when they change, and the new matcher replaces the old one in a
+single assignment.
+"""
+import os
+import threading
+import unicodedata
+
+from .automaton import AhoCorasick
+
+DEFAULT_WORDS = ("badword1", "badword2", "badword3")
+WATCH_INTERVAL = 2.0  # seconds between checks of the list files
+
+# Look-alike letters (Cyrillic, Greek) and leetspeak, applied after casefold
+_FOLD = str.maketrans({
+    "а": "a", "в": "b", "е": "e", "ё": "e", "к": "k", "м": "m", "н": "h", "о": "o", "р": "p",
+    "с": "c", "т": "t", "у": "y", "х": "x", "і": "i", "ј": "j", "ѕ": "s", "ԁ": "d", "ԛ": "q",
+    "ԝ": "w", "α": "a", "β": "b", "ε": "e", "ι": "i", "κ": "k", "ν": "v", "ο": "o", "ρ": "p",
+    "τ": "t", "υ": "u", "χ": "x",
+    "0": "o", "1": "i", "3": "e", "4": "a", "5": "s", "7": "t", "8": "b", "9": "g",
+    "@": "a", "$": "s",
+})
+
+
+def normalize(text):
+    return unicodedata.normalize("NFKC", text).casefold().translate(_FOLD)
+
+
+def is_word_char(ch):
+    return ch.isalnum() or ch == "_"
+
+
+class WordMatcher:
+    """Compiled word list; ``search(text)`` returns the first entry found, or None."""
+
+    def __init__(self, entries, whole_words=True):
+        self.entries = []
+        self._bounds = []  # per pattern: (boundary required before, boundary required after)
+        patterns = []
+        seen = set()
+        for entry in entries:
+            entry = entry.strip()
+            before = after = whole_words
+            if entry.startswith("*"):
+                before, entry = False, entry[1:]
+            if entry.endswith("*"):
+                after, entry = False, entry[:-1]
+            pattern = normalize(entry.strip())
+            if not pattern or (pattern, before, after) in seen:
+                continue
+            seen.add((pattern, before, after))
+            self.entries.append(entry)
+            self._bounds.append((before, after))
+            patterns.append(pattern)
+        self._matcher = AhoCorasick(patterns) if patterns else None
+
+    def __len__(self):
+        return len(self.entries)
+
+    def search(self, text):
+        if self._matcher is None or not text:
+            return None
+        text = normalize(text)
+        lengths, bounds = self._matcher.lengths, self._bounds
+        for end, index in self._matcher.finditer(text):
+            before, after = bounds[index]
+            if before:
+                start = end - lengths[index]
+                if start > 0 and is_word_char(text[start - 1]):
+                    continue
+            if after and end < len(text) and is_word_char(text[end]):
+                continue
+            return self.entries[index]
+        return None
+
+
+DEFAULT_MATCHER = WordMatcher(DEFAULT_WORDS, whole_words=False)
+
+
+def read_word_file(path):
+    entries = []
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            line = line.split("#", 1)[0].strip()
+            if line:
+                entries.append(line)
+    return entries
+
+
+def _spec_key(spec):
+    """Hashable form of a spec; ``True`` and ``{}`` are the built-in list."""
+    if not isinstance(spec, dict):
+        return DEFAULT_WORDS, (), False
+    words = tuple(spec.get("words") or ())
+    files = tuple(os.path.abspath(path) for path in spec.get("files") or ())
+    if not words and not files:
+        # The built-in list keeps its original substring matching
+        return DEFAULT_WORDS, (), bool(spec.get("whole_words", False))
+    return words, files, bool(spec.get("whole_words", True))
+
+
+def _file_stamp(path):
+    try:
+        st = os.stat(path)
+        return st.st_mtime_ns, st.st_size
+    except OSError:
+        return None
+
+
+class BadWordsRegistry:
+    """Compiled matchers per bot; bots with the same lists and files share one."""
+
+    def __init__(self):
+        self.on_error = None  # called with (bot_name, message) from the compiler thread
+        self._keys = {}  # bot_name -> spec key
+        self._matchers = {}  # bot_name -> WordMatcher
+        self._compiled = {}  # (spec key, file stamps) -> WordMatcher, only for keys some bot uses
+        self._pending = set()
+        self._building = False
+        self._cond = threading.Condition()
+        self._thread = None
+
+    def matcher(self, bot_name):
+        return self._matchers.get(bot_name, DEFAULT_MATCHER)
+
+    def configure(self, bot_name, spec):
+        """Use ``spec`` for ``bot_name``; the current matcher stays in use until the new one is built."""
+        key = _spec_key(spec)
+        with self._cond:
+            if self._keys.get(bot_name) == key:
+                return
+            self._keys[bot_name] = key
+            if key == _spec_key(True):
+                self._matchers[bot_name] = DEFAULT_MATCHER
+                return
+            self._pending.add(bot_name)
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="easytg-bad-words", daemon=True)
+                self._thread.start()
+            self._cond.notify()
+
+    def remove(self, bot_name):
+        with self._cond:
+            self._keys.pop(bot_name, None)
+            self._matchers.pop(bot_name, None)
+            self._pending.discard(bot_name)
+
+    def wait(self, timeout=5):
+        """Block until every pending list is compiled (for tests and the daemon's startup)."""
+        with self._cond:
+            self._cond.wait_for(lambda: not self._pending and not self._building, timeout)
+
+    def _run(self):
+        while True:
+            with self._cond:
+                if not self._pending:
+                    self._cond.wait(WATCH_INTERVAL)
+                pending, self._pending = self._pending, set()
+                if not pending:
+                    # Nothing queued: look for edited files
+                    pending = {name for name, key in self._keys.items() if key[1]}
+                self._building = True
+            try:
+                for bot_name in pending:
+                    self._compile(bot_name)
+                self._prune()
+            finally:
+                with self._cond:
+                    self._building = False
+                    self._cond.notify_all()
+
+    def _compile(self, bot_name):
+        key = self._keys.get(bot_name)
+        if key is None:
+            return
+        words, files, whole_words = key
+        stamps = tuple(_file_stamp(path) for path in files)
+        cache_key = (key, stamps)
+        matcher = self._compiled.get(cache_key)
+        if matcher is None:
+            entries = list(words)
+            for path in files:
+                try:
+                    entries.extend(read_word_file(path))
+                except (OSError, UnicodeDecodeError) as e:
+                    self._report(bot_name, f"Cannot read bad-words list {path}: {e}")
+            matcher = WordMatcher(entries, whole_words)
+            # Forget builds of older file versions
+            for old in [k for k in self._compiled if k[0] == key]:
+                del self._compiled[old]
+            self._compiled[cache_key] = matcher
+        with self._cond:
+            if self._keys.get(bot_name) == key and self._matchers.get(bot_name) is not matcher:
+                self._matchers[bot_name] = matcher
+
+    def _prune(self):
+        # Drop builds that no bot uses any more (removed bots, replaced specs)
+        with self._cond:
+            live = set(self._keys.values())
+        for old in [k for k in self._compiled if k[0] not in live]:
+            del self._compiled[old]
+
+    def _report(self, bot_name, message):
+        if self.on_error is not None:
+            try:
+                self.on_error(bot_name, message)
+            except Exception:
+                pass
+
+
+BAD_WORDS = BadWordsRegistry()
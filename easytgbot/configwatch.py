@@ -0,0 +1,233 @@
+"""Live reload of bots.easytg.
+
+A ConfigWatcher thread notices when the config file changes and parses it.
+On Linux, inotify on the file's directory wakes it at once; elsewhere, or
+if inotify is unavailable, it compares the file's stat every
+POLL_INTERVAL seconds. Saves go through an atomic rename, so the directory
+is watched rather than the file.
+
+The new config is compared with the last one known, which is the last
+config loaded or written by the app itself, so the app's own saves produce
+no change. diff_config() reduces the difference to a ConfigDiff:
+
+- bots added or removed;
+- per changed bot, the routing parts that differ (swapped into the running
+  worker's router in one assignment), its other changed fields, and
+  whether it needs a restart (only when its token changed);
+- changed settings, and whether the transport changed, which restarts
+  every running bot.
+
+The host applies the diff on its own thread via ``on_change(config, diff)``.
+"""
+import ctypes
+import ctypes.util
+import json
+import os
+import select
+import struct
+import sys
+import threading
+from collections import namedtuple
+
+POLL_INTERVAL = 2.0  # seconds between stat checks (also the fallback without inotify)
+SETTLE_DELAY = 0.1  # seconds to let an in-place edit finish before reading
+
+# inotify(7) event bits
+IN_MODIFY = 0x002
+IN_CLOSE_WRITE = 0x008
+IN_MOVED_TO = 0x080
+IN_CREATE = 0x100
+_EVENT = struct.Struct("iIII")
+
+# Written by the app while bots run, not configuration
+RUNTIME_FIELDS = frozenset(("status", "start_time", "uptime"))
+ROUTING_FIELDS = ("commands", "auto_replies", "message_filters")
+RESTART_FIELDS = frozenset(("token",))
+
+# routing: {part: new value} for the changed parts of the router;
+# fields: {field: new value} for other changed fields; restart: the worker must be replaced
+BotChange = namedtuple("BotChange", "routing fields restart")
+
+
+class ConfigDiff(namedtuple("ConfigDiff", "added removed changed settings restart_all")):
+    """added: {name: bot_data}; removed: [name]; changed: {name: BotChange};
+    settings: {key: new value}; restart_all: the transport changed."""
+
+    def __bool__(self):
+        return bool(self.added or self.removed or self.changed or self.settings)
+
+    def summary(self):
+        parts = []
+        for label, count in (("added", len(self.added)), ("removed", len(self.removed)),
+                             ("changed", len(self.changed))):
+            if count:
+                parts.append(f"{count} bot(s) {label}")
+        if self.settings:
+            parts.append("settings: " + ", ".join(sorted(self.settings)))
+        return "; ".join(parts) or "no changes"
+
+
+def diff_bot(old, new):
+    """BotChange between two configs of one bot, or None if nothing that matters changed."""
+    routing, fields = {}, {}
+    for key in set(old) | set(new):
+        if key in RUNTIME_FIELDS or old.get(key) == new.get(key):
+            continue
+        if key in ROUTING_FIELDS:
+            routing[key] = new.get(key) or {}
+        else:
+            fields[key] = new.get(key)
+    if not routing and not fields:
+        return None
+    return BotChange(routing, fields, bool(RESTART_FIELDS & set(fields)))
+
+
+def diff_config(old, new):
+    old_bots = (old or {}).get("bots") or {}
+    new_bots = (new or {}).get("bots") or {}
+    added = {name: data for name, data in new_bots.items() if name not in old_bots}
+    removed = [name for name in old_bots if name not in new_bots]
+    changed = {}
+    for name in old_bots.keys() & new_bots.keys():
+        change = diff_bot(old_bots[name], new_bots[name])
+        if change is not None:
+            changed[name] = change
+    old_settings = (old or {}).get("settings") or {}
+    new_settings = (new or {}).get("settings") or {}
+    settings = {key: new_settings.get(key) for key in set(old_settings) | set(new_settings)
+                if old_settings.get(key) != new_settings.get(key)}
+    return ConfigDiff(added, removed, changed, settings, "transport" in settings)
+
+
+def _inotify_watch(directory):
+    """Non-blocking inotify fd watching ``directory``, or None where inotify is unavailable."""
+    if not sys.platform.startswith("linux"):
+        return None
+    try:
+        libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+        fd = libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+    except (OSError, AttributeError):
+        return None
+    if fd < 0:
+        return None
+    mask = IN_MODIFY | IN_CLOSE_WRITE | IN_MOVED_TO | IN_CREATE
+    if libc.inotify_add_watch(fd, os.fsencode(directory), mask) < 0:
+        os.close(fd)
+        return None
+    return fd
+
+
+def _event_names(data):
+    names = set()
+    offset = 0
+    while offset + _EVENT.size <= len(data):
+        _, _, _, length = _EVENT.unpack_from(data, offset)
+        offset += _EVENT.size
+        names.add(os.fsdecode(data[offset:offset + length].rstrip(b"\0")))
+        offset += length
+    return names
+
+
+def _stamp(path):
+    try:
+        st = os.stat(path)
+        return st.st_mtime_ns, st.st_size, st.st_ino
+    except OSError:
+        return None
+
+
+class ConfigWatcher:
+    """Watches one config file; ``on_change(config, diff)`` and ``on_error(message)``
+    are called on the watcher's thread."""
+
+    def __init__(self, path, on_change, on_error=None, interval=POLL_INTERVAL):
+        self.path = os.path.abspath(path)
+        self.on_change = on_change
+        self.on_error = on_error
+        self.interval = interval
+        self.reloads = 0
+        self.inotify = False  # whether changes are noticed through inotify
+        self._known = None  # last config loaded, written or applied
+        self._stamp = None
+        self._lock = threading.Lock()
+        self._stopping = threading.Event()
+        self._thread = None
+
+    def expect(self, config):
+        """Record ``config`` as the file's content: the app loaded or is about to write it."""
+        with self._lock:
+            self._known = config
+
+    def written(self, filename, data):
+        """ConfigWriter.on_write hook: the app's own saves are not changes."""
+        if os.path.abspath(filename) == self.path:
+            self.expect(data)
+
+    def start(self, config=None):
+        if config is not None:
+            self.expect(config)
+        if self._thread is not None:
+            return
+        self._stamp = _stamp(self.path)
+        self._stopping.clear()
+        self._thread = threading.Thread(target=self._run, name="easytg-config-watch", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stopping.set()
+        if self._thread is not None:
+            self._thread.join(self.interval + 1)
+            self._thread = None
+
+    def _run(self):
+        fd = _inotify_watch(os.path.dirname(self.path))
+        self.inotify = fd is not None
+        name = os.path.basename(self.path)
+        try:
+            while not self._stopping.is_set():
+                if fd is None:
+                    self._stopping.wait(self.interval)
+                else:
+                    ready, _, _ = select.select([fd], [], [], self.interval)
+                    if ready:
+                        try:
+                            names = _event_names(os.read(fd, 65536))
+                        except BlockingIOError:
+                            names = ()
+                        if name in names:
+                            self._stopping.wait(SETTLE_DELAY)
+                if not self._stopping.is_set():
+                    self.check()
+        finally:
+            if fd is not None:
+                os.close(fd)
+
+    def check(self):
+        """Reload the file if it changed since the last check."""
+        stamp = _stamp(self.path)
+        if stamp is None or stamp == self._stamp:
+            return
+        self._stamp = stamp
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                config = json.load(f)
+        except (OSError, ValueError) as e:
+            # Half-written by an editor, or broken: keep running on the previous config
+            self._report(f"Ignored unreadable {os.path.basename(self.path)}: {e}")
+            return
+        if not isinstance(config, dict):
+            self._report(f"Ignored {os.path.basename(self.path)}: not a JSON object")
+            return
+        with self._lock:
+            diff = diff_config(self._known, config)
+            self._known = config
+        if diff:
+            self.reloads += 1
+            self.on_change(config, diff)
+
+    def _report(self, message):
+        if self.on_error is not None:
+            try:
+                self.on_error(message)
+            except Exception:
+                pass
@@ -0,0 +1,295 @@
+"""Local control socket of the headless daemon.
+
+The daemon listens on a Unix socket (a named pipe on Windows) next to its
+config file; clients authenticate with the key in ``<config>.key``, which
+only the owning user can read. The protocol is the one shards use: clients
+send ``("start", name, spec)``, ``("stop", name)``, ``("routing", ...)``,
+``("webhook", name, url)``, ``("remove", name)`` and ``("profiling", rate,
+reset)``; after ``("subscribe",)``
+the daemon streams ``("snapshot", {name: status})``, ``("status", name,
+status)``, batched ``("logs", [(level, message), ...])`` and once a second
+``("metrics", {name: snapshot})`` (plus ``("profile", totals)`` while
+profiling) back.
+"""
+import hashlib
+import os
+import secrets
+import sys
+import threading
+import time
+from collections import deque
+from multiprocessing.connection import Client, Listener
+
+from .core import new_bot_data
+from .metrics import REGISTRY, EXPORT_INTERVAL
+from .profiling import PROFILER
+from .sharding import ShardedBot
+
+LOG_FLUSH_INTERVAL = 0.05
+
+
+def control_address(config_file):
+    path = os.path.abspath(config_file)
+    if sys.platform == "win32":
+        return r"\\.\pipe\easytg-" + hashlib.sha1(path.encode()).hexdigest()[:16]
+    return path + ".sock"
+
+
+def authkey_path(config_file):
+    return os.path.abspath(config_file) + ".key"
+
+
+def load_authkey(config_file, create=False):
+    path = authkey_path(config_file)
+    try:
+        with open(path, 'r') as f:
+            return bytes.fromhex(f.read().strip())
+    except FileNotFoundError:
+        if not create:
+            raise
+    key = secrets.token_bytes(32)
+    fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+    with os.fdopen(fd, 'w') as f:
+        f.write(key.hex())
+    return key
+
+
+def daemon_running(config_file):
+    """True if a daemon is serving ``config_file`` on its control socket."""
+    address = control_address(config_file)
+    if sys.platform != "win32" and not os.path.exists(address):
+        return False
+    try:
+        Client(address, authkey=load_authkey(config_file)).close()
+    except Exception:
+        return False
+    return True
+
+
+class ControlServer:
+    """Serves a BotManager to local clients such as an attached GUI."""
+
+    def __init__(self, manager, address, authkey):
+        self.manager = manager
+        self.address = address
+        self.authkey = authkey
+        self._listener = None
+        self._subscribers = []
+        self._lock = threading.Lock()
+        self._logs = deque()
+        self._stopped = threading.Event()
+
+    def start(self):
+        if self.address.startswith(os.sep) and os.path.exists(self.address):
+            # Left behind by a daemon that did not exit cleanly?
+            try:
+                Client(self.address, authkey=self.authkey).close()
+            except Exception:
+                os.remove(self.address)
+            else:
+                raise RuntimeError(f"Another daemon is already listening on {self.address}")
+        self._listener = Listener(self.address, authkey=self.authkey)
+        threading.Thread(target=self._accept_loop, name="easytg-control", daemon=True).start()
+        threading.Thread(target=self._flush_logs, name="easytg-control-logs", daemon=True).start()
+
+    def stop(self):
+        self._stopped.set()
+        for conn in list(self._subscribers):
+            conn.close()
+        if self._listener is not None:
+            self._listener.close()
+            self._listener = None
+
+    def publish_log(self, level, message):
+        if self._subscribers:
+            self._logs.append((level, message))
+
+    def publish_status(self, bot_name, status):
+        self._broadcast(("status", bot_name, status))
+
+    def _broadcast(self, message):
+        for conn in list(self._subscribers):
+            try:
+                conn.send(message)
+            except (OSError, ValueError):
+                self._drop(conn)
+
+    def _drop(self, conn):
+        try:
+            self._subscribers.remove(conn)
+        except ValueError:
+            pass
+        conn.close()
+
+    def _flush_logs(self):
+        next_metrics = time.monotonic() + EXPORT_INTERVAL
+        while not self._stopped.wait(LOG_FLUSH_INTERVAL):
+            batch = []
+            while self._logs:
+                batch.append(self._logs.popleft())
+            if batch:
+                self._broadcast(("logs", batch))
+            if time.monotonic() >= next_metrics:
+                next_metrics += EXPORT_INTERVAL
+                if self._subscribers:
+                    self._broadcast(("metrics", REGISTRY.export()))
+                    if PROFILER.enabled:
+                        self._broadcast(("profile", PROFILER.export()))
+
+    def _accept_loop(self):
+        while not self._stopped.is_set():
+            try:
+                conn = self._listener.accept()
+            except Exception:
+                if self._stopped.is_set() or self._listener is None:
+                    return
+                continue
+            threading.Thread(target=self._serve, args=(conn,), name="easytg-control-client", daemon=True).start()
+
+    def _serve(self, conn):
+        while True:
+            try:
+                message = conn.recv()
+            except (EOFError, OSError):
+                break
+            try:
+                with self._lock:
+                    self.handle(conn, message)
+            except Exception as e:
+                self.manager._log("error", f"Control command {message[0]!r} failed: {e}")
+        self._drop(conn)
+
+    def handle(self, conn, message):
+        manager = self.manager
+        kind = message[0]
+        if kind == "subscribe":
+            conn.send(("snapshot", manager.status()))
+            self._subscribers.append(conn)
+        elif kind == "start":
+            _, name, spec = message
+            if name not in manager.bots or manager.bots[name].get("token") != spec["token"]:
+                bot_data = new_bot_data(spec["token"], spec["admin_id"])
+                bot_data.update(spec)
+                manager.add_bot(name, bot_data)
+            else:
+                manager.update_routing(name, spec["commands"], spec["auto_replies"], spec["message_filters"])
+                if manager.bots[name].get("webhook_url") != spec["webhook_url"]:
+                    manager.set_webhook(name, spec["webhook_url"])
+                if manager.bots[name].get("dispatch") != spec.get("dispatch"):
+                    manager.set_dispatch(name, spec.get("dispatch"))
+            manager.start_bot(name)
+        elif kind == "stop":
+            manager.stop_bot(message[1])
+        elif kind == "routing":
+            manager.update_routing(*message[1:5])
+        elif kind == "webhook":
+            manager.set_webhook(message[1], message[2])
+        elif kind == "remove":
+            manager.remove_bot(message[1])
+        elif kind == "profiling":
+            manager.set_profile_rate(message[1], reset=message[2])
+            self._broadcast(("profile", PROFILER.export()))
+
+
+class RemoteBot(ShardedBot):
+    """A bot hosted by a daemon; the GUI drives it exactly like a bot on a shard."""
+
+
+class ControlClient:
+    """Connection from the GUI to a running daemon. Quacks like ShardSupervisor for RemoteBot.
+
+    ``on_log`` and ``on_disconnect`` are called on the client's reader thread.
+    """
+
+    def __init__(self, address, authkey, on_log=None, on_disconnect=None):
+        self.address = address
+        self.authkey = authkey
+        self.on_log = on_log
+        self.on_disconnect = on_disconnect
+        self.bots = {}
+        self._conn = None
+        self._send_lock = threading.Lock()
+
+    @classmethod
+    def for_config(cls, config_file, **callbacks):
+        return cls(control_address(config_file), load_authkey(config_file), **callbacks)
+
+    def connect(self):
+        self._conn = Client(self.address, authkey=self.authkey)
+        self._conn.send(("subscribe",))
+        threading.Thread(target=self._read_loop, name="easytg-control-client", daemon=True).start()
+
+    def close(self):
+        conn, self._conn = self._conn, None
+        if conn is not None:
+            conn.close()
+
+    @property
+    def connected(self):
+        return self._conn is not None
+
+    # ShardSupervisor interface used by ShardedBot
+    def start(self):
+        pass
+
+    def shard_for(self, bot_name):
+        return 0
+
+    def attach(self, bot):
+        self.bots[bot.bot_name] = bot
+
+    def remove(self, bot_name):
+        self.bots.pop(bot_name, None)
+        self.send(bot_name, ("remove", bot_name))
+
+    def is_alive(self, bot_name):
+        return self._conn is not None
+
+    def send(self, bot_name, message):
+        conn = self._conn
+        if conn is None:
+            return
+        try:
+            with self._send_lock:
+                conn.send(message)
+        except (OSError, ValueError):
+            self.close()
+
+    def _read_loop(self):
+        conn = self._conn
+        while True:
+            try:
+                message = conn.recv()
+            except (EOFError, OSError):
+                break
+            kind = message[0]
+            if kind == "logs":
+                if self.on_log is not None:
+                    for level, text in message[1]:
+                        self.on_log(level, text)
+            elif kind == "metrics":
+                REGISTRY.load_remote("daemon", message[1])
+            elif kind == "profile":
+                PROFILER.load_remote("daemon", message[1])
+            elif kind == "snapshot":
+                for name, status in message[1].items():
+                    bot = self.bots.get(name)
+                    if bot is not None:
+                        bot.wanted = status == "Online"
+                        bot.observe_status(status)
+                        bot.status_signal.emit(name, status)
+            elif kind == "status":
+                bot = self.bots.get(message[1])
+                if bot is not None:
+                    if message[2] == "Offline":
+                        bot.wanted = False
+                    elif message[2] == "Online":
+                        bot.wanted = True
+                    bot.observe_status(message[2])
+                    bot.status_signal.emit(message[1], message[2])
+        REGISTRY.drop_remote("daemon")
+        PROFILER.drop_remote("daemon")
+        if self._conn is conn:
+            self._conn = None
+            if self.on_disconnect is not None:
+                self.on_disconnect()
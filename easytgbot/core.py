@@ -0,0 +1,372 @@
+"""GUI-free bot manager: config loading, worker lifecycle and routing.
+
+The headless daemon runs bots through BotManager; the Qt app shares the
+config (de)serialization helpers so both read and write the same
+bots.easytg.
+"""
+import copy
+from datetime import datetime
+
+from .aio_runtime import AsyncBotRuntime, AsyncBot
+from .badwords import BAD_WORDS
+from .configwatch import ConfigWatcher
+from .lifecycle import LifecycleController, STOP_TIMEOUT
+from .messagestore import MessageStore, message_store_path
+from .metrics import REGISTRY
+from .offsets import OffsetStore, offset_store_path
+from .profiling import PROFILER
+from .persistence import ConfigWriter, load_json_with_recovery
+from .sendqueue import SendScheduler
+from .spam import SPAM
+from .transport import TransportConfig, configure_transport
+from .userdirectory import UserDirectory, user_directory_path
+from .watchdog import Watchdog
+from .webhook import WebhookServer, DEFAULT_HOST, DEFAULT_PORT
+
+DEFAULT_CONFIG_FILE = "bots.easytg"
+CONFIG_VERSION = "1.0"
+HEADLESS_RUNTIME_MODES = ("async", "process")
+
+
+def new_bot_data(token, admin_id):
+    return {
+        "token": token,
+        "admin_id": admin_id,
+        "status": "Offline",
+        "start_time": None,
+        "uptime": 0,
+        "webhook_url": None,
+        "auto_replies": {},
+        "message_filters": {
+            "spam": False,
+            "bad_words": False
+        },
+        "commands": {}
+    }
+
+
+def parse_bots(bots_data):
+    """Bots section of bots.easytg -> in-memory dicts (start_time as datetime)."""
+    bots = {}
+    for name, bot_data in (bots_data or {}).items():
+        bots[name] = bot_data.copy()
+        if bot_data.get("start_time") is not None:
+            try:
+                bots[name]["start_time"] = datetime.fromisoformat(bot_data["start_time"])
+            except (ValueError, TypeError):
+                bots[name]["start_time"] = None
+    return bots
+
+
+def serialize_bots(bots):
+    """Deep-copied, JSON-ready snapshot of the in-memory bots."""
+    bots_for_save = {}
+    for name, bot_data in bots.items():
+        bots_for_save[name] = copy.deepcopy(bot_data)
+        if bot_data.get("start_time") is not None:
+            bots_for_save[name]["start_time"] = bot_data["start_time"].isoformat()
+    return bots_for_save
+
+
+def build_config(bots, settings):
+    return {
+        "version": CONFIG_VERSION,
+        "bots": serialize_bots(bots),
+        "settings": copy.deepcopy(settings),
+    }
+
+
+class BotManager:
+    """Runs the bots configured in a bots.easytg without any Qt dependency.
+
+    ``on_log(level, message)`` and ``on_status(bot_name, status)`` are called
+    from runtime threads.
+    """
+
+    def __init__(self, config_file=DEFAULT_CONFIG_FILE, runtime_mode=None, shard_count=None,
+                 on_log=None, on_status=None):
+        self.config_file = config_file
+        self.runtime_mode = runtime_mode
+        self.shard_count = shard_count
+        self.on_log = on_log
+        self.on_status = on_status
+        self.bots = {}
+        self.workers = {}
+        self.settings = {}
+        self.transport = TransportConfig()
+        self.async_runtime = AsyncBotRuntime()
+        self.send_scheduler = SendScheduler(self.async_runtime)
+        self.webhook_server = WebhookServer(self.async_runtime)
+        self.shard_supervisor = None
+        self.lifecycle = LifecycleController(on_log=self._log)
+        self.watchdog = Watchdog(self.async_runtime, lambda: dict(self.workers), self.restart_bot, on_log=self._log)
+        self.config_writer = ConfigWriter(
+            on_error=lambda filename, e: self._log("error", f"Failed to save {filename}: {e}"))
+        # Edits to the config file are applied to the running bots
+        self.config_watcher = ConfigWatcher(config_file, self.apply_config,
+                                            on_error=lambda message: self._log("error", message))
+        self.config_writer.on_write = self.config_watcher.written
+        self.message_store = MessageStore(message_store_path(config_file),
+                                          on_error=lambda e: self._log("error", f"Message history: {e}"))
+        self.offset_store = OffsetStore(offset_store_path(config_file),
+                                        on_error=lambda e: self._log("error", f"Update offsets: {e}"))
+        BAD_WORDS.on_error = lambda bot_name, message: self._log("error", f"[{bot_name}] {message}")
+        self.user_directory = UserDirectory(user_directory_path(config_file),
+                                            on_error=lambda e: self._log("error", f"User directory: {e}"))
+
+    def _log(self, level, message):
+        if self.on_log is not None:
+            self.on_log(level, message)
+
+    def load(self):
+        """Read the config (recovering from a backup generation if needed) and build workers."""
+        config_data, loaded_from = load_json_with_recovery(self.config_file, self.config_writer.generations)
+        if loaded_from != self.config_file:
+            self._log("error", f"{self.config_file} is unreadable, loaded {loaded_from}")
+        self.config_watcher.expect(config_data)
+        self.bots = parse_bots(config_data.get("bots"))
+        self.settings = config_data.get("settings", {}) or {}
+
+        if self.runtime_mode is None:
+            # The threaded runtime needs Qt; run those configs on the event loop instead
+            mode = self.settings.get("runtime_mode")
+            self.runtime_mode = mode if mode in HEADLESS_RUNTIME_MODES else "async"
+        if self.shard_count is None:
+            self.shard_count = self.settings.get("shard_count")
+        self.watchdog.auto_restart = self.settings.get("auto_restart", True)
+
+        self.transport = TransportConfig.from_settings(self.settings.get("transport"))
+        configure_transport(self.transport)
+        listen = self.settings.get("webhook_listen") or {}
+        self.webhook_server.host = listen.get("host") or DEFAULT_HOST
+        self.webhook_server.port = int(listen.get("port") or DEFAULT_PORT)
+
+        for name, bot_data in self.bots.items():
+            self.workers[name] = self.create_worker(name, bot_data)
+
+    def save(self, wait=False):
+        config_data = build_config(self.bots, self.settings)
+        if wait:
+            self.config_writer.write_now(self.config_file, config_data)
+        else:
+            self.config_writer.submit(self.config_file, config_data)
+
+    def create_worker(self, name, bot_data):
+        if self.runtime_mode == "process":
+            from .sharding import ShardSupervisor, ShardedBot
+            if self.shard_supervisor is None:
+                self.shard_supervisor = ShardSupervisor(self.shard_count, self.transport.to_settings(),
+                                                        on_log=self._log, offsets_path=self.offset_store.path)
+            worker = ShardedBot(name, bot_data.get("token"), bot_data.get("admin_id"), self.shard_supervisor)
+        else:
+            worker = AsyncBot(name, bot_data.get("token"), bot_data.get("admin_id"), self.async_runtime)
+        worker.auto_replies = bot_data.get("auto_replies", {}) or {}
+        worker.message_filters = bot_data.get("message_filters", {}) or {}
+        worker.commands = bot_data.get("commands", {}) or {}
+        worker.webhook_url = bot_data.get("webhook_url")
+        worker.dispatch = bot_data.get("dispatch") or {}
+        worker.send_scheduler = self.send_scheduler
+        worker.webhook_server = self.webhook_server
+        worker.offsets = self.offset_store
+        worker.health = self.watchdog.health_of(name)
+        worker.log_signal.connect(self._log)
+        worker.status_signal.connect(self._status_changed)
+        worker.message_signal.connect(self.message_store.add)
+        worker.message_signal.connect(self.user_directory.observe)
+        return worker
+
+    def _status_changed(self, bot_name, status):
+        bot_data = self.bots.get(bot_name)
+        if bot_data is None:
+            return
+        bot_data["status"] = status
+        if status == "Online":
+            bot_data["start_time"] = datetime.now()
+        if self.on_status is not None:
+            self.on_status(bot_name, status)
+
+    def status(self):
+        return {name: bot_data.get("status", "Offline") for name, bot_data in self.bots.items()}
+
+    def add_bot(self, name, bot_data, save=True):
+        """Register a new bot (or replace one whose token changed); returns its worker."""
+        existing = self.bots.get(name)
+        if existing is not None and existing.get("token") == bot_data.get("token"):
+            return self.workers[name]
+        if existing is not None:
+            self.remove_bot(name, save=False)
+        self.bots[name] = parse_bots({name: bot_data})[name]
+        self.workers[name] = self.create_worker(name, self.bots[name])
+        if save:
+            self.save()
+        return self.workers[name]
+
+    def remove_bot(self, name, save=True):
+        worker = self.workers.pop(name, None)
+        if worker is not None:
+            worker.stop()
+        self.send_scheduler.discard(name)
+        REGISTRY.remove(name)
+        PROFILER.remove(name)
+        SPAM.remove(name)
+        BAD_WORDS.remove(name)
+        self.watchdog.remove(name)
+        if self.shard_supervisor is not None:
+            self.shard_supervisor.remove(name)
+        bot_data = self.bots.pop(name, None)
+        if bot_data is not None:
+            self.offset_store.remove(bot_data.get("token"))
+            if save:
+                self.save()
+
+    def start_bot(self, name):
+        worker = self.workers.get(name)
+        if worker is not None and not worker.running:
+            worker.start()
+
+    def stop_bot(self, name):
+        worker = self.workers.get(name)
+        if worker is not None:
+            worker.stop()
+
+    def start_all(self):
+        """Start every stopped bot in the background, a few at a time, and watch them and the config."""
+        self.lifecycle.start([w for w in self.workers.values() if w.lifecycle == "stopped"])
+        self.watchdog.start()
+        self.config_watcher.start()
+
+    def stop_all(self):
+        self.lifecycle.stop([w for w in self.workers.values() if w.lifecycle != "stopped"])
+
+    def restart_all(self):
+        self.lifecycle.restart((worker, worker) for worker in self.workers.values())
+
+    def restart_bot(self, name):
+        worker = self.workers.get(name)
+        if worker is not None:
+            self.lifecycle.restart([(worker, worker)])
+
+    def update_routing(self, name, commands=None, auto_replies=None, message_filters=None, save=True):
+        bot_data = self.bots.get(name)
+        if bot_data is None:
+            return
+        if commands is not None:
+            bot_data["commands"] = commands
+        if auto_replies is not None:
+            bot_data["auto_replies"] = auto_replies
+        if message_filters is not None:
+            bot_data["message_filters"] = message_filters
+        worker = self.workers.get(name)
+        if worker is not None:
+            worker.update_routing(commands, auto_replies, message_filters)
+        if save:
+            self.save()
+
+    def set_webhook(self, name, url, save=True):
+        bot_data = self.bots.get(name)
+        if bot_data is None:
+            return
+        bot_data["webhook_url"] = url or None
+        worker = self.workers.get(name)
+        if worker is not None:
+            worker.webhook_url = url or None
+            worker.apply_webhook(url or None)
+        if save:
+            self.save()
+
+    def set_dispatch(self, name, dispatch, save=True):
+        """Pool size and queue length for ``name``; used from the bot's next start."""
+        bot_data = self.bots.get(name)
+        if bot_data is None:
+            return
+        if dispatch:
+            bot_data["dispatch"] = dispatch
+        else:
+            bot_data.pop("dispatch", None)
+        worker = self.workers.get(name)
+        if worker is not None:
+            worker.dispatch = dispatch or {}
+        if save:
+            self.save()
+
+    def apply_config(self, config, diff):
+        """Bring the bots in line with an edited config file; called on the watcher's thread.
+
+        Only the bots in ``diff`` (a configwatch.ConfigDiff) are touched: routing
+        changes are swapped into the running router, and a bot is restarted only
+        when its token or the transport changed. Nothing is saved, since the
+        file already holds the result.
+        """
+        self._log("info", f"{self.config_file} changed: {diff.summary()}")
+        bots = config.get("bots") or {}
+        if diff.settings:
+            # Before any bot is added or replaced, so those start once, on the new transport
+            self.apply_settings(config.get("settings") or {}, diff)
+        for name in diff.removed:
+            self.remove_bot(name, save=False)
+        for name, bot_data in diff.added.items():
+            self.lifecycle.start([self.add_bot(name, bot_data, save=False)])
+        for name, change in diff.changed.items():
+            bot_data = self.bots.get(name)
+            if bot_data is None:
+                continue
+            if change.restart:
+                was_running = self.workers[name].lifecycle != "stopped"
+                worker = self.add_bot(name, bots[name], save=False)
+                if was_running:
+                    self.lifecycle.start([worker])
+                continue
+            if change.routing:
+                self.update_routing(name, save=False, **change.routing)
+            for key, value in change.fields.items():
+                if key == "webhook_url":
+                    self.set_webhook(name, value, save=False)
+                elif key == "dispatch":
+                    self.set_dispatch(name, value, save=False)
+                elif key == "admin_id":
+                    bot_data[key] = self.workers[name].admin_id = value
+                elif value is None:
+                    bot_data.pop(key, None)
+                else:
+                    bot_data[key] = value
+
+    def apply_settings(self, settings, diff):
+        self.settings = settings
+        self.watchdog.auto_restart = settings.get("auto_restart", True)
+        if diff.restart_all:
+            self.transport = TransportConfig.from_settings(settings.get("transport"))
+            configure_transport(self.transport)
+            if self.shard_supervisor is not None:
+                self.shard_supervisor.set_transport(self.transport.to_settings())
+            replaced = set(diff.removed) | {name for name, change in diff.changed.items() if change.restart}
+            self.lifecycle.restart([(worker, worker) for name, worker in self.workers.items()
+                                    if name not in replaced and worker.lifecycle != "stopped"])
+        later = sorted(set(diff.settings) - {"transport", "auto_restart"})
+        if later:
+            self._log("info", f"Settings used from the next start: {', '.join(later)}")
+
+    def set_profile_rate(self, rate, reset=False):
+        """Sample ``rate`` of messages in the stage profiler, here and in every shard."""
+        PROFILER.set_sample_rate(rate)
+        if reset:
+            PROFILER.reset()
+        if self.shard_supervisor is not None:
+            self.shard_supervisor.broadcast(("profiling", PROFILER.sample_rate, reset))
+
+    def shutdown(self):
+        # Save first so bots that were Online are started again next time
+        self.save()
+        self.config_watcher.stop()
+        self.watchdog.stop()
+        self.stop_all()
+        self.lifecycle.wait(STOP_TIMEOUT)
+        self.lifecycle.shutdown()
+        self.webhook_server.stop()
+        if self.shard_supervisor is not None:
+            self.shard_supervisor.shutdown()
+        self.async_runtime.shutdown()
+        self.send_scheduler.shutdown()
+        self.message_store.close()
+        self.user_directory.close()
+        self.offset_store.close()
+        self.config_writer.stop()
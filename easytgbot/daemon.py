@@ -0,0 +1,121 @@
+"""Headless entry point: ``python -m easytgbot [--config bots.easytg]``.
+
+Runs every bot in the config without importing Qt, prints the activity log
+to stdout and serves the control socket the GUI can attach to (and, if
+enabled, Prometheus metrics). Stops cleanly on SIGINT/SIGTERM.
+"""
+import argparse
+import signal
+import sys
+import threading
+import time
+
+from .core import BotManager, DEFAULT_CONFIG_FILE, HEADLESS_RUNTIME_MODES
+from .logbuffer import make_record, format_record
+from .metrics import REGISTRY, MetricsServer, DEFAULT_PORT as DEFAULT_METRICS_PORT
+from .profiling import PROFILER, write_collapsed
+
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(prog="easytgbot", description="Run EasyTG bots without the GUI.")
+    parser.add_argument("--config", default=DEFAULT_CONFIG_FILE, help="bot configuration file (default: %(default)s)")
+    parser.add_argument("--runtime", choices=HEADLESS_RUNTIME_MODES,
+                        help="override the configured runtime mode")
+    parser.add_argument("--shards", type=int, help="worker processes in process mode")
+    parser.add_argument("--no-control", action="store_true", help="do not open the control socket")
+    parser.add_argument("--metrics-port", type=int,
+                        help="serve Prometheus metrics on 127.0.0.1:PORT/metrics (0 disables; "
+                             "default: the GUI's Metrics setting)")
+    parser.add_argument("--profile", type=float, metavar="RATE",
+                        help="time handler stages of this share of messages, 0-1 "
+                             "(default: the GUI's Profiling setting)")
+    parser.add_argument("--profile-output", metavar="FILE",
+                        help="write collapsed stacks for flamegraph.pl to FILE on exit")
+    parser.add_argument("--quiet", action="store_true", help="only print errors")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(sys.argv[1:] if argv is None else argv)
+    started = time.perf_counter()
+    stop = threading.Event()
+    control = None
+
+    def log(level, message):
+        if not args.quiet or level == "error":
+            print(format_record(make_record(level, message)), flush=True)
+        if control is not None:
+            control.publish_log(level, message)
+
+    def status(bot_name, new_status):
+        if control is not None:
+            control.publish_status(bot_name, new_status)
+
+    manager = BotManager(args.config, runtime_mode=args.runtime, shard_count=args.shards,
+                         on_log=log, on_status=status)
+    try:
+        manager.load()
+    except FileNotFoundError:
+        print(f"Configuration file not found: {args.config}", file=sys.stderr)
+        return 2
+    except ValueError as e:
+        print(f"Configuration file is corrupt: {e}", file=sys.stderr)
+        return 2
+
+    if not args.no_control:
+        from .control import ControlServer, control_address, load_authkey
+        control = ControlServer(manager, control_address(args.config), load_authkey(args.config, create=True))
+        try:
+            control.start()
+        except (RuntimeError, OSError) as e:
+            print(e, file=sys.stderr)
+            return 1
+
+    profile_rate = args.profile
+    if profile_rate is None:
+        profile_rate = (manager.settings.get("profiling") or {}).get("sample_rate") or 0.0
+    manager.set_profile_rate(profile_rate)
+
+    metrics_server = None
+    metrics_settings = manager.settings.get("metrics") or {}
+    metrics_port = args.metrics_port
+    if metrics_port is None and metrics_settings.get("enabled"):
+        metrics_port = int(metrics_settings.get("port") or DEFAULT_METRICS_PORT)
+    if metrics_port:
+        metrics_server = MetricsServer(REGISTRY, port=metrics_port)
+        try:
+            metrics_server.start()
+        except OSError as e:
+            log("error", f"Failed to serve metrics on port {metrics_port}: {e}")
+            metrics_server = None
+        else:
+            log("info", f"Serving metrics on http://{metrics_server.host}:{metrics_server.port}/metrics")
+
+    for signum in (signal.SIGINT, signal.SIGTERM):
+        signal.signal(signum, lambda *_: stop.set())
+
+    manager.start_all()
+    # start_all() only schedules the starts; report once they are settled, with short waits for signals
+    while not manager.lifecycle.wait(0.5) and not stop.is_set():
+        pass
+    online = sum(1 for worker in manager.workers.values() if worker.lifecycle == "online")
+    log("info", f"{online} of {len(manager.workers)} bot(s) online in {manager.runtime_mode} mode "
+                f"after {time.perf_counter() - started:.2f}s")
+    try:
+        # Short waits keep the main thread responsive to signals on every platform
+        while not stop.wait(0.5):
+            pass
+    finally:
+        log("info", "Shutting down")
+        if control is not None:
+            control.stop()
+        if metrics_server is not None:
+            metrics_server.stop()
+        if args.profile_output:
+            # Before shutdown, while the shards' last reports are still held
+            try:
+                write_collapsed(args.profile_output, PROFILER.export())
+            except OSError as e:
+                print(f"Failed to write {args.profile_output}: {e}", file=sys.stderr)
+        manager.shutdown()
+    return 0
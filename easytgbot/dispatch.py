@@ -0,0 +1,238 @@
+"""Per-chat ordered dispatch of one bot's updates onto a bounded pool.
+
+Updates are queued by chat: a chat's updates run one after another in the
+order they arrived, while different chats run in parallel on up to
+``workers`` handlers. A slow reply in one chat therefore only delays that
+chat. At most ``queue_size`` updates wait at a time; put() blocks while
+the queue is full, which stops the bot from fetching more updates until
+the handlers catch up (for webhooks, Telegram holds its next delivery).
+
+ChatDispatcher runs handlers on threads (the thread runtime),
+AsyncChatDispatcher on tasks of the bot's event loop. Pool size and queue
+length come from the bot's ``"dispatch"`` entry in bots.easytg, e.g.
+``{"workers": 32, "queue_size": 5000}``.
+"""
+import asyncio
+import itertools
+import threading
+import time
+from collections import deque
+
+DEFAULT_WORKERS = 8
+DEFAULT_QUEUE_SIZE = 1000
+
+_unordered = itertools.count()
+
+
+def dispatch_options(spec):
+    """(workers, queue_size) from a bot's "dispatch" config entry."""
+    spec = spec if isinstance(spec, dict) else {}
+    try:
+        workers = max(1, int(spec.get("workers") or DEFAULT_WORKERS))
+        queue_size = max(1, int(spec.get("queue_size") or DEFAULT_QUEUE_SIZE))
+    except (TypeError, ValueError):
+        return DEFAULT_WORKERS, DEFAULT_QUEUE_SIZE
+    return workers, queue_size
+
+
+def chat_key(update):
+    """Ordering key of a telebot Update: its chat's id, else its user's, else None."""
+    for value in vars(update).values():
+        if value is None or isinstance(value, (int, str, bool, dict, list)):
+            continue
+        chat = getattr(value, "chat", None) or getattr(getattr(value, "message", None), "chat", None)
+        if chat is not None:
+            return chat.id
+        user = getattr(value, "from_user", None) or getattr(value, "user", None)
+        if user is not None:
+            return ("user", user.id)
+    return None
+
+
+class _ChatQueues:
+    """Bookkeeping shared by both dispatchers; callers serialize access."""
+
+    def __init__(self, workers, queue_size):
+        self.workers = workers
+        self.queue_size = queue_size
+        self.queued = 0  # waiting or running
+        self.saturated = 0  # put() calls that had to wait for room
+        self.closed = False
+        self._chats = {}  # key -> deque of (fn, args) not started yet
+        self._ready = deque()  # keys with work and no update running
+        self._active = set()  # keys with an update running
+
+    def _enqueue(self, key, item):
+        if key is None:
+            key = ("unordered", next(_unordered))
+        self.queued += 1
+        pending = self._chats.get(key)
+        if pending is None:
+            pending = self._chats[key] = deque()
+        pending.append(item)
+        if key not in self._active and len(pending) == 1:
+            self._ready.append(key)
+
+    def _take(self):
+        key = self._ready.popleft()
+        self._active.add(key)
+        return key, self._chats[key].popleft()
+
+    def _finish(self, key):
+        self.queued -= 1
+        self._active.discard(key)
+        if self._chats[key]:
+            self._ready.append(key)
+        else:
+            del self._chats[key]
+
+    def _drop(self):
+        """Forget the work that has not started; returns its args."""
+        dropped = []
+        for key, pending in self._chats.items():
+            dropped.extend(args for fn, args in pending)
+            self.queued -= len(pending)
+            pending.clear()
+        self._ready.clear()
+        for key in [key for key in self._chats if key not in self._active]:
+            del self._chats[key]
+        return dropped
+
+
+class ChatDispatcher(_ChatQueues):
+    """Thread pool flavour; put() may be called from any thread."""
+
+    def __init__(self, workers=DEFAULT_WORKERS, queue_size=DEFAULT_QUEUE_SIZE, name="dispatch", on_error=None):
+        super().__init__(workers, queue_size)
+        self.name = name
+        self.on_error = on_error  # called with the exception on the handler's thread
+        self._cond = threading.Condition()
+        self._threads = []
+
+    def put(self, key, fn, *args, block=True):
+        """Queue ``fn(*args)`` behind the other work of ``key``.
+
+        False if the dispatcher is closed, or full and ``block`` is false.
+        """
+        with self._cond:
+            if self.queued >= self.queue_size and not self.closed:
+                if not block:
+                    return False
+                self.saturated += 1
+                self._cond.wait_for(lambda: self.queued < self.queue_size or self.closed)
+            if self.closed:
+                return False
+            self._enqueue(key, (fn, args))
+            if len(self._threads) < min(self.workers, self.queued):
+                self._spawn()
+            self._cond.notify_all()
+            return True
+
+    def _spawn(self):
+        thread = threading.Thread(target=self._run, name=f"easytg-{self.name}-{len(self._threads)}", daemon=True)
+        self._threads.append(thread)
+        thread.start()
+
+    def _run(self):
+        while True:
+            with self._cond:
+                self._cond.wait_for(lambda: self._ready or (self.closed and not self.queued))
+                if not self._ready:
+                    return
+                key, (fn, args) = self._take()
+            try:
+                fn(*args)
+            except Exception as e:
+                if self.on_error is not None:
+                    self.on_error(e)
+            finally:
+                with self._cond:
+                    self._finish(key)
+                    self._cond.notify_all()
+
+    def close(self):
+        """Refuse new work from now on; put() calls waiting for room return False."""
+        with self._cond:
+            self.closed = True
+            self._cond.notify_all()
+
+    def join(self, timeout):
+        """After close(): give queued work up to ``timeout`` seconds, then let the threads go.
+
+        Returns the ``args`` of the work that never started, which is dropped;
+        handlers still running finish on their own.
+        """
+        deadline = time.monotonic() + timeout
+        with self._cond:
+            self._cond.wait_for(lambda: not self.queued, timeout)
+            dropped = self._drop()
+            self._cond.notify_all()
+        for thread in self._threads:
+            thread.join(max(0.0, deadline - time.monotonic()))
+        return dropped
+
+
+class AsyncChatDispatcher(_ChatQueues):
+    """Event loop flavour; every method runs on the bot's loop and ``fn(*args)`` returns a coroutine."""
+
+    def __init__(self, workers=DEFAULT_WORKERS, queue_size=DEFAULT_QUEUE_SIZE, on_error=None):
+        super().__init__(workers, queue_size)
+        self.on_error = on_error
+        self._changed = asyncio.Event()
+        self._tasks = []
+
+    def _notify(self):
+        self._changed.set()
+        self._changed = asyncio.Event()
+
+    async def _wait(self, predicate):
+        while not predicate():
+            await self._changed.wait()
+
+    async def put(self, key, fn, *args):
+        """Queue ``fn(*args)`` behind the other work of ``key``, waiting for room; False once closed."""
+        if self.queued >= self.queue_size and not self.closed:
+            self.saturated += 1
+            await self._wait(lambda: self.queued < self.queue_size or self.closed)
+        if self.closed:
+            return False
+        self._enqueue(key, (fn, args))
+        if len(self._tasks) < min(self.workers, self.queued):
+            self._tasks.append(asyncio.ensure_future(self._run()))
+        self._notify()
+        return True
+
+    async def _run(self):
+        while True:
+            await self._wait(lambda: self._ready or (self.closed and not self.queued))
+            if not self._ready:
+                return
+            key, (fn, args) = self._take()
+            try:
+                await fn(*args)
+            except Exception as e:
+                if self.on_error is not None:
+                    self.on_error(e)
+            finally:
+                self._finish(key)
+                self._notify()
+
+    def close(self):
+        """Refuse new work from now on; put() calls waiting for room return False."""
+        self.closed = True
+        self._notify()
+
+    async def join(self, timeout):
+        """After close(): give queued work up to ``timeout`` seconds, then cancel what is left.
+
+        Returns the ``args`` of the work that never started.
+        """
+        try:
+            await asyncio.wait_for(self._wait(lambda: not self.queued), timeout)
+        except asyncio.TimeoutError:
+            pass
+        dropped = self._drop()
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        return dropped
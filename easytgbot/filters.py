@@ -0,0 +1,26 @@
+"""Message filters shared by every bot runtime."""
+from .badwords import BAD_WORDS, DEFAULT_MATCHER
+from .spam import LINK_LIMIT, SPAM_FILTERS, count_links, spam_engine
+
+
+def apply_filter(message, filter_type, bot_name=None):
+    """Whether ``filter_type`` blocks the message, as True or a truthy reason string.
+
+    With a ``bot_name`` the bot's SpamEngine and bad-words list are used; the
+    engine checks each message once however many spam filters are enabled.
+    Without one only the link count and the built-in word list are checked.
+    """
+    text = getattr(message, "text", None) or getattr(message, "caption", None) or ""
+
+    reasons = SPAM_FILTERS.get(filter_type)
+    if reasons is not None:
+        if bot_name is None:
+            return "links" in reasons and count_links(message, text) > LINK_LIMIT
+        reason = spam_engine(bot_name).check(message)
+        return reason if reason in reasons else False
+
+    if filter_type == "bad_words":
+        matcher = BAD_WORDS.matcher(bot_name) if bot_name is not None else DEFAULT_MATCHER
+        word = matcher.search(text)
+        return f"'{word}'" if word is not None else False
+    return False
@@ -0,0 +1,174 @@
+"""Cooperative start, stop and restart of many bots at once.
+
+Every worker type carries a ``lifecycle`` state ("stopped", "starting",
+"online", "stopping") through LifecycleMixin. ``stop()`` only asks the bot
+to leave its polling loop: the bot finishes the handlers it already
+received, then reports "stopped" itself. LifecycleController runs stops,
+starts and restarts for a batch of bots on a small thread pool, waits for
+each state change with a timeout instead of sleeping, and records how long
+every bot took.
+"""
+import threading
+import time
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+
+PARALLELISM = 16  # bots stopped or started at the same time
+STOP_TIMEOUT = 5.0  # seconds to wait for a bot to drain and stop
+START_TIMEOUT = 15.0  # seconds to wait for a bot to come online
+DRAIN_TIMEOUT = 3.0  # seconds a stopping bot gives its queued handlers
+
+# Status signal values that settle a lifecycle state
+STATUS_STATES = {"Online": "online", "Offline": "stopped"}
+
+_changed = threading.Condition()  # shared by every bot; waiters re-check their own state
+
+
+class LifecycleMixin:
+    lifecycle = "stopped"
+    wanted = False  # set by start(), cleared by stop(); stopped while wanted means it crashed
+
+    def _set_lifecycle(self, state):
+        with _changed:
+            self.lifecycle = state
+            _changed.notify_all()
+
+    def observe_status(self, status):
+        """Follow a status reported by whoever hosts the bot (a shard or the daemon)."""
+        state = STATUS_STATES.get(status)
+        if state is not None:
+            self._set_lifecycle(state)
+
+    def wait_online(self, timeout):
+        """True once the bot is online; False if it stopped or ``timeout`` passed first."""
+        with _changed:
+            _changed.wait_for(lambda: self.lifecycle in ("online", "stopped"), timeout)
+            return self.lifecycle == "online"
+
+    def wait_stopped(self, timeout):
+        with _changed:
+            return _changed.wait_for(lambda: self.lifecycle == "stopped", timeout)
+
+
+Transition = namedtuple("Transition", "bot_name action ok stop_seconds start_seconds")
+
+
+class LifecycleController:
+    """Runs bot stops and (re)starts in the background, ``parallelism`` bots at a time.
+
+    ``on_log(level, message)`` is called from the controller's threads.
+    """
+
+    def __init__(self, parallelism=PARALLELISM, stop_timeout=STOP_TIMEOUT, start_timeout=START_TIMEOUT,
+                 on_log=None):
+        self.stop_timeout = stop_timeout
+        self.start_timeout = start_timeout
+        self.on_log = on_log
+        self.transitions = {}  # bot_name -> latest Transition
+        self._executor = ThreadPoolExecutor(max_workers=parallelism, thread_name_prefix="easytg-lifecycle")
+        self._pending = 0
+        self._idle = threading.Condition()
+
+    def start(self, workers):
+        self._batch("start", [(None, worker) for worker in workers])
+
+    def stop(self, workers):
+        self._batch("stop", [(worker, None) for worker in workers])
+
+    def restart(self, pairs):
+        """Stop each old worker, then start its replacement (which may be the same object)."""
+        self._batch("restart", list(pairs))
+
+    def wait(self, timeout=None):
+        """Block until every batch submitted so far is done; False on timeout."""
+        with self._idle:
+            return self._idle.wait_for(lambda: not self._pending, timeout)
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False)
+
+    def _batch(self, action, pairs):
+        if not pairs:
+            return
+        with self._idle:
+            self._pending += len(pairs)
+        started = time.perf_counter()
+        results = []
+        lock = threading.Lock()
+
+        def done(transition):
+            with lock:
+                results.append(transition)
+                last = len(results) == len(pairs)
+            if last:
+                self._summarize(action, results, time.perf_counter() - started)
+            with self._idle:
+                self._pending -= 1
+                self._idle.notify_all()
+
+        for old, new in pairs:
+            self._executor.submit(self._transition, action, old, new, done)
+
+    def _transition(self, action, old, new, done):
+        bot = new if new is not None else old
+        stop_seconds = start_seconds = None
+        ok = True
+        try:
+            if old is not None and old.lifecycle != "stopped":
+                began = time.perf_counter()
+                old.stop()
+                if old.wait_stopped(self.stop_timeout):
+                    stop_seconds = time.perf_counter() - began
+                else:
+                    # Still draining: starting now would poll the same token twice
+                    ok = False
+                    new = None
+                    self._log("error", f"[{bot.bot_name}] Did not stop within {self.stop_timeout:.0f}s"
+                                       + (", not started again" if action == "restart" else ""))
+            if new is not None:
+                began = time.perf_counter()
+                new.start()
+                if new.wait_online(self.start_timeout):
+                    start_seconds = time.perf_counter() - began
+                else:
+                    ok = False
+                    if new.lifecycle != "stopped":
+                        self._log("error", f"[{bot.bot_name}] Not online after {self.start_timeout:.0f}s")
+        except Exception as e:
+            ok = False
+            self._log("error", f"[{bot.bot_name}] Failed to {action}: {e}")
+        transition = Transition(bot.bot_name, action, ok, stop_seconds, start_seconds)
+        self.transitions[bot.bot_name] = transition
+        done(transition)
+
+    def _summarize(self, action, results, elapsed):
+        parts = []
+        for label, values in (("stop", [t.stop_seconds for t in results if t.stop_seconds is not None]),
+                              ("start", [t.start_seconds for t in results if t.start_seconds is not None])):
+            if values:
+                values.sort()
+                parts.append(f"{label} median {values[len(values) // 2]:.2f}s, max {values[-1]:.2f}s")
+        failed = sum(1 for t in results if not t.ok)
+        if failed:
+            parts.append(f"{failed} failed")
+        detail = f" ({'; '.join(parts)})" if parts else ""
+        verb = {"start": "Started", "stop": "Stopped", "restart": "Restarted"}[action]
+        self._log("info", f"{verb} {len(results)} bot(s) in {elapsed:.2f}s{detail}")
+
+    def _log(self, level, message):
+        if self.on_log is not None:
+            try:
+                self.on_log(level, message)
+            except Exception:
+                pass
+
+
+def describe(transition):
+    """Tooltip text for a bot's latest Transition."""
+    parts = []
+    if transition.stop_seconds is not None:
+        parts.append(f"stop {transition.stop_seconds:.2f}s")
+    if transition.start_seconds is not None:
+        parts.append(f"start {transition.start_seconds:.2f}s")
+    text = f"Last {transition.action}: " + (", ".join(parts) or "no change")
+    return text if transition.ok else text + " (incomplete)"
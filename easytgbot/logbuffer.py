@@ -0,0 +1,126 @@
+"""Fixed-capacity storage for activity log records."""
+import re
+import threading
+from collections import deque, namedtuple
+from datetime import datetime
+
+DEFAULT_RETENTION = 10000
+DEFAULT_BATCH_SIZE = 500  # records moved to the view per GUI tick
+DEFAULT_FLUSH_INTERVAL = 50  # ms between GUI ticks
+
+LogRecord = namedtuple("LogRecord", ["time", "level", "bot", "user", "message"])
+
+_BOT_RE = re.compile(r"^\[([^\]]+)\]")
+_USER_RE = re.compile(r"\b[Ff]rom (-?\d+)")
+
+
+def make_record(level, message, when=None):
+    """Build a LogRecord, pulling the bot name and user id out of worker log lines
+    such as "[MyBot] Command /start from 12345"."""
+    bot = _BOT_RE.match(message)
+    user = _USER_RE.search(message)
+    return LogRecord(
+        (when or datetime.now()).strftime("%H:%M:%S"),
+        level,
+        bot.group(1) if bot else "",
+        user.group(1) if user else "",
+        message,
+    )
+
+
+def format_record(record):
+    return f"[{record.time}] {record.level.upper()}: {record.message}"
+
+
+class RingBuffer:
+    """Preallocated ring buffer with O(1) append, eviction and random access."""
+
+    def __init__(self, capacity=DEFAULT_RETENTION):
+        self.capacity = max(1, int(capacity))
+        self._items = [None] * self.capacity
+        self._start = 0
+        self._size = 0
+
+    def __len__(self):
+        return self._size
+
+    def __getitem__(self, index):
+        if index < 0:
+            index += self._size
+        if not 0 <= index < self._size:
+            raise IndexError(index)
+        return self._items[(self._start + index) % self.capacity]
+
+    def __iter__(self):
+        for i in range(self._size):
+            yield self[i]
+
+    def overflow(self, count):
+        """How many of the oldest items appending ``count`` new ones would evict."""
+        return max(0, self._size + min(count, self.capacity) - self.capacity)
+
+    def append(self, item):
+        if self._size < self.capacity:
+            self._items[(self._start + self._size) % self.capacity] = item
+            self._size += 1
+        else:
+            self._items[self._start] = item
+            self._start = (self._start + 1) % self.capacity
+
+    def extend(self, items):
+        for item in list(items)[-self.capacity:]:
+            self.append(item)
+
+    def drop_oldest(self, count):
+        count = min(count, self._size)
+        for _ in range(count):
+            self._items[self._start] = None
+            self._start = (self._start + 1) % self.capacity
+        self._size -= count
+
+    def clear(self):
+        self._items = [None] * self.capacity
+        self._start = 0
+        self._size = 0
+
+    def resize(self, capacity):
+        """Change capacity, keeping the newest items."""
+        items = list(self)
+        self.capacity = max(1, int(capacity))
+        self.clear()
+        self.extend(items)
+
+
+class LogQueue:
+    """Hand-off of log records from worker threads to the GUI thread.
+
+    Producers only append to a bounded deque, which is atomic in CPython, so
+    logging costs neither a lock nor a queued Qt event per record. The GUI
+    drains records in batches on a timer; if it falls behind, the oldest
+    records are dropped and counted.
+    """
+
+    def __init__(self, capacity=50000):
+        self._queue = deque(maxlen=max(1, int(capacity)))
+        self._lock = threading.Lock()  # only taken on the overflow path
+        self.dropped = 0
+
+    def __len__(self):
+        return len(self._queue)
+
+    def put(self, level, message):
+        record = make_record(level, message)
+        if len(self._queue) >= self._queue.maxlen:
+            with self._lock:
+                self.dropped += 1
+        self._queue.append(record)
+
+    def drain(self, limit):
+        records = []
+        popleft = self._queue.popleft
+        for _ in range(min(limit, len(self._queue))):
+            try:
+                records.append(popleft())
+            except IndexError:
+                break
+        return records
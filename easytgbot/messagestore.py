@@ -0,0 +1,223 @@
+"""Persistent message history in SQLite.
+
+Handlers hand each routed message to MessageStore.add(), which only appends
+to an in-memory queue; a writer thread inserts the queue in batches, one
+transaction per batch, into a WAL-mode database next to the config file.
+Readers (the GUI's history view) use their own connection and page through
+the indexes with keyset pagination, so "the last 100 messages of user X on
+bot Y" is an index range scan however large the table gets.
+"""
+import os
+import sqlite3
+import threading
+import time
+from collections import deque
+
+BATCH_SIZE = 1000  # rows per insert transaction
+FLUSH_INTERVAL = 0.25  # seconds the writer waits for a batch to fill
+MAX_PENDING = 100000  # queued rows before the oldest are dropped
+PAGE_SIZE = 200
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS bots (
+    id INTEGER PRIMARY KEY,
+    name TEXT NOT NULL UNIQUE
+);
+CREATE TABLE IF NOT EXISTS messages (
+    id INTEGER PRIMARY KEY,
+    bot INTEGER NOT NULL,
+    chat_id INTEGER,
+    user_id INTEGER,
+    message_id INTEGER,
+    date REAL NOT NULL,
+    kind TEXT,
+    text TEXT
+);
+CREATE INDEX IF NOT EXISTS messages_bot_chat_date ON messages (bot, chat_id, date);
+CREATE INDEX IF NOT EXISTS messages_bot_user_date ON messages (bot, user_id, date);
+CREATE INDEX IF NOT EXISTS messages_bot_date ON messages (bot, date);
+CREATE INDEX IF NOT EXISTS messages_date ON messages (date);
+"""
+
+
+def message_store_path(config_file):
+    return os.path.abspath(config_file) + ".messages.db"
+
+
+def message_record(message, route_kind):
+    """The dict carried by ``message_signal`` for a routed telebot Message."""
+    user = getattr(message, "from_user", None)
+    chat = getattr(message, "chat", None)
+    return {
+        "chat_id": getattr(chat, "id", None),
+        "user_id": getattr(user, "id", None),
+        "username": getattr(user, "username", None),
+        "first_name": getattr(user, "first_name", None),
+        "last_name": getattr(user, "last_name", None),
+        "message_id": getattr(message, "message_id", None),
+        "date": getattr(message, "date", None) or time.time(),
+        "kind": route_kind,
+        "text": getattr(message, "text", None) or getattr(message, "caption", None) or "",
+    }
+
+
+def connect(path):
+    conn = sqlite3.connect(path, timeout=10, check_same_thread=False)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    return conn
+
+
+class MessageStore:
+    """``add()`` may be called from any thread; queries run on the caller's thread."""
+
+    def __init__(self, path, on_error=None):
+        self.path = path
+        self.on_error = on_error  # called with the exception on the writer thread
+        self.written = 0
+        self.dropped = 0
+        self._pending = deque()
+        self._cond = threading.Condition()
+        self._thread = None
+        self._stopping = False
+        self._bot_ids = {}
+        self._reader = None
+        self._reader_lock = threading.Lock()
+
+    def add(self, bot_name, data):
+        """Queue one message_record() for writing."""
+        pending = self._pending
+        if len(pending) >= MAX_PENDING:
+            pending.popleft()
+            self.dropped += 1
+        pending.append((bot_name, data))
+        if self._thread is None:
+            self._start()
+        elif len(pending) >= BATCH_SIZE:
+            with self._cond:
+                self._cond.notify()
+
+    def _start(self):
+        with self._cond:
+            if self._thread is not None:
+                return
+            self._stopping = False
+            self._thread = threading.Thread(target=self._run, name="easytg-message-store", daemon=True)
+            self._thread.start()
+
+    def flush(self, timeout=5):
+        """Wait until everything queued so far is written."""
+        deadline = time.monotonic() + timeout
+        with self._cond:
+            self._cond.notify()
+        while self._pending and self._thread is not None and self._thread.is_alive() and time.monotonic() < deadline:
+            time.sleep(0.01)
+
+    def close(self):
+        with self._cond:
+            self._stopping = True
+            self._cond.notify()
+        if self._thread is not None:
+            self._thread.join(10)
+            self._thread = None
+        if self._reader is not None:
+            self._reader.close()
+            self._reader = None
+
+    def _run(self):
+        try:
+            conn = connect(self.path)
+            conn.executescript(SCHEMA)
+        except Exception as e:
+            # Messages keep queueing (and the oldest get dropped) until restart
+            self._report(e)
+            return
+        try:
+            while True:
+                with self._cond:
+                    if not self._stopping and len(self._pending) < BATCH_SIZE:
+                        self._cond.wait(FLUSH_INTERVAL)
+                    stopping = self._stopping
+                while self._pending:
+                    self._write_batch(conn)
+                if stopping:
+                    return
+        finally:
+            conn.close()
+
+    def _write_batch(self, conn):
+        batch = []
+        pending = self._pending
+        while pending and len(batch) < BATCH_SIZE:
+            batch.append(pending.popleft())
+        try:
+            with conn:
+                rows = [(self._bot_id(conn, bot_name), data.get("chat_id"), data.get("user_id"),
+                         data.get("message_id"), data.get("date") or time.time(), data.get("kind"),
+                         data.get("text"))
+                        for bot_name, data in batch]
+                conn.executemany("INSERT INTO messages (bot, chat_id, user_id, message_id, date, kind, text) "
+                                 "VALUES (?, ?, ?, ?, ?, ?, ?)", rows)
+            self.written += len(batch)
+        except Exception as e:
+            self._report(e)
+
+    def _bot_id(self, conn, bot_name):
+        bot_id = self._bot_ids.get(bot_name)
+        if bot_id is None:
+            conn.execute("INSERT OR IGNORE INTO bots (name) VALUES (?)", (bot_name,))
+            bot_id = conn.execute("SELECT id FROM bots WHERE name = ?", (bot_name,)).fetchone()[0]
+            self._bot_ids[bot_name] = bot_id
+        return bot_id
+
+    def _report(self, e):
+        if self.on_error is not None:
+            try:
+                self.on_error(e)
+            except Exception:
+                pass
+
+    # Queries
+
+    def _read(self, sql, params):
+        with self._reader_lock:
+            if self._reader is None:
+                if not os.path.exists(self.path):
+                    return []
+                self._reader = connect(self.path)
+            try:
+                return self._reader.execute(sql, params).fetchall()
+            except sqlite3.OperationalError:
+                # Schema not created yet by the writer (fresh database)
+                return []
+
+    def bot_names(self):
+        return [row[0] for row in self._read("SELECT name FROM bots ORDER BY name", ())]
+
+    def query(self, bot_name=None, chat_id=None, user_id=None, before=None, limit=PAGE_SIZE):
+        """Messages newest first as (id, bot, chat_id, user_id, message_id, date, kind, text) tuples.
+
+        ``before`` is the (date, id) of the last row of the previous page. Every bot,
+        bot+chat and bot+user combination pages along an index; a chat or user filter
+        without a bot walks the time index and filters.
+        """
+        where, params = [], []
+        if bot_name is not None:
+            where.append("messages.bot = (SELECT id FROM bots WHERE name = ?)")
+            params.append(bot_name)
+        if chat_id is not None:
+            where.append("messages.chat_id = ?")
+            params.append(chat_id)
+        if user_id is not None:
+            where.append("messages.user_id = ?")
+            params.append(user_id)
+        if before is not None:
+            where.append("(messages.date, messages.id) < (?, ?)")
+            params.extend(before)
+        sql = ("SELECT messages.id, bots.name, chat_id, user_id, message_id, date, kind, text "
+               "FROM messages JOIN bots ON bots.id = messages.bot")
+        if where:
+            sql += " WHERE " + " AND ".join(where)
+        sql += " ORDER BY messages.date DESC, messages.id DESC LIMIT ?"
+        params.append(limit)
+        return self._read(sql, params)
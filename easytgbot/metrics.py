@@ -0,0 +1,313 @@
+"""Per-bot metrics: counters, latency histograms and a Prometheus exporter.
+
+Handlers record into a process-wide MetricsRegistry. Counters and histograms
+keep one cell per writer thread, so recording never takes a lock and never
+loses an increment; readers sum the cells. Shard processes and the daemon
+ship ``export()`` snapshots to the process that shows them, which merges
+them in with ``load_remote()``.
+"""
+import threading
+import time
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 9464
+EXPORT_INTERVAL = 1.0  # seconds between snapshots sent by shards and the daemon
+HISTORY_LENGTH = 30  # samples kept per bot for the sparkline
+
+# (attribute, Prometheus help text); exported as easytg_<attribute>_total
+COUNTERS = (
+    ("updates_received", "Updates handled by the bot."),
+    ("updates_filtered", "Updates dropped by a message filter."),
+    ("commands", "Updates answered by a command."),
+    ("auto_replies", "Updates answered by an auto-reply."),
+    ("send_errors", "Replies that failed after all retries."),
+    ("rate_limited", "Send attempts rejected with HTTP 429."),
+)
+ROUTE_COUNTERS = {"filtered": "updates_filtered", "command": "commands", "auto_reply": "auto_replies"}
+
+# Histogram resolution: values (in microseconds) keep their top SUB_BITS bits, ~3% relative error
+SUB_BITS = 5
+SUB_COUNT = 1 << SUB_BITS
+HALF_COUNT = SUB_COUNT >> 1
+# Cumulative buckets in the Prometheus output, seconds
+EXPORT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+SPARK_CHARS = "▁▂▃▄▅▆▇█"
+
+
+def bucket_index(micros):
+    if micros < SUB_COUNT:
+        return micros
+    shift = micros.bit_length() - SUB_BITS
+    return (shift + 1) * HALF_COUNT + (micros >> shift) - HALF_COUNT
+
+
+def bucket_floor(index):
+    """Smallest value (microseconds) recorded in bucket ``index``."""
+    if index < SUB_COUNT:
+        return index
+    shift = index // HALF_COUNT - 1
+    return (index % HALF_COUNT + HALF_COUNT) << shift
+
+
+class Counter:
+    def __init__(self):
+        self._local = threading.local()
+        self._cells = []  # one [value] per writer thread; list.append is atomic
+
+    def inc(self, amount=1):
+        try:
+            self._local.cell[0] += amount
+        except AttributeError:
+            cell = self._local.cell = [amount]
+            self._cells.append(cell)
+
+    @property
+    def value(self):
+        return sum(cell[0] for cell in list(self._cells))
+
+
+class Histogram:
+    """HDR-style log-linear histogram of durations, recorded in seconds."""
+
+    def __init__(self):
+        self._local = threading.local()
+        self._cells = []  # per writer thread: [count, sum_seconds, {bucket: count}]
+
+    def record(self, seconds):
+        try:
+            cell = self._local.cell
+        except AttributeError:
+            cell = self._local.cell = [0, 0.0, {}]
+            self._cells.append(cell)
+        index = bucket_index(int(seconds * 1e6)) if seconds > 0 else 0
+        buckets = cell[2]
+        buckets[index] = buckets.get(index, 0) + 1
+        cell[0] += 1
+        cell[1] += seconds
+
+    def export(self):
+        count, total, merged = 0, 0.0, {}
+        for cell in list(self._cells):
+            count += cell[0]
+            total += cell[1]
+            for index, n in list(cell[2].items()):
+                merged[index] = merged.get(index, 0) + n
+        return {"count": count, "sum": total, "buckets": merged}
+
+
+def percentile(histogram, p):
+    """Upper bound (seconds) of the bucket holding the p-th percentile of an exported histogram."""
+    count = histogram["count"]
+    if not count:
+        return None
+    rank = max(1, int(count * p / 100.0 + 0.5))
+    seen = 0
+    for index in sorted(histogram["buckets"]):
+        seen += histogram["buckets"][index]
+        if seen >= rank:
+            return bucket_floor(index + 1) / 1e6
+    return bucket_floor(max(histogram["buckets"]) + 1) / 1e6
+
+
+def merge(a, b):
+    """Sum two exported per-bot snapshots."""
+    merged = {name: a.get(name, 0) + b.get(name, 0) for name, _ in COUNTERS}
+    ha, hb = a["handler_latency"], b["handler_latency"]
+    buckets = dict(ha["buckets"])
+    for index, n in hb["buckets"].items():
+        buckets[index] = buckets.get(index, 0) + n
+    merged["handler_latency"] = {"count": ha["count"] + hb["count"], "sum": ha["sum"] + hb["sum"],
+                                 "buckets": buckets}
+    return merged
+
+
+class BotMetrics:
+    def __init__(self):
+        for name, _ in COUNTERS:
+            setattr(self, name, Counter())
+        self.handler_latency = Histogram()
+
+    def observe(self, route_kind, seconds):
+        """Record one handled update that was routed as ``route_kind``."""
+        self.updates_received.inc()
+        counter = ROUTE_COUNTERS.get(route_kind)
+        if counter is not None:
+            getattr(self, counter).inc()
+        self.handler_latency.record(seconds)
+
+    def export(self):
+        data = {name: getattr(self, name).value for name, _ in COUNTERS}
+        data["handler_latency"] = self.handler_latency.export()
+        return data
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self._bots = {}
+        self._remote = {}  # source -> {bot_name: exported snapshot}
+
+    def bot(self, bot_name):
+        metrics = self._bots.get(bot_name)
+        if metrics is None:
+            metrics = self._bots.setdefault(bot_name, BotMetrics())
+        return metrics
+
+    def remove(self, bot_name):
+        self._bots.pop(bot_name, None)
+        for snapshots in list(self._remote.values()):
+            snapshots.pop(bot_name, None)
+
+    def load_remote(self, source, snapshots):
+        """Replace everything last received from ``source`` (a shard or the daemon)."""
+        self._remote[source] = dict(snapshots)
+
+    def drop_remote(self, source):
+        self._remote.pop(source, None)
+
+    def export(self):
+        """{bot_name: snapshot} of local and remote bots, picklable and JSON-ready."""
+        result = {name: metrics.export() for name, metrics in list(self._bots.items())}
+        for snapshots in list(self._remote.values()):
+            for name, data in snapshots.items():
+                result[name] = merge(result[name], data) if name in result else data
+        return result
+
+    def render_prometheus(self):
+        return render_prometheus(self.export())
+
+
+def _label(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def render_prometheus(snapshots):
+    """Prometheus text exposition format (version 0.0.4) of exported snapshots."""
+    names = sorted(snapshots)
+    lines = []
+    for counter, help_text in COUNTERS:
+        metric = f"easytg_{counter}_total"
+        lines.append(f"# HELP {metric} {help_text}")
+        lines.append(f"# TYPE {metric} counter")
+        for name in names:
+            lines.append(f'{metric}{{bot="{_label(name)}"}} {snapshots[name].get(counter, 0)}')
+    metric = "easytg_handler_latency_seconds"
+    lines.append(f"# HELP {metric} Time spent in the message handler.")
+    lines.append(f"# TYPE {metric} histogram")
+    for name in names:
+        histogram = snapshots[name]["handler_latency"]
+        label = _label(name)
+        ordered = sorted(histogram["buckets"].items())
+        position, cumulative = 0, 0
+        for bound in EXPORT_BUCKETS:
+            # An HDR bucket counts as "le" if every value it can hold is <= bound
+            while position < len(ordered) and bucket_floor(ordered[position][0] + 1) <= bound * 1e6:
+                cumulative += ordered[position][1]
+                position += 1
+            lines.append(f'{metric}_bucket{{bot="{label}",le="{bound}"}} {cumulative}')
+        lines.append(f'{metric}_bucket{{bot="{label}",le="+Inf"}} {histogram["count"]}')
+        lines.append(f'{metric}_sum{{bot="{label}"}} {histogram["sum"]:.6f}')
+        lines.append(f'{metric}_count{{bot="{label}"}} {histogram["count"]}')
+    return "\n".join(lines) + "\n"
+
+
+class MetricsHistory:
+    """Turns successive registry exports into per-bot update rates for the GUI."""
+
+    def __init__(self, length=HISTORY_LENGTH):
+        self.length = length
+        self.last = {}  # bot_name -> (monotonic time, updates_received)
+        self.rates = {}  # bot_name -> deque of updates/s
+        self.snapshots = {}
+
+    def sample(self, snapshots, now=None):
+        """Record a sample; returns True if any rate or counter changed since the last one."""
+        now = time.monotonic() if now is None else now
+        changed = snapshots != self.snapshots
+        for name, data in snapshots.items():
+            received = data.get("updates_received", 0)
+            previous = self.last.get(name)
+            self.last[name] = (now, received)
+            if previous is None or now <= previous[0]:
+                continue
+            rate = max(0, received - previous[1]) / (now - previous[0])
+            history = self.rates.setdefault(name, deque(maxlen=self.length))
+            changed = changed or (history and history[-1] != rate)
+            history.append(rate)
+        for name in [n for n in self.last if n not in snapshots]:
+            del self.last[name]
+            self.rates.pop(name, None)
+        self.snapshots = snapshots
+        return bool(changed)
+
+    def rate(self, bot_name):
+        history = self.rates.get(bot_name)
+        return history[-1] if history else 0.0
+
+    def sparkline(self, bot_name):
+        return sparkline(self.rates.get(bot_name) or ())
+
+
+def sparkline(values):
+    values = list(values)
+    if not values:
+        return ""
+    top = max(values)
+    if top <= 0:
+        return SPARK_CHARS[0] * len(values)
+    scale = len(SPARK_CHARS) - 1
+    return "".join(SPARK_CHARS[int(round(v / top * scale))] for v in values)
+
+
+class MetricsServer:
+    """Serves ``GET /metrics`` for a registry on a background thread."""
+
+    def __init__(self, registry, host=DEFAULT_HOST, port=DEFAULT_PORT):
+        self.registry = registry
+        self.host = host
+        self.port = port
+        self._server = None
+
+    @property
+    def running(self):
+        return self._server is not None
+
+    def start(self):
+        if self._server is not None:
+            return
+        registry = self.registry
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split("?", 1)[0] != "/metrics":
+                    self.send_error(404)
+                    return
+                body = registry.render_prometheus().encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        self._server = ThreadingHTTPServer((self.host, self.port), Handler)
+        self._server.daemon_threads = True
+        self.port = self._server.server_address[1]
+        threading.Thread(target=self._server.serve_forever, name="easytg-metrics", daemon=True).start()
+
+    def stop(self):
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+
+REGISTRY = MetricsRegistry()
+
+
+def bot_metrics(bot_name):
+    """The BotMetrics of ``bot_name`` in this process's registry."""
+    return REGISTRY.bot(bot_name)
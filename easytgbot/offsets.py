@@ -0,0 +1,267 @@
+"""Where each bot left off in its update stream, kept across restarts.
+
+Every update a bot receives, by polling or by webhook, is claimed in the
+bot's UpdateLog before its handlers run and marked done after they return.
+A claim for an update that is already running or was recently handled is
+refused, so an update delivered twice (a restart before Telegram saw the
+confirming getUpdates, a webhook retry, a switch between polling and
+webhook) is handled once.
+
+The log keeps the ids of the last SEEN_SIZE handled updates and the
+acknowledged offset: the highest update id below which nothing is still
+running or waiting to be handled again. Every getUpdates asks for the
+updates after the acknowledged one, so Telegram is never told to drop an
+update before its handlers finished: updates still queued, or cut off when
+the bot stops, come back with the next poll, and the ones already running
+or handled are skipped by ``claim()``. A writer thread saves changed logs
+to SQLite in one transaction per second, so a crash loses at most that
+second, and polling resumes right after the acknowledged update (unless it
+is more than RESUME_MAX_AGE old).
+
+Logs are keyed by the bot's Telegram id (the token's numeric prefix), the
+namespace update ids live in, so renaming a bot keeps its offset and
+giving it another bot's token does not.
+"""
+import os
+import threading
+import time
+from array import array
+from collections import deque
+
+from .messagestore import connect
+
+SEEN_SIZE = 1024  # handled update ids remembered per bot
+FLUSH_INTERVAL = 1.0  # seconds between batched writes
+# Telegram picks a random next update id once a bot has had no updates for a week,
+# so an older offset could skip everything; it is not used after this many seconds
+RESUME_MAX_AGE = 6 * 24 * 3600
+REFETCH_DELAY = 0.5  # seconds before polling again when only running updates came back
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS offsets (
+    bot TEXT PRIMARY KEY,
+    acked INTEGER NOT NULL,
+    seen BLOB,
+    updated REAL
+) WITHOUT ROWID;
+"""
+
+
+def offset_store_path(config_file):
+    return os.path.abspath(config_file) + ".offsets.db"
+
+
+def bot_key(token):
+    return (token or "").split(":", 1)[0]
+
+
+class UpdateLog:
+    """One bot's claimed, running and recently handled update ids. Thread-safe."""
+
+    def __init__(self, acked=0, seen=(), updated=None):
+        fresh = updated is not None and time.time() - updated < RESUME_MAX_AGE
+        self.acked_floor = acked if fresh else 0  # acknowledged when loaded
+        self.highest = self.acked_floor  # highest update id claimed
+        self.updated = updated if fresh else None  # time of the last handled update
+        self.duplicates = 0
+        self.dirty = False
+        self._running = set()
+        self._released = set()  # claimed, then given up unhandled: still to be handled
+        self._seen = deque(seen if fresh else (), maxlen=SEEN_SIZE)
+        self._seen_set = set(self._seen)
+        self._lock = threading.Lock()
+
+    @property
+    def acked(self):
+        """Every update up to this id has been handled (0 when nothing is known)."""
+        with self._lock:
+            return self._acked()
+
+    def _acked(self):
+        pending = self._running | self._released
+        acked = min(pending) - 1 if pending else self.highest
+        return max(acked, self.acked_floor)
+
+    def resume_offset(self):
+        """The getUpdates offset to continue from, or None to let Telegram decide."""
+        acked = self.acked
+        return acked + 1 if acked else None
+
+    def claim(self, update_id):
+        """True if the caller should handle ``update_id``; False if it is running or was handled."""
+        with self._lock:
+            if update_id in self._running:
+                return False  # polled again because it is not done yet
+            if update_id in self._seen_set or update_id <= self.acked_floor:
+                self.duplicates += 1
+                if update_id > self.highest:
+                    self.highest = update_id  # handled before a restart: polling may move past it
+                return False
+            self._running.add(update_id)
+            self._released.discard(update_id)
+            if update_id > self.highest:
+                self.highest = update_id
+            return True
+
+    def done(self, update_id):
+        with self._lock:
+            if update_id not in self._running:
+                return
+            self._running.discard(update_id)
+            if len(self._seen) == SEEN_SIZE:
+                self._seen_set.discard(self._seen[0])
+            self._seen.append(update_id)
+            self._seen_set.add(update_id)
+            self.updated = time.time()
+            self.dirty = True
+
+    def release(self, update_id):
+        """Give up a claim without handling the update; its redelivery is handled and
+        the acknowledged offset stays below it until then."""
+        with self._lock:
+            if update_id in self._running:
+                self._running.discard(update_id)
+                self._released.add(update_id)
+
+    def polled(self, offset, update_ids):
+        """A getUpdates from ``offset`` (None: from the oldest) returned ``update_ids`` (ascending).
+
+        Telegram returns the updates it holds from ``offset`` on, so a released
+        update below ``offset``, or missing below the last one returned (any at
+        all when none came back), was confirmed by another client and will not
+        come again; it stops holding the acknowledged offset back.
+        """
+        with self._lock:
+            if not self._released:
+                return
+            offset = offset or 0
+            returned = set(update_ids)
+            last = update_ids[-1] if update_ids else None
+            gone = [i for i in self._released
+                    if i < offset or (i not in returned and (last is None or i < last))]
+            if gone:
+                self._released.difference_update(gone)
+                self.dirty = True
+
+    def snapshot(self):
+        """(acked, handled ids, updated) to persist; running updates count as not handled."""
+        with self._lock:
+            self.dirty = False
+            return self._acked(), array("q", self._seen).tobytes(), self.updated
+
+
+class OffsetStore:
+    """UpdateLogs of every bot, saved by a background writer.
+
+    ``log()`` may be called from any thread; the first call for a bot reads
+    its row on the caller's thread.
+    """
+
+    def __init__(self, path, on_error=None):
+        self.path = path
+        self.on_error = on_error  # called with the exception on the writer thread
+        self._logs = {}  # bot key -> UpdateLog
+        self._removed = set()
+        self._lock = threading.Lock()
+        self._cond = threading.Condition()
+        self._thread = None
+        self._stopping = False
+        self._conn = None
+
+    def log(self, token):
+        key = bot_key(token)
+        with self._lock:
+            log = self._logs.get(key)
+            if log is None:
+                log = self._logs[key] = UpdateLog(*self._load(key))
+                self._removed.discard(key)
+            if self._thread is None:
+                self._stopping = False
+                self._thread = threading.Thread(target=self._run, name="easytg-offsets", daemon=True)
+                self._thread.start()
+            return log
+
+    def remove(self, token):
+        """Forget a deleted bot's offset."""
+        key = bot_key(token)
+        with self._lock:
+            self._logs.pop(key, None)
+            self._removed.add(key)
+
+    def flush(self):
+        """Write every changed log now (on the caller's thread)."""
+        with self._lock:
+            conn = self._connect()
+            if conn is not None:
+                self._write(conn)
+
+    def close(self):
+        with self._cond:
+            self._stopping = True
+            self._cond.notify()
+        if self._thread is not None:
+            self._thread.join(10)
+            self._thread = None
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+    def _load(self, key):
+        conn = self._connect()
+        if conn is None:
+            return ()
+        try:
+            row = conn.execute("SELECT acked, seen, updated FROM offsets WHERE bot = ?", (key,)).fetchone()
+        except Exception as e:
+            self._report(e)
+            return ()
+        if row is None:
+            return ()
+        seen = array("q")
+        seen.frombytes(row[1] or b"")
+        return row[0], seen, row[2]
+
+    def _connect(self):
+        # One connection, only used under self._lock
+        if self._conn is None:
+            try:
+                conn = connect(self.path)
+                conn.executescript(SCHEMA)
+            except Exception as e:
+                self._report(e)
+                return None
+            self._conn = conn
+        return self._conn
+
+    def _run(self):
+        while True:
+            with self._cond:
+                if not self._stopping:
+                    self._cond.wait(FLUSH_INTERVAL)
+                stopping = self._stopping
+            with self._lock:
+                conn = self._connect()
+                if conn is not None:
+                    self._write(conn)
+            if stopping:
+                return
+
+    def _write(self, conn):
+        rows = [(key,) + log.snapshot() for key, log in list(self._logs.items()) if log.dirty]
+        removed, self._removed = self._removed, set()
+        if not rows and not removed:
+            return
+        try:
+            with conn:
+                conn.executemany("INSERT OR REPLACE INTO offsets (bot, acked, seen, updated) VALUES (?, ?, ?, ?)", rows)
+                conn.executemany("DELETE FROM offsets WHERE bot = ?", [(key,) for key in removed])
+        except Exception as e:
+            self._report(e)
+
+    def _report(self, e):
+        if self.on_error is not None:
+            try:
+                self.on_error(e)
+            except Exception:
+                pass
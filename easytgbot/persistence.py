@@ -0,0 +1,196 @@
+"""Crash-safe, debounced config persistence.
+
+Writes go to a temp file in the same directory, are fsynced and then
+atomically renamed over the target, so a crash mid-write leaves either the
+old or the new file, never a truncated one. The previous versions are kept
+as ``<file>.1`` (newest) ... ``<file>.N`` for recovery.
+"""
+import json
+import os
+import shutil
+import threading
+import time
+
+DEFAULT_DELAY = 0.5  # seconds of quiet before a burst of edits is written
+MAX_DELAY = 5.0  # never hold a pending write longer than this
+DEFAULT_GENERATIONS = 3
+
+
+def generation_path(filename, generation):
+    return f"{filename}.{generation}"
+
+
+def _fsync_dir(dirname):
+    # Persist the rename itself; not supported on every platform
+    try:
+        fd = os.open(dirname or ".", os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
+
+def _write_file(path, payload):
+    tmp = f"{path}.tmp.{os.getpid()}.{threading.get_ident()}"
+    try:
+        with open(tmp, 'w', encoding='utf-8') as f:
+            f.write(payload)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, path)
+    except BaseException:
+        try:
+            os.remove(tmp)
+        except OSError:
+            pass
+        raise
+
+
+def rotate_generations(filename, generations):
+    """Shift <file>.1..N-1 up by one and copy the current file to <file>.1."""
+    if generations <= 0 or not os.path.exists(filename):
+        return
+    for i in range(generations - 1, 0, -1):
+        older = generation_path(filename, i)
+        if os.path.exists(older):
+            os.replace(older, generation_path(filename, i + 1))
+    # Copy rather than rename so the primary file never disappears
+    newest = generation_path(filename, 1)
+    tmp = newest + ".tmp"
+    shutil.copyfile(filename, tmp)
+    os.replace(tmp, newest)
+
+
+def atomic_write_json(filename, data, generations=DEFAULT_GENERATIONS):
+    payload = json.dumps(data, indent=2)
+    rotate_generations(filename, generations)
+    _write_file(filename, payload)
+    _fsync_dir(os.path.dirname(os.path.abspath(filename)))
+
+
+def load_json_with_recovery(filename, generations=DEFAULT_GENERATIONS):
+    """Load ``filename``, falling back to the newest readable generation.
+
+    Returns (data, path_loaded); raises the primary file's error if nothing is readable.
+    """
+    try:
+        with open(filename, 'r', encoding='utf-8') as f:
+            return json.load(f), filename
+    except (ValueError, OSError) as primary_error:
+        for i in range(1, generations + 1):
+            candidate = generation_path(filename, i)
+            try:
+                with open(candidate, 'r', encoding='utf-8') as f:
+                    return json.load(f), candidate
+            except (ValueError, OSError):
+                continue
+        raise primary_error
+
+
+class ConfigWriter:
+    """Background writer that coalesces bursts of saves into one atomic write per file."""
+
+    def __init__(self, delay=DEFAULT_DELAY, generations=DEFAULT_GENERATIONS, on_error=None):
+        self.delay = delay
+        self.generations = generations
+        self.on_error = on_error  # called with (filename, exception) on the writer thread
+        self.on_write = None  # called with (filename, data) right before data is written
+        self.writes = 0
+        self.coalesced = 0
+        self._pending = {}  # filename -> (data, first_submitted, last_submitted, seq)
+        self._seq = 0
+        self._written_seq = {}  # filename -> seq of the newest data on disk
+        self._cond = threading.Condition()
+        self._io_lock = threading.Lock()
+        self._thread = None
+        self._stopping = False
+
+    def submit(self, filename, data):
+        """Schedule ``data`` to be written; later submits for the same file replace it.
+
+        ``data`` must not be mutated afterwards (pass a snapshot).
+        """
+        now = time.monotonic()
+        with self._cond:
+            self._seq += 1
+            if filename in self._pending:
+                self.coalesced += 1
+                first = self._pending[filename][1]
+            else:
+                first = now
+            self._pending[filename] = (data, first, now, self._seq)
+            if self._thread is None or not self._thread.is_alive():
+                self._stopping = False
+                self._thread = threading.Thread(target=self._run, name="easytg-config-writer", daemon=True)
+                self._thread.start()
+            self._cond.notify()
+
+    def write_now(self, filename, data):
+        """Write synchronously (e.g. an explicit backup), superseding any pending write."""
+        with self._cond:
+            self._pending.pop(filename, None)
+            self._seq += 1
+            seq = self._seq
+        self._write(filename, data, seq)
+
+    def flush(self):
+        """Write everything pending on the calling thread."""
+        with self._cond:
+            pending = self._pending
+            self._pending = {}
+        for filename, (data, _, _, seq) in pending.items():
+            self._write(filename, data, seq)
+
+    def stop(self):
+        self.flush()
+        with self._cond:
+            self._stopping = True
+            self._cond.notify()
+
+    def _due(self, now):
+        due = {}
+        next_deadline = None
+        for filename, (data, first, last, seq) in self._pending.items():
+            deadline = min(last + self.delay, first + MAX_DELAY)
+            if deadline <= now:
+                due[filename] = (data, seq)
+            else:
+                next_deadline = deadline if next_deadline is None else min(next_deadline, deadline)
+        return due, next_deadline
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._pending and not self._stopping:
+                    self._cond.wait()
+                if self._stopping:
+                    return
+                due, next_deadline = self._due(time.monotonic())
+                if not due:
+                    self._cond.wait(next_deadline - time.monotonic())
+                    continue
+                for filename in due:
+                    del self._pending[filename]
+            for filename, (data, seq) in due.items():
+                self._write(filename, data, seq)
+
+    def _write(self, filename, data, seq):
+        with self._io_lock:
+            # A newer snapshot may have been written meanwhile by write_now()/flush()
+            if seq <= self._written_seq.get(filename, 0):
+                return
+            self._written_seq[filename] = seq
+            try:
+                if self.on_write is not None:
+                    self.on_write(filename, data)
+                atomic_write_json(filename, data, self.generations)
+                self.writes += 1
+            except Exception as e:
+                if self.on_error is not None:
+                    self.on_error(filename, e)
+                else:
+                    raise
@@ -0,0 +1,151 @@
+"""Opt-in stage profiling of the message handler.
+
+With a sample rate above zero, a sampled message carries a StageTimer
+through the handler; each stage (filters, command lookup, auto-reply scan,
+log emit, reply) adds the time since the previous mark. The send scheduler
+samples queue wait and network time of replies the same way. Totals are
+aggregated per bot and stage, lock-free like the metrics registry, and can
+be written as collapsed stacks for flamegraph.pl / speedscope.
+"""
+import random
+import threading
+import time
+
+STAGES = (
+    "handler;route;filters",
+    "handler;route;command_lookup",
+    "handler;route;auto_reply_scan",
+    "handler;log_emit",
+    "handler;reply",
+    "send;queue_wait",
+    "send;network",
+)
+
+
+class StageTimer:
+    __slots__ = ("last", "stages")
+
+    def __init__(self):
+        self.last = time.perf_counter()
+        self.stages = []
+
+    def mark(self, stage):
+        """Close ``stage``: it took the time since the previous mark."""
+        now = time.perf_counter()
+        self.stages.append((stage, now - self.last))
+        self.last = now
+
+
+def no_mark(stage):
+    """Stand-in for StageTimer.mark when a message is not sampled."""
+
+
+class StageProfiler:
+    def __init__(self, sample_rate=0.0):
+        self.sample_rate = sample_rate
+        self._local = threading.local()
+        self._cells = []  # per writer thread: {bot_name: {stage: [samples, seconds]}}
+        self._remote = {}  # source -> exported totals
+
+    @property
+    def enabled(self):
+        return self.sample_rate > 0
+
+    def set_sample_rate(self, rate):
+        self.sample_rate = min(1.0, max(0.0, float(rate)))
+
+    def sampled(self):
+        rate = self.sample_rate
+        return rate > 0 and (rate >= 1 or random.random() < rate)
+
+    def begin(self):
+        """A StageTimer if this message is sampled, else None."""
+        return StageTimer() if self.sampled() else None
+
+    def _cell(self):
+        try:
+            return self._local.cell
+        except AttributeError:
+            cell = self._local.cell = {}
+            self._cells.append(cell)
+            return cell
+
+    def commit(self, bot_name, timer):
+        if timer is None:
+            return
+        self.add(bot_name, timer.stages)
+
+    def add(self, bot_name, stages):
+        bot = self._cell().get(bot_name)
+        if bot is None:
+            bot = self._cell()[bot_name] = {}
+        for stage, seconds in stages:
+            entry = bot.get(stage)
+            if entry is None:
+                bot[stage] = [1, seconds]
+            else:
+                entry[0] += 1
+                entry[1] += seconds
+
+    def reset(self):
+        """Forget all samples."""
+        self._local = threading.local()
+        self._cells = []
+        self._remote = {}
+
+    def remove(self, bot_name):
+        for cell in list(self._cells):
+            cell.pop(bot_name, None)
+        for totals in list(self._remote.values()):
+            totals.pop(bot_name, None)
+
+    def load_remote(self, source, totals):
+        self._remote[source] = dict(totals)
+
+    def drop_remote(self, source):
+        self._remote.pop(source, None)
+
+    def export(self):
+        """{bot_name: {stage: [samples, seconds]}} summed over threads and remote sources."""
+        result = {}
+        sources = [dict(cell) for cell in list(self._cells)] + list(self._remote.values())
+        for source in sources:
+            for bot_name, stages in list(source.items()):
+                bot = result.setdefault(bot_name, {})
+                for stage, (samples, seconds) in list(stages.items()):
+                    entry = bot.setdefault(stage, [0, 0.0])
+                    entry[0] += samples
+                    entry[1] += seconds
+        return result
+
+
+def collapsed_stacks(totals):
+    """Lines of "bot;stage;... microseconds", the input format of flamegraph.pl."""
+    lines = []
+    for bot_name in sorted(totals):
+        frame = bot_name.replace(";", "_").replace(" ", "_")
+        for stage, (_, seconds) in sorted(totals[bot_name].items()):
+            micros = int(round(seconds * 1e6))
+            if micros:
+                lines.append(f"{frame};{stage} {micros}")
+    return lines
+
+
+def write_collapsed(path, totals):
+    with open(path, 'w', encoding='utf-8') as f:
+        for line in collapsed_stacks(totals):
+            f.write(line + "\n")
+
+
+def breakdown(stages):
+    """Per-stage (stage, samples, avg seconds, share of the bot's handler time) rows."""
+    handler_total = sum(seconds for stage, (_, seconds) in stages.items() if stage.startswith("handler;"))
+    rows = []
+    for stage in sorted(stages, key=lambda s: (STAGES.index(s) if s in STAGES else len(STAGES), s)):
+        samples, seconds = stages[stage]
+        share = seconds / handler_total if handler_total and stage.startswith("handler;") else None
+        rows.append((stage, samples, seconds / samples if samples else 0.0, share))
+    return rows
+
+
+PROFILER = StageProfiler()
@@ -0,0 +1,139 @@
+"""Precompiled message routing.
+
+A MessageRouter is built once per config change and never mutated afterwards,
+so workers can swap it in with a single attribute assignment while the
+handler keeps using whichever router it picked up for the current message.
+"""
+from collections import namedtuple
+
+from .automaton import AhoCorasick
+from .badwords import BAD_WORDS
+from .filters import apply_filter
+
+# Message content types handed to the router (TeleBot's handler default)
+ROUTED_CONTENT_TYPES = ["text"]
+
+# kind is one of "filtered", "command", "auto_reply" or "message";
+# key is the filter name, command or trigger that matched.
+Route = namedtuple("Route", ["kind", "key", "response"])
+
+
+def normalize_command(command):
+    """Map "/Start", "start" and "/start@SomeBot" to the same lookup key."""
+    command = (command or "").strip().split("@", 1)[0]
+    return command.lstrip("/").lower()
+
+
+class MessageRouter:
+    """Immutable routing table for one bot: filters, then commands, then auto-replies."""
+
+    def __init__(self, commands=None, auto_replies=None, message_filters=None):
+        self.commands = dict(commands or {})
+        self.auto_replies = dict(auto_replies or {})
+        self.message_filters = dict(message_filters or {})
+
+        self._filters = tuple(name for name, enabled in self.message_filters.items() if enabled)
+        self._command_table = {}
+        for command, response in self.commands.items():
+            key = normalize_command(command)
+            if key and response and key not in self._command_table:
+                self._command_table[key] = (command, response)
+
+        # Triggers are matched case-insensitively, first configured trigger wins
+        self._triggers = [(trig, resp) for trig, resp in self.auto_replies.items() if trig]
+        self._matcher = AhoCorasick([trig.lower() for trig, _ in self._triggers]) if self._triggers else None
+
+    def replace(self, commands=None, auto_replies=None, message_filters=None):
+        """Return a new router with some parts replaced, leaving this one untouched."""
+        return MessageRouter(
+            self.commands if commands is None else commands,
+            self.auto_replies if auto_replies is None else auto_replies,
+            self.message_filters if message_filters is None else message_filters,
+        )
+
+    def route(self, message, bot_username=None, timer=None, bot_name=None):
+        """Route a message; ``timer`` (a profiling StageTimer) is marked after each stage
+        and ``bot_name`` selects the bot's spam counters and word lists."""
+        text = getattr(message, "text", None) or ""
+
+        # Filters
+        for ft in self._filters:
+            try:
+                hit = apply_filter(message, ft, bot_name)
+                if hit:
+                    if timer is not None:
+                        timer.mark("handler;route;filters")
+                    return Route("filtered", ft if hit is True or hit == ft else f"{ft} ({hit})", None)
+            except Exception:
+                continue
+        if timer is not None:
+            timer.mark("handler;route;filters")
+
+        # Commands
+        if text.startswith('/'):
+            word = text.split(None, 1)[0]
+            name, _, target = word.partition("@")
+            if not target or not bot_username or target.lower() == bot_username.lower():
+                entry = self._command_table.get(normalize_command(name))
+                if entry:
+                    if timer is not None:
+                        timer.mark("handler;route;command_lookup")
+                    return Route("command", normalize_command(name), entry[1])
+            if timer is not None:
+                timer.mark("handler;route;command_lookup")
+
+        # Auto-replies
+        if self._matcher is not None and text:
+            index = self._matcher.search(text.lower())
+            if timer is not None:
+                timer.mark("handler;route;auto_reply_scan")
+            if index is not None:
+                trig, resp = self._triggers[index]
+                return Route("auto_reply", trig, resp)
+
+        return Route("message", None, None)
+
+
+class RoutedBotMixin:
+    """Gives a worker ``commands``/``auto_replies``/``message_filters`` attributes
+    backed by a MessageRouter that is rebuilt and swapped whenever one is assigned."""
+
+    router = MessageRouter()
+    bot_username = None
+
+    @property
+    def commands(self):
+        return self.router.commands
+
+    @commands.setter
+    def commands(self, value):
+        self.router = self.router.replace(commands=value or {})
+
+    @property
+    def auto_replies(self):
+        return self.router.auto_replies
+
+    @auto_replies.setter
+    def auto_replies(self, value):
+        self.router = self.router.replace(auto_replies=value or {})
+
+    @property
+    def message_filters(self):
+        return self.router.message_filters
+
+    @message_filters.setter
+    def message_filters(self, value):
+        self.router = self.router.replace(message_filters=value or {})
+        self._configure_filters()
+
+    def update_routing(self, commands=None, auto_replies=None, message_filters=None):
+        """Rebuild the router from new config in one swap."""
+        self.router = self.router.replace(commands, auto_replies, message_filters)
+        if message_filters is not None:
+            self._configure_filters()
+
+    def _configure_filters(self):
+        # Word lists compile in the background; the bot keeps its current list until then
+        spec = self.router.message_filters.get("bad_words")
+        if spec:
+            BAD_WORDS.configure(self.bot_name, spec)
@@ -0,0 +1,333 @@
+"""Rate-limited outbound message queue.
+
+Handlers enqueue replies instead of calling ``reply_to`` inline. A scheduler on
+the async runtime loop drains each bot's queue, honouring Telegram's limits
+with token buckets (per bot and per chat), retrying on HTTP 429 after
+``retry_after`` and sending command replies before auto-replies.
+"""
+import asyncio
+import heapq
+import itertools
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from .metrics import bot_metrics
+from .profiling import PROFILER
+
+# Lower value is sent first
+PRIORITY_COMMAND = 0
+PRIORITY_AUTO_REPLY = 1
+PRIORITY_DEFAULT = 2
+
+# Telegram's documented limits: ~30 messages/s per bot, 1/s per private chat, 20/min per group
+BOT_RATE, BOT_BURST = 30.0, 30
+CHAT_RATE, CHAT_BURST = 1.0, 1
+GROUP_RATE, GROUP_BURST = 20 / 60.0, 3
+
+MAX_ATTEMPTS = 5
+MAX_IN_FLIGHT = 8  # concurrent sends per bot, never more than one per chat
+RETRY_BASE_DELAY = 0.5
+MAX_TRACKED_CHATS = 10000
+
+
+class TokenBucket:
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = float(capacity)
+        self.updated = time.monotonic()
+        self.paused_until = 0.0
+
+    def _refill(self, now):
+        if now > self.updated:
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+
+    def wait_time(self, now):
+        """Seconds until a token is available (0 if one is available now)."""
+        if now < self.paused_until:
+            return self.paused_until - now
+        self._refill(now)
+        if self.tokens >= 1:
+            return 0.0
+        return (1 - self.tokens) / self.rate
+
+    def take(self, now):
+        self._refill(now)
+        self.tokens -= 1
+
+    def pause(self, now, seconds):
+        self.paused_until = max(self.paused_until, now + seconds)
+        self.tokens = 0.0
+        self.updated = now
+
+    def idle(self, now):
+        self._refill(now)
+        return self.tokens >= self.capacity and now >= self.paused_until
+
+
+class OutboundItem:
+    __slots__ = ("priority", "seq", "chat_id", "send", "blocking", "on_error", "enqueued_at", "attempts", "not_before")
+
+    def __init__(self, priority, seq, chat_id, send, blocking, on_error):
+        self.priority = priority
+        self.seq = seq
+        self.chat_id = chat_id
+        self.send = send
+        self.blocking = blocking
+        self.on_error = on_error
+        self.enqueued_at = time.monotonic()
+        self.attempts = 0
+        self.not_before = 0.0
+
+    def __lt__(self, other):
+        return (self.priority, self.seq) < (other.priority, other.seq)
+
+
+class SendStats:
+    """Per-bot counters shown in the bot table."""
+
+    def __init__(self):
+        self.depth = 0
+        self.in_flight = 0
+        self.sent = 0
+        self.failed = 0
+        self.rate_limited = 0
+        self.last_latency = 0.0
+        self.avg_latency = 0.0  # exponentially weighted, seconds
+
+    def record_latency(self, latency):
+        self.last_latency = latency
+        self.avg_latency = latency if self.sent <= 1 else self.avg_latency * 0.9 + latency * 0.1
+
+
+def retry_after(exc):
+    """Return Telegram's retry_after for a 429 error, or None for other errors."""
+    if getattr(exc, "error_code", None) != 429:
+        return None
+    try:
+        return float(exc.result_json["parameters"]["retry_after"])
+    except Exception:
+        return 1.0
+
+
+def is_retryable(exc):
+    # Bot API errors other than 429 (bad request, blocked by user...) won't succeed on retry
+    code = getattr(exc, "error_code", None)
+    return code is None or code == 429 or code >= 500
+
+
+class BotSendQueue:
+    """Pending replies for one bot plus its rate limit state."""
+
+    def __init__(self, bot_name):
+        self.bot_name = bot_name
+        self.heap = []  # items of chats that may be able to send
+        self.deferred = {}  # chat_id -> heap of a parked chat's items
+        self.deferred_count = 0
+        self.heads = {}  # chat_id -> the parked chat's item currently in the shared heap
+        self.timers = []  # (monotonic time, n, chat_id) at which a rate limited chat is looked at again
+        self._timer_seq = itertools.count()
+        self.bot_bucket = TokenBucket(BOT_RATE, BOT_BURST)
+        self.chat_buckets = {}
+        self.busy_chats = set()
+        self.stats = SendStats()
+        self.wakeup = asyncio.Event()
+        self.task = None
+
+    def chat_bucket(self, chat_id):
+        bucket = self.chat_buckets.get(chat_id)
+        if bucket is None:
+            if len(self.chat_buckets) >= MAX_TRACKED_CHATS:
+                self._evict_idle()
+            is_group = isinstance(chat_id, int) and chat_id < 0
+            bucket = TokenBucket(GROUP_RATE, GROUP_BURST) if is_group else TokenBucket(CHAT_RATE, CHAT_BURST)
+            self.chat_buckets[chat_id] = bucket
+        return bucket
+
+    def _evict_idle(self):
+        now = time.monotonic()
+        for chat_id in [c for c, b in self.chat_buckets.items()
+                        if c not in self.busy_chats and c not in self.deferred and b.idle(now)]:
+            del self.chat_buckets[chat_id]
+
+    def __len__(self):
+        return len(self.heap) + self.deferred_count
+
+    def push(self, item):
+        if item.chat_id in self.deferred:
+            self._defer(item)
+        else:
+            heapq.heappush(self.heap, item)
+
+    def next_ready(self, now):
+        """Pop the best item that may be sent now, or return (None, seconds_to_wait).
+
+        A chat that cannot send yet (a send in flight, its rate limit, a retry delay)
+        is parked: its items wait in a heap of their own and only its best item goes
+        back to the shared heap when the chat may send again.
+        """
+        bot_wait = self.bot_bucket.wait_time(now)
+        if bot_wait:
+            return None, bot_wait
+        while self.timers and self.timers[0][0] <= now:
+            _, _, chat_id = heapq.heappop(self.timers)
+            if chat_id not in self.busy_chats:
+                self._resume(chat_id)
+        while self.heap:
+            item = heapq.heappop(self.heap)
+            chat_id = item.chat_id
+            is_head = self.heads.get(chat_id) is item
+            if chat_id in self.busy_chats or (chat_id in self.deferred and not is_head):
+                self._defer(item)
+                continue
+            item_wait = max(item.not_before - now, self.chat_bucket(chat_id).wait_time(now))
+            if item_wait > 0:
+                self._defer(item)
+                heapq.heappush(self.timers, (now + item_wait, next(self._timer_seq), chat_id))
+                continue
+            if is_head:
+                del self.heads[chat_id]
+            return item, 0.0
+        # Busy chats come back through finished(), which wakes the drain loop
+        return None, (self.timers[0][0] - now if self.timers else None)
+
+    def finished(self, chat_id):
+        """A send to ``chat_id`` is over: the chat's next item may compete again."""
+        self.busy_chats.discard(chat_id)
+        self._resume(chat_id)
+
+    def _defer(self, item):
+        if self.heads.get(item.chat_id) is item:
+            del self.heads[item.chat_id]
+        heapq.heappush(self.deferred.setdefault(item.chat_id, []), item)
+        self.deferred_count += 1
+
+    def _resume(self, chat_id):
+        items = self.deferred.get(chat_id)
+        if not items or chat_id in self.heads:
+            return
+        item = heapq.heappop(items)
+        self.deferred_count -= 1
+        if items:
+            self.heads[chat_id] = item
+        else:
+            del self.deferred[chat_id]
+        heapq.heappush(self.heap, item)
+
+
+class SendScheduler:
+    """Drains every bot's BotSendQueue on the async runtime loop."""
+
+    def __init__(self, runtime, executor_workers=16):
+        self.runtime = runtime
+        self.queues = {}
+        self.version = 0  # bumped whenever any queue's stats change, so the GUI can skip idle refreshes
+        self._seq = itertools.count()
+        self._executor = ThreadPoolExecutor(max_workers=executor_workers, thread_name_prefix="easytg-send")
+
+    def submit(self, bot_name, chat_id, send, priority=PRIORITY_DEFAULT, blocking=False, on_error=None):
+        """Queue a reply from any thread.
+
+        ``send`` is called with no arguments. With ``blocking`` it is a plain function
+        run on the sender thread pool (threaded TeleBot); otherwise it returns an awaitable.
+        """
+        item = OutboundItem(priority, next(self._seq), chat_id, send, blocking, on_error)
+        self.runtime.start()
+        self.runtime.loop.call_soon_threadsafe(self._enqueue, bot_name, item)
+
+    def stats(self, bot_name):
+        queue = self.queues.get(bot_name)
+        return queue.stats if queue is not None else None
+
+    def discard(self, bot_name):
+        """Drop a bot's pending replies (used when the bot is deleted)."""
+        queue = self.queues.get(bot_name)
+        if queue is not None and self.runtime.loop is not None:
+            self.runtime.loop.call_soon_threadsafe(self._discard, bot_name)
+
+    def _discard(self, bot_name):
+        queue = self.queues.pop(bot_name, None)
+        if queue is not None and queue.task is not None:
+            queue.task.cancel()
+
+    def _enqueue(self, bot_name, item):
+        queue = self.queues.get(bot_name)
+        if queue is None:
+            queue = self.queues[bot_name] = BotSendQueue(bot_name)
+        if queue.task is None or queue.task.done():
+            queue.task = asyncio.get_running_loop().create_task(self._drain(queue))
+        queue.push(item)
+        queue.stats.depth = len(queue)
+        self.version += 1
+        queue.wakeup.set()
+
+    async def _drain(self, queue):
+        while True:
+            now = time.monotonic()
+            item, wait = queue.next_ready(now) if queue.stats.in_flight < MAX_IN_FLIGHT else (None, None)
+            if item is None:
+                queue.wakeup.clear()
+                try:
+                    await asyncio.wait_for(queue.wakeup.wait(), timeout=wait)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            queue.bot_bucket.take(now)
+            queue.chat_bucket(item.chat_id).take(now)
+            queue.busy_chats.add(item.chat_id)
+            queue.stats.in_flight += 1
+            queue.stats.depth = len(queue)
+            asyncio.get_running_loop().create_task(self._send(queue, item))
+
+    async def _send(self, queue, item):
+        loop = asyncio.get_running_loop()
+        error = None
+        sampled = PROFILER.sampled()
+        started = time.monotonic()
+        try:
+            item.attempts += 1
+            if item.blocking:
+                await loop.run_in_executor(self._executor, item.send)
+            else:
+                await item.send()
+        except Exception as e:
+            error = e
+        finally:
+            queue.finished(item.chat_id)
+            queue.stats.in_flight -= 1
+
+        now = time.monotonic()
+        if sampled:
+            PROFILER.add(queue.bot_name, (("send;queue_wait", started - item.enqueued_at),
+                                          ("send;network", now - started)))
+        if error is None:
+            queue.stats.sent += 1
+            queue.stats.record_latency(now - item.enqueued_at)
+        else:
+            delay = retry_after(error)
+            if delay is not None:
+                queue.stats.rate_limited += 1
+                bot_metrics(queue.bot_name).rate_limited.inc()
+                # Telegram's flood wait holds back the whole bot, not just this chat
+                queue.bot_bucket.pause(now, delay)
+                queue.chat_bucket(item.chat_id).pause(now, delay)
+            elif is_retryable(error):
+                delay = RETRY_BASE_DELAY * (2 ** (item.attempts - 1))
+            if delay is not None and item.attempts < MAX_ATTEMPTS:
+                item.not_before = now + delay
+                queue.push(item)
+            else:
+                queue.stats.failed += 1
+                bot_metrics(queue.bot_name).send_errors.inc()
+                if item.on_error is not None:
+                    try:
+                        item.on_error(error)
+                    except Exception:
+                        pass
+        queue.stats.depth = len(queue)
+        self.version += 1
+        queue.wakeup.set()
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False)
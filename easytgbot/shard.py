@@ -0,0 +1,169 @@
+"""Entry point of a shard process started by ShardSupervisor.
+
+Usage: ``python -m easytgbot.shard <address> <index>`` with the supervisor's
+auth key (hex) on stdin. The shard hosts its bots as AsyncBots on one event
+loop and exits when the supervisor closes the connection.
+"""
+import os
+import sys
+import threading
+import time
+from collections import deque
+from multiprocessing.connection import Client
+
+from .aio_runtime import AsyncBotRuntime, AsyncBot
+from .badwords import BAD_WORDS
+from .metrics import REGISTRY, EXPORT_INTERVAL
+from .offsets import OffsetStore
+from .profiling import PROFILER
+from .sendqueue import SendScheduler
+from .spam import SPAM
+from .transport import TransportConfig, configure_transport
+
+LOG_FLUSH_INTERVAL = 0.05  # seconds between batched log and message sends to the supervisor
+
+
+class ShardHost:
+    def __init__(self, conn):
+        self.conn = conn
+        self.runtime = AsyncBotRuntime()
+        self.send_scheduler = SendScheduler(self.runtime)
+        self.bots = {}
+        self.tokens = {}  # bot_name -> token, kept after "stop" so "remove" can still drop its offset
+        self.offsets = None
+        self._send_lock = threading.Lock()
+        self._logs = deque()
+        self._messages = deque()
+        self._closed = threading.Event()
+
+    def send(self, message):
+        try:
+            with self._send_lock:
+                self.conn.send(message)
+        except (OSError, ValueError):
+            self._closed.set()
+
+    def log(self, level, message):
+        self._logs.append((level, message))
+
+    def message(self, bot_name, data):
+        self._messages.append((bot_name, data))
+
+    def _flush_logs(self):
+        next_metrics = time.monotonic() + EXPORT_INTERVAL
+        while not self._closed.wait(LOG_FLUSH_INTERVAL):
+            batch = []
+            while self._logs:
+                batch.append(self._logs.popleft())
+            if batch:
+                self.send(("logs", batch))
+            batch = []
+            while self._messages:
+                batch.append(self._messages.popleft())
+            if batch:
+                self.send(("messages", batch))
+            if time.monotonic() >= next_metrics:
+                next_metrics += EXPORT_INTERVAL
+                self.send(("metrics", REGISTRY.export()))
+                self.send(("health", {name: bot.health.export() for name, bot in list(self.bots.items())}))
+                if PROFILER.enabled:
+                    self.send(("profile", PROFILER.export()))
+
+    def handle(self, message):
+        kind = message[0]
+        if kind == "configure":
+            _, transport, offsets_path = message
+            configure_transport(TransportConfig.from_settings(transport))
+            if offsets_path and self.offsets is None:
+                self.offsets = OffsetStore(offsets_path, on_error=lambda e: self.log("error", f"Update offsets: {e}"))
+        elif kind == "start":
+            _, name, spec = message
+            bot = self.bots.get(name)
+            if bot is None or bot.token != spec["token"]:
+                if bot is not None:
+                    bot.stop()
+                bot = self.bots[name] = self._create_bot(name, spec)
+            self.tokens[name] = spec["token"]
+            bot.update_routing(spec["commands"], spec["auto_replies"], spec["message_filters"])
+            bot.webhook_url = spec["webhook_url"]
+            bot.dispatch = spec.get("dispatch") or {}
+            bot.start()
+        elif kind in ("stop", "remove"):
+            bot = self.bots.pop(message[1], None)
+            if bot is not None:
+                bot.stop()
+            if kind == "remove":
+                token = self.tokens.pop(message[1], None)
+                if token is not None and self.offsets is not None:
+                    self.offsets.remove(token)
+                REGISTRY.remove(message[1])
+                PROFILER.remove(message[1])
+                SPAM.remove(message[1])
+                BAD_WORDS.remove(message[1])
+        elif kind == "profiling":
+            _, rate, reset = message
+            PROFILER.set_sample_rate(rate)
+            if reset:
+                PROFILER.reset()
+            self.send(("profile", PROFILER.export()))
+        elif kind == "routing":
+            bot = self.bots.get(message[1])
+            if bot is not None:
+                bot.update_routing(*message[2:5])
+        elif kind == "webhook":
+            bot = self.bots.get(message[1])
+            if bot is not None:
+                bot.webhook_url = message[2]
+                bot.apply_webhook(message[2])
+
+    def _create_bot(self, name, spec):
+        bot = AsyncBot(name, spec["token"], spec["admin_id"], self.runtime)
+        # Shards have no webhook server of their own (they would all need the
+        # same public port), so a bot with a webhook_url falls back to polling
+        bot.send_scheduler = self.send_scheduler
+        bot.offsets = self.offsets
+        bot.log_signal.connect(self.log)
+        bot.status_signal.connect(lambda bot_name, status: self.send(("status", bot_name, status)))
+        bot.message_signal.connect(self.message)
+        return bot
+
+    def serve(self):
+        BAD_WORDS.on_error = lambda bot_name, message: self.log("error", f"[{bot_name}] {message}")
+        threading.Thread(target=self._flush_logs, name="easytg-shard-logs", daemon=True).start()
+        try:
+            while True:
+                try:
+                    message = self.conn.recv()
+                except (EOFError, OSError):
+                    break
+                if message[0] == "shutdown":
+                    break
+                try:
+                    self.handle(message)
+                except Exception as e:
+                    self.log("error", f"Shard {os.getpid()} failed to handle {message[0]}: {e}")
+        finally:
+            for bot in self.bots.values():
+                bot.stop()
+            self.runtime.shutdown()
+            self.send_scheduler.shutdown()
+            if self.offsets is not None:
+                self.offsets.close()
+            self._closed.set()
+            if self._logs:
+                self.send(("logs", list(self._logs)))
+            if self._messages:
+                self.send(("messages", list(self._messages)))
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    address, index = argv[0], int(argv[1])
+    authkey = bytes.fromhex(sys.stdin.readline().strip())
+    conn = Client(address, authkey=authkey)
+    conn.send(("hello", index, os.getpid()))
+    ShardHost(conn).serve()
+
+
+if __name__ == "__main__":
+    main()
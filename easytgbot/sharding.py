@@ -0,0 +1,340 @@
+"""Multi-process runtime: bots spread over a pool of shard processes.
+
+Every bot in one process shares one GIL with the GUI, so a busy bot's
+filtering slows down all the others. In process mode each bot is assigned to
+one of N shard processes by consistent hashing of its name, so assignments
+stay put as bots are added and only ~1/N of them move when N changes. A
+shard hosts its bots on an AsyncBotRuntime (see ``easytgbot.shard``) and
+talks to the supervisor over a local authenticated socket: control messages
+go down, logs, status changes and metrics snapshots come back up. A shard that dies is
+restarted on its own and its bots are started again; other shards are not
+touched.
+"""
+import bisect
+import hashlib
+import os
+import secrets
+import subprocess
+import sys
+import threading
+import time
+from multiprocessing.connection import Listener
+
+from .aio_runtime import SignalSet
+from .lifecycle import LifecycleMixin
+from .metrics import REGISTRY
+from .profiling import PROFILER
+from .watchdog import BotHealth
+
+DEFAULT_REPLICAS = 64  # virtual nodes per shard on the hash ring
+RESTART_DELAY = 1.0  # seconds before restarting a crashed shard, doubled per quick crash
+MAX_RESTART_DELAY = 30.0
+STABLE_AFTER = 60.0  # a shard that ran this long resets its restart backoff
+
+
+def default_shard_count():
+    return max(1, os.cpu_count() or 1)
+
+
+def _hash(key):
+    return int.from_bytes(hashlib.md5(key.encode()).digest()[:8], "big")
+
+
+class HashRing:
+    """Consistent hash ring mapping bot names to shard indices."""
+
+    def __init__(self, shard_count, replicas=DEFAULT_REPLICAS):
+        self.shard_count = shard_count
+        points = sorted((_hash(f"shard-{i}#{r}"), i) for i in range(shard_count) for r in range(replicas))
+        self._keys = [p[0] for p in points]
+        self._shards = [p[1] for p in points]
+
+    def shard_for(self, key):
+        i = bisect.bisect(self._keys, _hash(key)) % len(self._keys)
+        return self._shards[i]
+
+
+class ShardedBot(LifecycleMixin):
+    """Parent-side stand-in for a bot running in a shard. Exposes the same interface as BotWorker."""
+
+    def __init__(self, bot_name, token, admin_id, supervisor, signals=None):
+        self.bot_name = bot_name
+        self.token = token
+        self.admin_id = admin_id
+        self.supervisor = supervisor
+        self.webhook_url = None
+        self.auto_replies = {}
+        self.message_filters = {}
+        self.commands = {}
+        self.dispatch = {}
+        self.send_scheduler = None  # the shard has its own
+        self.webhook_server = None
+        self.wanted = False
+        self.health = BotHealth()  # poll stamps come from the shard
+
+        self.signals = signals if signals is not None else SignalSet()
+        self.log_signal = self.signals.log_signal
+        self.status_signal = self.signals.status_signal
+        self.message_signal = self.signals.message_signal
+        supervisor.attach(self)
+
+    @property
+    def running(self):
+        return self.wanted and self.lifecycle != "stopped" and self.supervisor.is_alive(self.bot_name)
+
+    @property
+    def shard(self):
+        return self.supervisor.shard_for(self.bot_name)
+
+    def spec(self):
+        return {
+            "token": self.token,
+            "admin_id": self.admin_id,
+            "webhook_url": self.webhook_url,
+            "commands": self.commands,
+            "auto_replies": self.auto_replies,
+            "message_filters": self.message_filters,
+            "dispatch": self.dispatch,
+        }
+
+    def start(self):
+        if self.wanted and self.lifecycle != "stopped":
+            return
+        self.wanted = True
+        self._set_lifecycle("starting")
+        self.supervisor.send(self.bot_name, ("start", self.bot_name, self.spec()))
+
+    def stop(self):
+        """Ask the host to stop the bot; its "Offline" status settles the lifecycle."""
+        self.wanted = False
+        if self.lifecycle == "stopped":
+            return
+        if not self.supervisor.is_alive(self.bot_name):
+            self._set_lifecycle("stopped")
+            return
+        self._set_lifecycle("stopping")
+        self.supervisor.send(self.bot_name, ("stop", self.bot_name))
+
+    def update_routing(self, commands=None, auto_replies=None, message_filters=None):
+        if commands is not None:
+            self.commands = commands
+        if auto_replies is not None:
+            self.auto_replies = auto_replies
+        if message_filters is not None:
+            self.message_filters = message_filters
+        self.supervisor.send(self.bot_name, ("routing", self.bot_name, self.commands,
+                                             self.auto_replies, self.message_filters))
+
+    def apply_webhook(self, url):
+        self.supervisor.send(self.bot_name, ("webhook", self.bot_name, url))
+
+
+class _Shard:
+    def __init__(self, index):
+        self.index = index
+        self.process = None
+        self.conn = None
+        self.started_at = 0.0
+        self.restart_delay = RESTART_DELAY
+        self.send_lock = threading.Lock()
+
+
+class ShardSupervisor:
+    """Starts the shard processes, routes control messages and restarts shards that die.
+
+    ``on_log(level, message)`` receives every shard's log lines; status and
+    message events go to the matching ShardedBot's signals. Both are called
+    on supervisor threads.
+    """
+
+    def __init__(self, shard_count=None, transport_settings=None, on_log=None, offsets_path=None):
+        self.shard_count = max(1, int(shard_count or default_shard_count()))
+        self.transport_settings = transport_settings or {}
+        self.offsets_path = offsets_path  # shared OffsetStore database; each shard writes its own bots' rows
+        self.on_log = on_log
+        self.ring = HashRing(self.shard_count)
+        self.bots = {}  # bot_name -> ShardedBot
+        self.restarts = 0
+        self._shards = [_Shard(i) for i in range(self.shard_count)]
+        self._authkey = secrets.token_bytes(32)
+        self._listener = None
+        self._lock = threading.Lock()
+        self._stopping = False
+
+    def shard_for(self, bot_name):
+        return self.ring.shard_for(bot_name)
+
+    def attach(self, bot):
+        self.bots[bot.bot_name] = bot
+
+    def remove(self, bot_name):
+        bot = self.bots.pop(bot_name, None)
+        if bot is not None:
+            bot.wanted = False
+            if self._listener is not None:
+                # Also drops the bot's metrics in the shard
+                self.send(bot_name, ("remove", bot_name))
+        REGISTRY.remove(bot_name)
+        PROFILER.remove(bot_name)
+
+    def is_alive(self, bot_name):
+        return self._shards[self.shard_for(bot_name)].conn is not None
+
+    def start(self):
+        with self._lock:
+            if self._listener is not None:
+                return
+            self._stopping = False
+            self._listener = Listener(authkey=self._authkey)
+            threading.Thread(target=self._accept_loop, name="easytg-shard-accept", daemon=True).start()
+            for shard in self._shards:
+                self._spawn(shard)
+
+    def send(self, bot_name, message):
+        """Deliver a control message to the bot's shard. Dropped while the shard is down;
+        the bot's current spec is re-sent when the shard comes back."""
+        self.start()
+        self._send(self._shards[self.shard_for(bot_name)], message)
+
+    def set_transport(self, settings):
+        """Install new transport settings in every shard (and in shards started later)."""
+        self.transport_settings = settings or {}
+        self.broadcast(("configure", self.transport_settings, self.offsets_path))
+
+    def broadcast(self, message):
+        """Send a message to every running shard."""
+        for shard in self._shards:
+            self._send(shard, message)
+
+    def _send(self, shard, message):
+        conn = shard.conn
+        if conn is None:
+            return
+        try:
+            with shard.send_lock:
+                conn.send(message)
+        except (OSError, ValueError):
+            pass  # the reader thread notices the dead shard and restarts it
+
+    def _log(self, level, message):
+        if self.on_log is not None:
+            self.on_log(level, message)
+
+    def _spawn(self, shard):
+        # A fresh interpreter rather than fork(): the parent has Qt and several threads
+        package_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        env = dict(os.environ)
+        env["PYTHONPATH"] = os.pathsep.join(p for p in (package_root, env.get("PYTHONPATH")) if p)
+        shard.process = subprocess.Popen(
+            [sys.executable, "-m", "easytgbot.shard", str(self._listener.address), str(shard.index)],
+            stdin=subprocess.PIPE, env=env)
+        shard.process.stdin.write(self._authkey.hex().encode() + b"\n")
+        shard.process.stdin.close()
+        shard.started_at = time.monotonic()
+
+    def _accept_loop(self):
+        listener = self._listener
+        while not self._stopping:
+            try:
+                conn = listener.accept()
+                hello = conn.recv()
+            except Exception:
+                if self._stopping:
+                    return
+                continue
+            if not (isinstance(hello, tuple) and hello[:1] == ("hello",) and 0 <= hello[1] < self.shard_count):
+                conn.close()
+                continue
+            shard = self._shards[hello[1]]
+            if shard.process is None or shard.process.pid != hello[2]:
+                conn.close()
+                continue
+            shard.conn = conn
+            self._send(shard, ("configure", self.transport_settings, self.offsets_path))
+            self._send(shard, ("profiling", PROFILER.sample_rate, False))
+            for bot in list(self.bots.values()):
+                if bot.wanted and self.shard_for(bot.bot_name) == shard.index:
+                    self._send(shard, ("start", bot.bot_name, bot.spec()))
+            threading.Thread(target=self._read_loop, args=(shard, conn),
+                             name=f"easytg-shard-{shard.index}", daemon=True).start()
+
+    def _read_loop(self, shard, conn):
+        while True:
+            try:
+                message = conn.recv()
+            except (EOFError, OSError):
+                break
+            self._dispatch(shard, message)
+        shard.conn = None
+        conn.close()
+        REGISTRY.drop_remote(f"shard-{shard.index}")
+        PROFILER.drop_remote(f"shard-{shard.index}")
+        if not self._stopping:
+            self._restart(shard)
+
+    def _dispatch(self, shard, message):
+        kind = message[0]
+        if kind == "logs":
+            for level, text in message[1]:
+                self._log(level, text)
+        elif kind == "metrics":
+            REGISTRY.load_remote(f"shard-{shard.index}", message[1])
+        elif kind == "profile":
+            PROFILER.load_remote(f"shard-{shard.index}", message[1])
+        elif kind == "status":
+            bot = self.bots.get(message[1])
+            if bot is not None:
+                # A bot going Offline while still wanted has crashed; the watchdog restarts it
+                bot.observe_status(message[2])
+                bot.status_signal.emit(message[1], message[2])
+        elif kind == "health":
+            for bot_name, exported in message[1].items():
+                bot = self.bots.get(bot_name)
+                if bot is not None:
+                    bot.health.load_remote(exported)
+        elif kind == "messages":
+            for bot_name, data in message[1]:
+                bot = self.bots.get(bot_name)
+                if bot is not None:
+                    bot.message_signal.emit(bot_name, data)
+
+    def _restart(self, shard):
+        code = shard.process.wait() if shard.process is not None else None
+        if time.monotonic() - shard.started_at >= STABLE_AFTER:
+            shard.restart_delay = RESTART_DELAY
+        delay = shard.restart_delay
+        shard.restart_delay = min(MAX_RESTART_DELAY, shard.restart_delay * 2)
+        self.restarts += 1
+        self._log("error", f"Shard {shard.index} exited with code {code}, restarting in {delay:.0f}s")
+        for bot in list(self.bots.values()):
+            if self.shard_for(bot.bot_name) != shard.index:
+                continue
+            if bot.wanted:
+                bot.status_signal.emit(bot.bot_name, "Restarting")
+            elif bot.lifecycle == "stopping":
+                bot._set_lifecycle("stopped")  # went down with the shard
+        time.sleep(delay)
+        with self._lock:
+            if not self._stopping:
+                self._spawn(shard)
+
+    def shutdown(self, timeout=5):
+        with self._lock:
+            if self._listener is None:
+                return
+            self._stopping = True
+        for shard in self._shards:
+            self._send(shard, ("shutdown",))
+        deadline = time.monotonic() + timeout
+        for shard in self._shards:
+            if shard.process is None:
+                continue
+            try:
+                shard.process.wait(max(0.1, deadline - time.monotonic()))
+            except subprocess.TimeoutExpired:
+                shard.process.kill()
+        try:
+            self._listener.close()
+        except OSError:
+            pass
+        self._listener = None
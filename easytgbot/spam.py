@@ -0,0 +1,196 @@
+"""Spam detection: link counting, flood windows and near-duplicate messages.
+
+Each bot has a SpamEngine that looks at every message once, whichever of
+the spam filters ("spam", "links", "flood", "duplicate") are enabled, and
+caches the verdict so a second filter on the same message is a dict hit.
+
+Rates are kept per user and per chat in sliding windows of BUCKETS time
+buckets; a tracked key costs one small list however many messages it
+sends, idle keys are evicted once their window has passed and the number
+of tracked keys is capped. Duplicates are found by comparing a bottom-k
+sketch of rolling-hash shingles with the user's last few messages, so
+"buy now!!" and "buy now!!!" count as the same text.
+"""
+import threading
+import time
+from collections import OrderedDict, deque
+
+BUCKET_SECONDS = 5
+BUCKETS = 6  # window = BUCKETS * BUCKET_SECONDS
+USER_LIMIT = 15  # messages per window from one user
+CHAT_LIMIT = 60  # messages per window in one chat
+LINK_LIMIT = 3  # more URLs than this in one message is spam
+DUPLICATE_LIMIT = 3  # the third near-copy within the window is spam
+DUPLICATE_HISTORY = 8  # recent sketches kept per user
+DUPLICATE_SIMILARITY = 0.8  # estimated Jaccard similarity of two near-copies
+MIN_DUPLICATE_LENGTH = 8  # shorter texts ("ok", "hi") are never duplicates
+MAX_TRACKED = 100000  # users (and chats) tracked per bot
+VERDICT_CACHE_SIZE = 4096
+
+SHINGLE = 5  # characters per shingle
+SKETCH_SIZE = 16  # smallest shingle hashes kept
+MAX_SKETCH_TEXT = 1024  # characters hashed
+_BASE = 257
+_MOD = (1 << 61) - 1
+_SHIFT = pow(_BASE, SHINGLE - 1, _MOD)
+
+URL_ENTITY_TYPES = ("url", "text_link")
+# Filter name -> verdict reasons it blocks
+SPAM_FILTERS = {
+    "spam": ("links", "flood", "chat_flood", "duplicate"),
+    "links": ("links",),
+    "flood": ("flood", "chat_flood"),
+    "duplicate": ("duplicate",),
+}
+
+
+def count_links(message, text):
+    """URLs in a message, from its entities; plain-text fallback for messages without any."""
+    entities = getattr(message, "entities", None) or getattr(message, "caption_entities", None)
+    if entities is not None:
+        return sum(1 for entity in entities if getattr(entity, "type", None) in URL_ENTITY_TYPES)
+    return text.count("http://") + text.count("https://")
+
+
+def sketch(text):
+    """Bottom-k set of rolling hashes over the text's SHINGLE-character windows."""
+    text = " ".join(text.casefold().split())[:MAX_SKETCH_TEXT]
+    if len(text) <= SHINGLE:
+        return frozenset((hash(text),))
+    codes = list(map(ord, text))
+    h = 0
+    for code in codes[:SHINGLE]:
+        h = (h * _BASE + code) % _MOD
+    hashes = {h}
+    for i in range(SHINGLE, len(codes)):
+        h = ((h - codes[i - SHINGLE] * _SHIFT) * _BASE + codes[i]) % _MOD
+        hashes.add(h)
+    if len(hashes) > SKETCH_SIZE:
+        hashes = sorted(hashes)[:SKETCH_SIZE]
+    return frozenset(hashes)
+
+
+def similarity(a, b):
+    """Jaccard similarity of two sketches, estimated over the bottom-k of their union."""
+    union = sorted(a | b)[:SKETCH_SIZE]
+    return sum(1 for h in union if h in a and h in b) / len(union)
+
+
+class WindowCounters:
+    """Sliding-window message counts per key, evicting idle keys and capped at ``capacity``."""
+
+    def __init__(self, capacity=MAX_TRACKED):
+        self.capacity = capacity
+        self.entries = OrderedDict()  # key -> [last_tick, count per bucket..., extra]
+
+    def hit(self, key, tick):
+        """Count one message at ``tick``; returns (messages in the window, entry)."""
+        entries = self.entries
+        entry = entries.get(key)
+        if entry is None:
+            entry = entries[key] = [tick] + [0] * BUCKETS + [None]
+            self._evict(tick)
+        else:
+            entries.move_to_end(key)
+            last = entry[0]
+            if tick > last:
+                for t in range(last + 1, min(tick, last + BUCKETS) + 1):
+                    entry[1 + t % BUCKETS] = 0
+                entry[0] = tick
+            elif tick <= last - BUCKETS:
+                return sum(entry[1:1 + BUCKETS]), entry  # older than the window
+        entry[1 + tick % BUCKETS] += 1
+        return sum(entry[1:1 + BUCKETS]), entry
+
+    def _evict(self, tick):
+        entries = self.entries
+        while entries:
+            key, oldest = next(iter(entries.items()))
+            if len(entries) <= self.capacity and oldest[0] > tick - BUCKETS:
+                break
+            del entries[key]
+
+    def __len__(self):
+        return len(self.entries)
+
+
+class SpamEngine:
+    def __init__(self, user_limit=USER_LIMIT, chat_limit=CHAT_LIMIT, link_limit=LINK_LIMIT,
+                 duplicate_limit=DUPLICATE_LIMIT, capacity=MAX_TRACKED):
+        self.user_limit = user_limit
+        self.chat_limit = chat_limit
+        self.link_limit = link_limit
+        self.duplicate_limit = duplicate_limit
+        self.users = WindowCounters(capacity)
+        self.chats = WindowCounters(capacity)
+        self._verdicts = OrderedDict()  # (chat_id, message_id) -> reason or None
+        self._lock = threading.Lock()  # telebot may run handlers of one bot on several threads
+
+    def check(self, message):
+        """The reason ``message`` is spam ("links", "flood", "chat_flood", "duplicate") or None.
+
+        Counters are updated the first time a message is checked only.
+        """
+        chat_id = getattr(getattr(message, "chat", None), "id", None)
+        key = (chat_id, getattr(message, "message_id", None))
+        with self._lock:
+            try:
+                return self._verdicts[key]
+            except KeyError:
+                pass
+            reason = self._check(message, chat_id)
+            if key[1] is not None:
+                self._verdicts[key] = reason
+                if len(self._verdicts) > VERDICT_CACHE_SIZE:
+                    self._verdicts.popitem(last=False)
+            return reason
+
+    def _check(self, message, chat_id):
+        text = getattr(message, "text", None) or getattr(message, "caption", None) or ""
+        tick = int((getattr(message, "date", None) or time.time()) // BUCKET_SECONDS)
+        user_id = getattr(getattr(message, "from_user", None), "id", None)
+
+        reason = None
+        if count_links(message, text) > self.link_limit:
+            reason = "links"
+        if user_id is not None:
+            count, entry = self.users.hit(user_id, tick)
+            if reason is None and count > self.user_limit:
+                reason = "flood"
+            if len(text) >= MIN_DUPLICATE_LENGTH:
+                recent = entry[-1]
+                if recent is None:
+                    recent = entry[-1] = deque(maxlen=DUPLICATE_HISTORY)
+                current = sketch(text)
+                copies = 1 + sum(1 for seen_tick, seen in recent
+                                 if seen_tick > tick - BUCKETS and similarity(current, seen) >= DUPLICATE_SIMILARITY)
+                recent.append((tick, current))
+                if reason is None and copies >= self.duplicate_limit:
+                    reason = "duplicate"
+        if chat_id is not None:
+            count, _ = self.chats.hit(chat_id, tick)
+            if reason is None and count > self.chat_limit:
+                reason = "chat_flood"
+        return reason
+
+
+class SpamRegistry:
+    def __init__(self):
+        self._engines = {}
+
+    def engine(self, bot_name):
+        engine = self._engines.get(bot_name)
+        if engine is None:
+            engine = self._engines.setdefault(bot_name, SpamEngine())
+        return engine
+
+    def remove(self, bot_name):
+        self._engines.pop(bot_name, None)
+
+
+SPAM = SpamRegistry()
+
+
+def spam_engine(bot_name):
+    """The SpamEngine of ``bot_name`` in this process."""
+    return SPAM.engine(bot_name)
@@ -0,0 +1,52 @@
+"""Cold-start timing behind ``Easytgmanager.py --profile-startup``."""
+import sys
+import time
+from contextlib import contextmanager
+
+
+class StartupProfile:
+    """Records startup phases (durations) and milestones (time since ``origin``).
+
+    Always safe to call; nothing is printed unless ``enabled``.
+    """
+
+    def __init__(self, origin=None, enabled=False, stream=None):
+        self.origin = time.perf_counter() if origin is None else origin
+        self.enabled = enabled
+        self.stream = stream
+        self.phases = []  # (name, seconds)
+        self.milestones = []  # (name, seconds since origin)
+        self.reported = False
+
+    def add_phase(self, name, seconds):
+        self.phases.append((name, seconds))
+
+    @contextmanager
+    def phase(self, name):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add_phase(name, time.perf_counter() - started)
+
+    def milestone(self, name):
+        """Record the first occurrence of ``name``."""
+        if all(existing != name for existing, _ in self.milestones):
+            self.milestones.append((name, time.perf_counter() - self.origin))
+
+    def format(self):
+        lines = ["Startup profile:"]
+        for name, seconds in self.phases:
+            lines.append(f"  {name:<30}{seconds * 1000:9.1f} ms")
+        for name, seconds in self.milestones:
+            lines.append(f"  {name + ' at':<30}{seconds * 1000:9.1f} ms")
+        return "\n".join(lines)
+
+    def report(self):
+        """Print the profile once; returns the text, or None if disabled or already reported."""
+        if not self.enabled or self.reported:
+            return None
+        self.reported = True
+        text = self.format()
+        print(text, file=self.stream or sys.stderr, flush=True)
+        return text
@@ -0,0 +1,155 @@
+"""Process-wide HTTP transport shared by every bot's Bot API calls.
+
+telebot keeps its HTTP plumbing in module globals (``apihelper`` for the
+threaded TeleBot, ``asyncio_helper`` for AsyncTeleBot), so configuring those
+once means every bot reuses the same keep-alive connections instead of
+opening, and TLS-handshaking, its own.
+"""
+import asyncio
+import threading
+
+DEFAULT_BASE_URL = "https://api.telegram.org"
+
+
+class TransportConfig:
+    """Connection pool settings, stored under ``settings.transport`` in bots.easytg."""
+
+    def __init__(self, base_url=DEFAULT_BASE_URL, pool_size=100, per_host_limit=0,
+                 max_connections=1000, keepalive_timeout=60, pool_block=False):
+        self.base_url = (base_url or DEFAULT_BASE_URL).rstrip("/")
+        self.pool_size = pool_size  # connections kept alive per host (threaded runtime)
+        self.per_host_limit = per_host_limit  # concurrent connections per host, 0 = only max_connections (async runtime)
+        self.max_connections = max_connections  # concurrent connections overall (async runtime)
+        self.keepalive_timeout = keepalive_timeout  # seconds an idle connection is kept open
+        self.pool_block = pool_block  # wait for a free pooled connection instead of opening a throwaway one
+
+    @classmethod
+    def from_settings(cls, settings):
+        settings = settings or {}
+        defaults = cls()
+        return cls(
+            base_url=settings.get("base_url") or defaults.base_url,
+            pool_size=int(settings.get("pool_size", defaults.pool_size)),
+            per_host_limit=int(settings.get("per_host_limit", defaults.per_host_limit)),
+            max_connections=int(settings.get("max_connections", defaults.max_connections)),
+            keepalive_timeout=float(settings.get("keepalive_timeout", defaults.keepalive_timeout)),
+            pool_block=bool(settings.get("pool_block", defaults.pool_block)),
+        )
+
+    def to_settings(self):
+        return {
+            "base_url": self.base_url,
+            "pool_size": self.pool_size,
+            "per_host_limit": self.per_host_limit,
+            "max_connections": self.max_connections,
+            "keepalive_timeout": self.keepalive_timeout,
+            "pool_block": self.pool_block,
+        }
+
+    @property
+    def api_url(self):
+        return self.base_url + "/bot{0}/{1}"
+
+    @property
+    def file_url(self):
+        return self.base_url + "/file/bot{0}/{1}"
+
+
+def build_session(config):
+    """A requests.Session with a bounded keep-alive pool, shared by all TeleBot threads."""
+    import requests
+    from requests.adapters import HTTPAdapter
+
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=4, pool_maxsize=config.pool_size,
+                          pool_block=config.pool_block, max_retries=0)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    session.headers["Connection"] = "keep-alive"
+    return session
+
+
+_active = None
+
+
+def configure_transport(config=None):
+    """Install ``config`` as the transport for every TeleBot and AsyncTeleBot in the process.
+
+    Bots created afterwards pick it up; call this before starting workers.
+    """
+    global _active
+    from telebot import apihelper
+
+    config = config or TransportConfig()
+
+    old_session = apihelper.session
+    apihelper.session = build_session(config)
+    apihelper.API_URL = config.api_url
+    apihelper.FILE_URL = config.file_url
+    if old_session is not None:
+        try:
+            old_session.close()
+        except Exception:
+            pass
+
+    try:
+        from telebot import asyncio_helper
+    except ImportError:
+        # AsyncTeleBot needs aiohttp; without it only the threaded runtime is available
+        asyncio_helper = None
+    if asyncio_helper is not None:
+        asyncio_helper.API_URL = config.api_url
+        asyncio_helper.FILE_URL = config.file_url
+        asyncio_helper.REQUEST_LIMIT = config.max_connections
+        old_manager = asyncio_helper.session_manager
+        asyncio_helper.session_manager = _shared_session_manager(asyncio_helper, config)
+        _close_session(old_manager)
+
+    _active = config
+    return config
+
+
+def ensure_transport():
+    """Configure the default transport unless one is already installed."""
+    return _active or configure_transport()
+
+
+def active_transport():
+    return _active
+
+
+def _close_session(manager):
+    """Close a replaced manager's aiohttp sessions (and their pools), each on the loop that created it."""
+    for session, loop in getattr(manager, "sessions", ()):
+        if session.closed or loop.is_closed():
+            continue
+        try:
+            asyncio.run_coroutine_threadsafe(session.close(), loop)
+        except RuntimeError:
+            pass  # the loop is shutting down and closes it itself
+
+
+def _shared_session_manager(asyncio_helper, config):
+    import aiohttp
+
+    class SharedSessionManager(asyncio_helper.SessionManager):
+        """Creates the aiohttp session with per-host limits and keep-alive from the config."""
+
+        def __init__(self):
+            super().__init__()
+            self.sessions = []  # (session, loop): telebot keeps one session per thread
+            self._lock = threading.Lock()
+
+        async def create_session(self):
+            self.session = aiohttp.ClientSession(connector=aiohttp.TCPConnector(
+                limit=config.max_connections,
+                limit_per_host=config.per_host_limit,
+                keepalive_timeout=config.keepalive_timeout,
+                ssl=self.ssl_context,
+            ))
+            with self._lock:
+                self.sessions = [(s, loop) for s, loop in self.sessions if not s.closed]
+                self.sessions.append((self.session, asyncio.get_running_loop()))
+            return self.session
+
+    return SharedSessionManager()
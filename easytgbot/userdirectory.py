@@ -0,0 +1,353 @@
+"""Directory of the users seen by any bot.
+
+Handlers hand every routed message's record to UserDirectory.observe(),
+which only appends to an in-memory queue. Once a second a writer thread
+folds the queue into one row per user (latest profile, message count,
+last seen, bots) and writes those in a single transaction, so a user who
+sends a thousand messages costs one UPDATE. An LRU of recently written
+users lets the writer use a cheap counter UPDATE when the profile has not
+changed, and serves get() without touching the database.
+"""
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict, deque
+
+from .messagestore import connect
+
+FLUSH_INTERVAL = 1.0  # seconds between coalesced writes
+MAX_PENDING = 100000  # queued records before the oldest are dropped
+CACHE_SIZE = 50000  # users kept in the LRU
+PAGE_SIZE = 200
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS users (
+    user_id INTEGER PRIMARY KEY,
+    id_key TEXT NOT NULL,
+    username TEXT,
+    username_key TEXT,
+    first_name TEXT,
+    last_name TEXT,
+    first_seen REAL,
+    last_seen REAL,
+    messages INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS users_id_key ON users (id_key);
+CREATE INDEX IF NOT EXISTS users_username_key ON users (username_key);
+CREATE TABLE IF NOT EXISTS user_bots (
+    user_id INTEGER NOT NULL,
+    bot TEXT NOT NULL,
+    PRIMARY KEY (user_id, bot)
+) WITHOUT ROWID;
+"""
+
+UPSERT = """
+INSERT INTO users (user_id, id_key, username, username_key, first_name, last_name,
+                   first_seen, last_seen, messages)
+VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+ON CONFLICT (user_id) DO UPDATE SET
+    username = excluded.username,
+    username_key = excluded.username_key,
+    first_name = excluded.first_name,
+    last_name = excluded.last_name,
+    first_seen = min(coalesce(first_seen, excluded.first_seen), coalesce(excluded.first_seen, first_seen)),
+    last_seen = max(coalesce(last_seen, excluded.last_seen), coalesce(excluded.last_seen, last_seen)),
+    messages = messages + excluded.messages
+"""
+TOUCH = "UPDATE users SET last_seen = max(coalesce(last_seen, 0), ?), messages = messages + ? WHERE user_id = ?"
+
+COLUMNS = "user_id, username, first_name, last_name, messages, last_seen"
+
+
+def user_directory_path(config_file):
+    return os.path.abspath(config_file) + ".users.db"
+
+
+def search_range(search):
+    """(column, low, high) bounds for an id or @username prefix, or None for no filter."""
+    search = (search or "").strip()
+    if not search:
+        return None
+    if search.isdigit():
+        column = "id_key"
+    else:
+        column, search = "username_key", search.lstrip("@").lower()
+        if not search:
+            return None
+    # Every string with the prefix sorts at or after it and before the prefix with its last char bumped
+    return column, search, search[:-1] + chr(ord(search[-1]) + 1)
+
+
+class UserDirectory:
+    """``observe()`` may be called from any thread; lookups run on the caller's thread."""
+
+    def __init__(self, path, on_error=None, cache_size=CACHE_SIZE):
+        self.path = path
+        self.on_error = on_error  # called with the exception on the writer thread
+        self.cache_size = cache_size
+        self.written = 0  # user rows written
+        self.dropped = 0
+        self.generation = 0  # bumped after every committed write, for views to poll
+        self._pending = deque()
+        self._cond = threading.Condition()
+        self._thread = None
+        self._stopping = False
+        self._busy = False  # the writer has taken ops off the queue but not committed them
+        self._cache = OrderedDict()  # user_id -> {"username", "first_name", "last_name", "bots"}
+        self._cache_lock = threading.Lock()
+        self._reader = None
+        self._reader_lock = threading.Lock()
+
+    def observe(self, bot_name, data):
+        """Queue the sender of one message_record()."""
+        if data.get("user_id") is None:
+            return
+        pending = self._pending
+        if len(pending) >= MAX_PENDING:
+            pending.popleft()
+            self.dropped += 1
+        pending.append(("seen", bot_name, data))
+        if self._thread is None:
+            self._start()
+
+    def add_user(self, user_id, username=None, first_name=None, last_name=None):
+        """Add or edit a user by hand; applied by the writer like any observed message."""
+        self._pending.append(("set", None, {"user_id": int(user_id), "username": username or None,
+                                            "first_name": first_name or None, "last_name": last_name or None}))
+        self._wake()
+
+    def remove_user(self, user_id):
+        self._pending.append(("remove", None, {"user_id": int(user_id)}))
+        self._wake()
+
+    def _wake(self):
+        if self._thread is None:
+            self._start()
+        with self._cond:
+            self._cond.notify()
+
+    def _start(self):
+        with self._cond:
+            if self._thread is not None:
+                return
+            self._stopping = False
+            self._thread = threading.Thread(target=self._run, name="easytg-user-directory", daemon=True)
+            self._thread.start()
+
+    def flush(self, timeout=5):
+        """Wait until everything queued so far is written."""
+        deadline = time.monotonic() + timeout
+        generation = self.generation
+        with self._cond:
+            self._cond.notify()
+        while (self._pending or self._busy) and self._thread is not None and self._thread.is_alive() \
+                and time.monotonic() < deadline:
+            time.sleep(0.01)
+        return self.generation != generation
+
+    def close(self):
+        with self._cond:
+            self._stopping = True
+            self._cond.notify()
+        if self._thread is not None:
+            self._thread.join(10)
+            self._thread = None
+        if self._reader is not None:
+            self._reader.close()
+            self._reader = None
+
+    def _run(self):
+        try:
+            conn = connect(self.path)
+            conn.executescript(SCHEMA)
+        except Exception as e:
+            self._report(e)
+            return
+        try:
+            while True:
+                with self._cond:
+                    if not self._stopping:
+                        self._cond.wait(FLUSH_INTERVAL)
+                    stopping = self._stopping
+                if self._pending:
+                    self._busy = True
+                    try:
+                        self._write(conn)
+                    finally:
+                        self._busy = False
+                if stopping:
+                    return
+        finally:
+            conn.close()
+
+    def _write(self, conn):
+        ops = []
+        pending = self._pending
+        while pending:
+            ops.append(pending.popleft())
+        try:
+            with conn:
+                seen = {}
+                for op, bot_name, data in ops:
+                    if op == "seen":
+                        self._fold(seen, bot_name, data)
+                        continue
+                    # Manual edits apply in order relative to what was seen before them
+                    self._write_seen(conn, seen)
+                    seen = {}
+                    if op == "set":
+                        self._write_user(conn, data["user_id"], data, None, None, 0, ())
+                    else:
+                        conn.execute("DELETE FROM users WHERE user_id = ?", (data["user_id"],))
+                        conn.execute("DELETE FROM user_bots WHERE user_id = ?", (data["user_id"],))
+                        with self._cache_lock:
+                            self._cache.pop(data["user_id"], None)
+                self._write_seen(conn, seen)
+            self.generation += 1
+        except Exception as e:
+            with self._cache_lock:
+                self._cache.clear()  # may hold rows that were rolled back
+            self._report(e)
+
+    @staticmethod
+    def _fold(seen, bot_name, data):
+        user_id = data["user_id"]
+        date = data.get("date") or time.time()
+        entry = seen.get(user_id)
+        if entry is None:
+            seen[user_id] = [data, date, date, 1, {bot_name}]
+        else:
+            entry[0] = data  # latest profile wins
+            entry[1] = min(entry[1], date)
+            entry[2] = max(entry[2], date)
+            entry[3] += 1
+            entry[4].add(bot_name)
+
+    def _write_seen(self, conn, seen):
+        touches = []
+        for user_id, (data, first_seen, last_seen, count, bots) in seen.items():
+            cached = self._cached(user_id)
+            if (cached is not None and cached["username"] == data.get("username")
+                    and cached["first_name"] == data.get("first_name")
+                    and cached["last_name"] == data.get("last_name") and bots <= cached["bots"]):
+                # Nothing but the counters changed: skip the profile columns and their index
+                touches.append((last_seen, count, user_id))
+            else:
+                self._write_user(conn, user_id, data, first_seen, last_seen, count, bots)
+        if touches:
+            conn.executemany(TOUCH, touches)
+        self.written += len(seen)
+
+    def _write_user(self, conn, user_id, data, first_seen, last_seen, count, bots):
+        username = data.get("username")
+        conn.execute(UPSERT, (user_id, str(user_id), username, username.lower() if username else None,
+                              data.get("first_name"), data.get("last_name"), first_seen, last_seen, count))
+        known = set(bots)
+        cached = self._cached(user_id)
+        if cached is not None:
+            known |= cached["bots"]
+            new_bots = set(bots) - cached["bots"]
+        else:
+            new_bots = set(bots)
+            known |= set(self._bots_of(conn, user_id))
+        if new_bots:
+            conn.executemany("INSERT OR IGNORE INTO user_bots (user_id, bot) VALUES (?, ?)",
+                             [(user_id, bot) for bot in new_bots])
+        self._remember(user_id, {"username": username, "first_name": data.get("first_name"),
+                                 "last_name": data.get("last_name"), "bots": frozenset(known)})
+
+    @staticmethod
+    def _bots_of(conn, user_id):
+        return [row[0] for row in conn.execute("SELECT bot FROM user_bots WHERE user_id = ?", (user_id,))]
+
+    def _cached(self, user_id):
+        with self._cache_lock:
+            entry = self._cache.get(user_id)
+            if entry is not None:
+                self._cache.move_to_end(user_id)
+            return entry
+
+    def _remember(self, user_id, entry):
+        with self._cache_lock:
+            self._cache[user_id] = entry
+            self._cache.move_to_end(user_id)
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+
+    def _report(self, e):
+        if self.on_error is not None:
+            try:
+                self.on_error(e)
+            except Exception:
+                pass
+
+    # Lookups
+
+    def _read(self, sql, params):
+        with self._reader_lock:
+            if self._reader is None:
+                if not os.path.exists(self.path):
+                    return []
+                self._reader = connect(self.path)
+            try:
+                return self._reader.execute(sql, params).fetchall()
+            except sqlite3.OperationalError:
+                # Schema not created yet by the writer (fresh database)
+                return []
+
+    def get(self, user_id):
+        """{"username", "first_name", "last_name", "bots"} of a user, or None if never seen."""
+        cached = self._cached(user_id)
+        if cached is not None:
+            return cached
+        rows = self._read("SELECT username, first_name, last_name FROM users WHERE user_id = ?", (user_id,))
+        if not rows:
+            return None
+        bots = self._read("SELECT bot FROM user_bots WHERE user_id = ?", (user_id,))
+        entry = {"username": rows[0][0], "first_name": rows[0][1], "last_name": rows[0][2],
+                 "bots": frozenset(row[0] for row in bots)}
+        self._remember(user_id, entry)
+        return entry
+
+    def count(self, search=None):
+        bounds = search_range(search)
+        if bounds is None:
+            rows = self._read("SELECT count(*) FROM users", ())
+        else:
+            column, low, high = bounds
+            rows = self._read(f"SELECT count(*) FROM users WHERE {column} >= ? AND {column} < ?", (low, high))
+        return rows[0][0] if rows else 0
+
+    def page(self, search=None, offset=0, after=None, limit=PAGE_SIZE):
+        """Users in search order as (sort_key, user_id, username, first_name, last_name,
+        messages, last_seen, bots) tuples.
+
+        Without a search users are ordered by id, otherwise by the searched key. ``after``
+        (the sort_key of the previous page's last row) continues a scan without an OFFSET.
+        """
+        bounds = search_range(search)
+        column = "user_id" if bounds is None else bounds[0]
+        where, params = [], []
+        if bounds is not None:
+            where.append(f"{column} >= ? AND {column} < ?")
+            params.extend(bounds[1:])
+        if after is not None:
+            # Keys are unique except username_key; ties are broken by user_id
+            if column == "username_key":
+                where.append("(username_key, user_id) > (?, ?)")
+                params.extend(after)
+            else:
+                where.append(f"{column} > ?")
+                params.append(after)
+            offset = 0
+        sql = f"SELECT {column}, {COLUMNS}, (SELECT group_concat(bot, ', ') FROM user_bots " \
+              f"WHERE user_bots.user_id = users.user_id) FROM users"
+        if where:
+            sql += " WHERE " + " AND ".join(where)
+        sql += f" ORDER BY {column}" + (", user_id" if column == "username_key" else "") + " LIMIT ? OFFSET ?"
+        params.extend((limit, offset))
+        rows = self._read(sql, params)
+        if column == "username_key":
+            rows = [((row[0], row[1]),) + row[1:] for row in rows]
+        return rows
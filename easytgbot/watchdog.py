@@ -0,0 +1,270 @@
+"""Health probes and automatic restarts for bots that stopped working.
+
+Each bot has a BotHealth. The runtimes stamp it whenever a getUpdates
+returns or an update is queued or handled, which shows whether the bot is
+still moving, also while a full dispatch queue holds up its polling. The
+Watchdog adds an active probe, which shows whether the Bot API answers and
+how fast: every
+PROBE_INTERVAL seconds it sends getMe for every online bot at once, on the
+async runtime's loop. Checking 500 bots therefore takes one round of
+concurrent requests and no extra threads, and never touches the GUI
+thread. From both it derives each bot's state:
+
+- healthy: online, and getMe answered within SLOW_PROBE;
+- degraded: online, but getMe is slow or failed FAILURES_DEGRADED times in a row;
+- stalled: polling, yet no getUpdates returned and no update was queued or handled for STALL_AFTER seconds;
+- crashed: stopped without anybody asking it to.
+
+Stalled and crashed bots are restarted through ``on_restart(bot_name)``.
+The wait before a restart doubles with each consecutive restart, from
+BACKOFF_BASE up to BACKOFF_MAX. A random spread of +/-JITTER stops bots
+that failed together from retrying together. A bot that stays healthy for
+STABLE_AFTER seconds goes back to the shortest wait. Degraded bots are only
+reported: a restart does not make the Bot API answer faster.
+"""
+import asyncio
+import random
+import threading
+import time
+
+TICK = 1.0  # seconds between state checks
+PROBE_INTERVAL = 15.0  # seconds between getMe rounds
+PROBE_TIMEOUT = 10.0  # seconds before a getMe counts as failed
+SLOW_PROBE = 2.0  # getMe round trip (seconds) above which a bot is degraded
+FAILURES_DEGRADED = 2  # failed getMe in a row before a bot is degraded
+# Long-polls return at least every 20-25s, so this much silence means the poll loop is stuck
+STALL_AFTER = 90.0
+BACKOFF_BASE = 5.0  # seconds before the first automatic restart
+BACKOFF_MAX = 300.0
+JITTER = 0.2  # +/- fraction of random spread on every backoff
+STABLE_AFTER = 600.0  # seconds of health that reset the backoff
+START_GRACE = 20.0  # seconds a restarted bot gets before it is judged again
+
+RESTART_STATES = ("stalled", "crashed")
+
+
+class BotHealth:
+    """One bot's health, stamped by its runtime and judged by the Watchdog.
+
+    Outlives the bot's workers, so restarts are counted across them.
+    """
+
+    def __init__(self):
+        self.state = "stopped"
+        self.last_poll = None  # monotonic time of the last returned getUpdates, or queued or handled update
+        self.polling_since = None  # set while the bot long-polls
+        self.rtt = None  # seconds, last answered getMe
+        self.failures = 0  # getMe failures in a row
+        self.error = None  # last getMe error
+        self.restarts = 0  # automatic restarts since the bot was last stable
+        self.total_restarts = 0
+        self.restart_at = None  # monotonic time an automatic restart is due
+        self.grace_until = None
+        self.healthy_since = None
+
+    def polled(self):
+        self.last_poll = time.monotonic()
+
+    def set_polling(self, polling):
+        self.polling_since = time.monotonic() if polling else None
+
+    def probed(self, rtt, error):
+        if error is None:
+            self.rtt, self.failures, self.error = rtt, 0, None
+        else:
+            self.failures += 1
+            self.error = error
+
+    def export(self):
+        """(seconds since the last poll, seconds polling) for the process that watches this bot."""
+        now = time.monotonic()
+        return (None if self.last_poll is None else now - self.last_poll,
+                None if self.polling_since is None else now - self.polling_since)
+
+    def load_remote(self, exported):
+        since_poll, polling_for = exported
+        now = time.monotonic()
+        self.last_poll = None if since_poll is None else now - since_poll
+        self.polling_since = None if polling_for is None else now - polling_for
+
+    def describe(self):
+        """Tooltip text."""
+        now = time.monotonic()
+        parts = [f"Health: {self.state}"]
+        if self.last_poll is not None and self.polling_since is not None:
+            parts.append(f"last getUpdates {now - self.last_poll:.0f}s ago")
+        if self.rtt is not None:
+            parts.append(f"getMe {self.rtt * 1000:.0f} ms")
+        if self.error is not None and self.failures:
+            parts.append(f"{self.failures} failed probe(s): {self.error}")
+        if self.restart_at is not None:
+            parts.append(f"restart in {max(0.0, self.restart_at - now):.0f}s")
+        if self.total_restarts:
+            parts.append(f"{self.total_restarts} automatic restart(s)")
+        return ", ".join(parts)
+
+
+def backoff(restarts):
+    """Seconds to wait before automatic restart number ``restarts + 1``."""
+    delay = min(BACKOFF_MAX, BACKOFF_BASE * 2 ** restarts)
+    return delay * random.uniform(1 - JITTER, 1 + JITTER)
+
+
+class Watchdog:
+    """Probes and judges the bots returned by ``workers()`` on a thread of its own.
+
+    ``workers()`` returns {bot_name: worker} and is called from that thread.
+    ``on_restart(bot_name)`` and ``on_log(level, message)`` are too.
+    """
+
+    def __init__(self, runtime, workers, on_restart, on_log=None, probe_interval=PROBE_INTERVAL):
+        self.runtime = runtime
+        self.workers = workers
+        self.on_restart = on_restart
+        self.on_log = on_log
+        self.probe_interval = probe_interval
+        self.auto_restart = True
+        self.health = {}  # bot_name -> BotHealth
+        self.version = 0  # bumped whenever a state changes
+        self._next_probe = 0.0
+        self._lock = threading.Lock()
+        self._stopping = threading.Event()
+        self._thread = None
+
+    def health_of(self, bot_name):
+        with self._lock:
+            health = self.health.get(bot_name)
+            if health is None:
+                health = self.health[bot_name] = BotHealth()
+            return health
+
+    def remove(self, bot_name):
+        with self._lock:
+            self.health.pop(bot_name, None)
+
+    def start(self):
+        if self._thread is not None:
+            return
+        self._stopping.clear()
+        self._thread = threading.Thread(target=self._run, name="easytg-watchdog", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stopping.set()
+        if self._thread is not None:
+            self._thread.join(PROBE_TIMEOUT + 1)
+            self._thread = None
+
+    def _run(self):
+        while not self._stopping.wait(TICK):
+            try:
+                self.check()
+            except Exception as e:
+                self._log("error", f"Watchdog: {e}")
+
+    def check(self):
+        """One round: probe if due, then judge every bot and schedule or run restarts."""
+        workers = self.workers()
+        now = time.monotonic()
+        if now >= self._next_probe:
+            self._next_probe = now + self.probe_interval
+            online = [(name, worker.token) for name, worker in workers.items() if worker.lifecycle == "online"]
+            for name, (rtt, error) in self._probe(online).items():
+                self.health_of(name).probed(rtt, error)
+            now = time.monotonic()
+        for name, worker in workers.items():
+            self._judge(name, worker, self.health_of(name), now)
+
+    def _probe(self, bots):
+        if not bots:
+            return {}
+        try:
+            from telebot import asyncio_helper  # noqa: F401 (needs aiohttp)
+        except ImportError:
+            return {}
+        future = self.runtime.submit(self._probe_all(bots))
+        try:
+            return future.result(PROBE_TIMEOUT + 1)
+        except Exception:
+            future.cancel()
+            return {}
+
+    async def _probe_all(self, bots):
+        from telebot import asyncio_helper
+
+        async def probe(token):
+            started = time.perf_counter()
+            try:
+                await asyncio.wait_for(asyncio_helper.get_me(token), PROBE_TIMEOUT)
+            except asyncio.TimeoutError:
+                return None, f"no answer in {PROBE_TIMEOUT:.0f}s"
+            except Exception as e:
+                return None, str(e) or type(e).__name__
+            return time.perf_counter() - started, None
+
+        results = await asyncio.gather(*(probe(token) for _, token in bots))
+        return {name: result for (name, _), result in zip(bots, results)}
+
+    def _judge(self, name, worker, health, now):
+        state = self._state(worker, health, now)
+        if health.grace_until is not None:
+            if now < health.grace_until and state != "healthy":
+                return  # a restart is under way
+            health.grace_until = None
+        if state != health.state:
+            self._changed(name, health, state)
+        if state == "healthy":
+            if health.healthy_since is None:
+                health.healthy_since = now
+            elif health.restarts and now - health.healthy_since >= STABLE_AFTER:
+                health.restarts = 0
+        else:
+            health.healthy_since = None
+        if state not in RESTART_STATES or not self.auto_restart:
+            health.restart_at = None
+            return
+        if health.restart_at is None:
+            health.restart_at = now + backoff(health.restarts)
+            self._log("error", f"[{name}] Bot {state}, restarting in {health.restart_at - now:.0f}s")
+        elif now >= health.restart_at:
+            health.restart_at = None
+            health.restarts += 1
+            health.total_restarts += 1
+            health.grace_until = now + START_GRACE
+            health.last_poll = health.polling_since = None
+            self._log("info", f"[{name}] Automatic restart #{health.restarts}")
+            try:
+                self.on_restart(name)
+            except Exception as e:
+                self._log("error", f"[{name}] Automatic restart failed: {e}")
+
+    @staticmethod
+    def _state(worker, health, now):
+        lifecycle = worker.lifecycle
+        if lifecycle == "stopped":
+            return "crashed" if worker.wanted else "stopped"
+        if lifecycle != "online":
+            return lifecycle  # "starting" or "stopping": not judged yet
+        if health.polling_since is not None:
+            last = max(health.last_poll or 0.0, health.polling_since)
+            if now - last > STALL_AFTER:
+                return "stalled"
+        if health.failures >= FAILURES_DEGRADED or (health.rtt is not None and health.rtt > SLOW_PROBE):
+            return "degraded"
+        return "healthy"
+
+    def _changed(self, name, health, state):
+        old, health.state = health.state, state
+        self.version += 1
+        if state == "degraded":
+            detail = health.error if health.failures else f"getMe took {health.rtt:.1f}s"
+            self._log("error", f"[{name}] Bot API degraded: {detail}")
+        elif state == "healthy" and old in ("degraded", "stalled", "crashed"):
+            self._log("info", f"[{name}] Healthy again")
+
+    def _log(self, level, message):
+        if self.on_log is not None:
+            try:
+                self.on_log(level, message)
+            except Exception:
+                pass
@@ -0,0 +1,136 @@
+"""Embedded webhook receiver.
+
+One aiohttp server on the async runtime loop serves every bot in webhook
+mode. Each bot gets its own secret path (the last URL segment) and a secret
+token that Telegram echoes back in ``X-Telegram-Bot-Api-Secret-Token``;
+requests failing either check are rejected before the body is parsed.
+Telegram needs a public HTTPS URL, so in production the bot's ``webhook_url``
+points at a reverse proxy that forwards to this server.
+"""
+import asyncio
+import hashlib
+import hmac
+import inspect
+import json
+
+SECRET_HEADER = "X-Telegram-Bot-Api-Secret-Token"
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8443
+MAX_BODY_SIZE = 1024 * 1024
+
+
+def webhook_path(token):
+    """Stable, unguessable per-bot path segment derived from the bot token."""
+    return hashlib.sha256(("path:" + token).encode()).hexdigest()[:32]
+
+
+def webhook_secret(token):
+    """Secret token for setWebhook; Telegram allows A-Z, a-z, 0-9, _ and -."""
+    return hashlib.sha256(("secret:" + token).encode()).hexdigest()
+
+
+def public_url(base_url, token):
+    return base_url.rstrip("/") + "/" + webhook_path(token)
+
+
+class WebhookServer:
+    """Routes webhook POSTs to the registered bot's dispatch callable."""
+
+    def __init__(self, runtime, host=DEFAULT_HOST, port=DEFAULT_PORT):
+        self.runtime = runtime
+        self.host = host
+        self.port = port
+        self.routes = {}  # path -> (bot_name, secret, dispatch)
+        self.received = 0
+        self.rejected = 0
+        self._runner = None
+        self._start_task = None
+
+    def register(self, bot_name, token, dispatch):
+        """Route updates for ``token`` to ``dispatch(update_dict)``; returns (path, secret).
+
+        ``dispatch`` is called on the runtime loop and may return an awaitable,
+        which is awaited before answering: it only waits until the bot has
+        queued the update, so a bot with a full queue holds back Telegram's
+        next delivery. A result of False (the bot is stopping) answers 503, and
+        Telegram delivers the update again later.
+        The server must also be started, with start() or start_async().
+        """
+        path = webhook_path(token)
+        secret = webhook_secret(token)
+        self.routes[path] = (bot_name, secret, dispatch)
+        return path, secret
+
+    def unregister(self, token):
+        self.routes.pop(webhook_path(token), None)
+
+    def start(self):
+        """Start listening; blocks until bound. Do not call from the runtime loop."""
+        self.runtime.submit(self.start_async()).result()
+
+    async def start_async(self):
+        if self._start_task is None:
+            self._start_task = asyncio.get_running_loop().create_task(self._start())
+        await asyncio.shield(self._start_task)
+
+    def stop(self):
+        if self._start_task is not None and self.runtime.loop is not None:
+            try:
+                self.runtime.submit(self._stop()).result(5)
+            except Exception:
+                pass
+
+    async def _start(self):
+        from aiohttp import web
+
+        app = web.Application(client_max_size=MAX_BODY_SIZE)
+        app.router.add_post("/{tail:.*}", self._handle)
+        self._runner = web.AppRunner(app, access_log=None)
+        try:
+            await self._runner.setup()
+            site = web.TCPSite(self._runner, self.host, self.port)
+            await site.start()
+        except Exception:
+            # Allow a later start() to retry, e.g. once the port is free
+            await self._runner.cleanup()
+            self._runner = None
+            self._start_task = None
+            raise
+        if not self.port:
+            # Port 0 picks a free port; expose the real one
+            self.port = self._runner.addresses[0][1]
+
+    async def _stop(self):
+        if self._runner is not None:
+            await self._runner.cleanup()
+        self._runner = None
+        self._start_task = None
+
+    async def _handle(self, request):
+        from aiohttp import web
+
+        path = request.path.rstrip("/").rsplit("/", 1)[-1]
+        route = self.routes.get(path)
+        if route is None:
+            self.rejected += 1
+            raise web.HTTPNotFound()
+        bot_name, secret, dispatch = route
+        if not hmac.compare_digest(request.headers.get(SECRET_HEADER, ""), secret):
+            self.rejected += 1
+            raise web.HTTPForbidden()
+        try:
+            update = json.loads(await request.read())
+        except ValueError:
+            self.rejected += 1
+            raise web.HTTPBadRequest()
+        if not isinstance(update, dict) or "update_id" not in update:
+            self.rejected += 1
+            raise web.HTTPBadRequest()
+
+        self.received += 1
+        result = dispatch(update)
+        if inspect.isawaitable(result):
+            result = await result
+        if result is False:
+            raise web.HTTPServiceUnavailable()
+        return web.Response(text="ok")
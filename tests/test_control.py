@@ -0,0 +1,106 @@
+import time
+from multiprocessing import AuthenticationError
+
+import pytest
+
+from easytgbot.control import ControlClient, ControlServer, RemoteBot, control_address, load_authkey
+
+
+class FakeManager:
+    """The part of BotManager the control server drives; statuses go straight back to the clients."""
+
+    def __init__(self):
+        self.bots = {}
+        self.calls = []
+        self.server = None
+
+    def status(self):
+        return {name: data.get("status", "Offline") for name, data in self.bots.items()}
+
+    def add_bot(self, name, bot_data):
+        self.bots[name] = bot_data
+        self.calls.append(("add", name))
+
+    def start_bot(self, name):
+        self.calls.append(("start", name))
+        self.bots[name]["status"] = "Online"
+        self.server.publish_status(name, "Online")
+
+    def stop_bot(self, name):
+        self.calls.append(("stop", name))
+        self.bots[name]["status"] = "Offline"
+        self.server.publish_status(name, "Offline")
+
+    def update_routing(self, name, commands, auto_replies, message_filters):
+        self.calls.append(("routing", name, commands))
+
+    def remove_bot(self, name):
+        self.calls.append(("remove", name))
+        self.bots.pop(name, None)
+
+    def _log(self, level, message):
+        self.calls.append(("log", level, message))
+
+
+@pytest.fixture
+def daemon(tmp_path):
+    config_file = str(tmp_path / "bots.easytg")
+    manager = FakeManager()
+    server = manager.server = ControlServer(manager, control_address(config_file), load_authkey(config_file, create=True))
+    server.start()
+    yield config_file, manager, server
+    server.stop()
+
+
+def _wait_for(condition, timeout=5):
+    deadline = time.monotonic() + timeout
+    while not condition() and time.monotonic() < deadline:
+        time.sleep(0.01)
+    return condition()
+
+
+def test_client_starts_and_stops_a_bot_on_the_daemon(daemon):
+    config_file, manager, server = daemon
+    logs = []
+    client = ControlClient.for_config(config_file, on_log=lambda level, message: logs.append(message))
+    bot = RemoteBot("a", "1:x", "", client)
+    client.connect()
+    try:
+        bot.commands = {"/start": "hi"}
+        bot.start()
+        assert bot.wait_online(5)
+        assert bot.running
+        assert manager.bots["a"]["commands"] == {"/start": "hi"}
+
+        bot.update_routing(commands={"/help": "?"})
+        assert _wait_for(lambda: ("routing", "a", {"/help": "?"}) in manager.calls)
+
+        server.publish_log("info", "hello")
+        assert _wait_for(lambda: logs == ["hello"])
+
+        bot.stop()
+        assert bot.wait_stopped(5)
+        assert not bot.running
+    finally:
+        client.close()
+
+
+def test_snapshot_reports_bots_the_daemon_already_runs(daemon):
+    config_file, manager, _ = daemon
+    manager.bots["a"] = {"token": "1:x", "status": "Online"}
+    client = ControlClient.for_config(config_file)
+    bot = RemoteBot("a", "1:x", "", client)
+    client.connect()
+    try:
+        # A fresh bot is "stopped", which would end wait_online() before the snapshot arrives
+        assert _wait_for(lambda: bot.lifecycle == "online")
+        assert bot.wanted
+    finally:
+        client.close()
+
+
+def test_clients_need_the_key(daemon):
+    config_file, _, _ = daemon
+    client = ControlClient(control_address(config_file), b"wrong key")
+    with pytest.raises(AuthenticationError):
+        client.connect()
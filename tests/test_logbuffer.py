@@ -0,0 +1,54 @@
+import pytest
+
+from easytgbot.logbuffer import RingBuffer
+
+
+def test_appends_until_full_then_evicts_the_oldest():
+    buffer = RingBuffer(3)
+    for item in range(5):
+        buffer.append(item)
+    assert len(buffer) == 3
+    assert list(buffer) == [2, 3, 4]
+    assert buffer[0] == 2
+    assert buffer[-1] == 4
+    with pytest.raises(IndexError):
+        buffer[3]
+
+
+def test_overflow_counts_the_items_an_append_would_evict():
+    buffer = RingBuffer(4)
+    buffer.extend([1, 2, 3])
+    assert buffer.overflow(1) == 0
+    assert buffer.overflow(3) == 2
+    assert buffer.overflow(10) == 3  # never more than it holds
+
+
+def test_extend_keeps_only_the_newest_items():
+    buffer = RingBuffer(3)
+    buffer.extend(range(10))
+    assert list(buffer) == [7, 8, 9]
+
+
+def test_drop_oldest_and_clear():
+    buffer = RingBuffer(4)
+    buffer.extend("abcdef")
+    buffer.drop_oldest(2)
+    assert list(buffer) == ["e", "f"]
+    buffer.append("g")
+    assert list(buffer) == ["e", "f", "g"]
+    buffer.drop_oldest(10)
+    assert len(buffer) == 0
+    buffer.extend("xy")
+    buffer.clear()
+    assert list(buffer) == []
+
+
+def test_resize_keeps_the_newest_items():
+    buffer = RingBuffer(5)
+    buffer.extend(range(5))
+    buffer.resize(2)
+    assert buffer.capacity == 2
+    assert list(buffer) == [3, 4]
+    buffer.resize(4)
+    buffer.extend([5, 6])
+    assert list(buffer) == [3, 4, 5, 6]
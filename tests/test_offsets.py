@@ -0,0 +1,138 @@
+import asyncio
+import time
+
+import pytest
+
+from easytgbot import aio_runtime
+from easytgbot.aio_runtime import AsyncBot, AsyncBotRuntime
+from easytgbot.offsets import OffsetStore, UpdateLog
+from easytgbot.transport import TransportConfig, configure_transport
+
+
+def test_claim_skips_running_and_handled_updates():
+    log = UpdateLog()
+    assert log.claim(1)
+    assert not log.claim(1)  # still running
+    log.done(1)
+    assert not log.claim(1)
+    assert log.duplicates == 1  # polled again while running is not a duplicate
+    assert log.acked == 1
+
+
+def test_acked_stays_below_running_and_released_updates():
+    log = UpdateLog()
+    for update_id in (1, 2, 3):
+        assert log.claim(update_id)
+    log.done(1)
+    log.done(3)
+    assert log.acked == 1
+    assert log.resume_offset() == 2
+    log.release(2)
+    assert log.acked == 1  # released: still to be handled
+    assert log.claim(2)  # delivered again
+    log.done(2)
+    assert log.acked == 3
+
+
+def test_polled_forgets_released_updates_telegram_no_longer_holds():
+    log = UpdateLog()
+    for update_id in (1, 2, 3):
+        log.claim(update_id)
+    log.done(1)
+    log.release(2)
+    log.release(3)
+    log.polled(2, [3, 4])  # 2 is gone, 3 comes back
+    assert log.acked == 2
+    log.polled(3, [])
+    assert log.acked == 3
+
+
+def test_handled_updates_after_the_saved_offset_move_polling_on():
+    log = UpdateLog(acked=4, seen=[5, 6], updated=time.time())
+    assert log.resume_offset() == 5
+    assert not log.claim(5)
+    assert not log.claim(6)
+    assert log.resume_offset() == 7
+
+
+def test_old_offsets_are_not_resumed():
+    log = UpdateLog(acked=4, seen=[5], updated=time.time() - 30 * 24 * 3600)
+    assert log.resume_offset() is None
+    assert log.claim(5)
+
+
+def test_store_saves_and_reloads_logs(tmp_path):
+    path = str(tmp_path / "bots.easytg.offsets.db")
+    store = OffsetStore(path)
+    log = store.log("123:abc")
+    for update_id in (10, 11, 12):
+        log.claim(update_id)
+    log.done(10)
+    log.done(12)
+    store.close()
+
+    store = OffsetStore(path)
+    log = store.log("123:other-secret")  # same bot id, new token
+    assert log.acked == 10
+    assert log.claim(11)
+    assert not log.claim(12)
+    store.remove("123:abc")
+    store.close()
+
+    store = OffsetStore(path)
+    assert store.log("123:abc").acked == 0
+    store.close()
+
+
+@pytest.fixture
+def stub_api():
+    from stub_api import StubBotAPI
+    stub = StubBotAPI().start()
+    configure_transport(TransportConfig(base_url=stub.base_url))
+    yield stub
+    stub.stop()
+    configure_transport()
+
+
+def _message(chat_id, text):
+    return {"message": {"message_id": 1, "date": int(time.time()), "text": text, "chat": {"id": chat_id, "type": "private"},
+                        "from": {"id": chat_id, "is_bot": False, "first_name": "x"}}}
+
+
+def _wait_for(condition, timeout):
+    deadline = time.monotonic() + timeout
+    while not condition() and time.monotonic() < deadline:
+        time.sleep(0.05)
+    return condition()
+
+
+def test_updates_cut_off_by_a_stop_are_handled_after_the_restart(stub_api, tmp_path, monkeypatch):
+    handled = []
+
+    async def slow_handler(self, message):
+        await asyncio.sleep(0.3)
+        handled.append(int(message.text))
+
+    monkeypatch.setattr(AsyncBot, "_handle_message", slow_handler)
+    monkeypatch.setattr(aio_runtime, "DRAIN_TIMEOUT", 0.2)
+    runtime = AsyncBotRuntime()
+    store = OffsetStore(str(tmp_path / "offsets.db"))
+    bot = AsyncBot("bot", "7:token", "", runtime)
+    bot.offsets = store
+    try:
+        bot.start()
+        assert bot.wait_online(10)
+        stub_api.inject("7:token", [_message(1, str(i)) for i in range(1, 11)])
+        assert _wait_for(lambda: len(handled) >= 2, 10)
+        bot.stop()  # one chat, so most of the backlog is still queued
+        assert bot.wait_stopped(10)
+        assert len(handled) < 10
+
+        bot.start()
+        assert _wait_for(lambda: len(handled) >= 10, 15)
+        assert sorted(handled) == list(range(1, 11))
+    finally:
+        bot.stop()
+        bot.wait_stopped(10)
+        runtime.shutdown()
+        store.close()
@@ -0,0 +1,63 @@
+from types import SimpleNamespace
+
+from easytgbot.automaton import AhoCorasick
+from easytgbot.routing import MessageRouter, RoutedBotMixin, normalize_command
+
+
+def _message(text):
+    return SimpleNamespace(text=text, entities=None, chat=SimpleNamespace(id=1), from_user=SimpleNamespace(id=1),
+                           message_id=1, date=None)
+
+
+def test_normalize_command():
+    assert normalize_command("/Start") == "start"
+    assert normalize_command("start") == "start"
+    assert normalize_command("/start@SomeBot") == "start"
+
+
+def test_commands_match_case_insensitively_and_only_for_this_bot():
+    router = MessageRouter(commands={"/Start": "hello"})
+    assert router.route(_message("/start now")) == ("command", "start", "hello")
+    assert router.route(_message("/START@MyBot"), bot_username="mybot").kind == "command"
+    assert router.route(_message("/start@OtherBot"), bot_username="mybot").kind == "message"
+    assert router.route(_message("/help")).kind == "message"
+
+
+def test_first_configured_auto_reply_wins():
+    router = MessageRouter(auto_replies={"price": "cheap", "hello": "hi", "hell": "warm"})
+    assert router.route(_message("Hello, what is the PRICE?")) == ("auto_reply", "price", "cheap")
+    assert router.route(_message("well hello")) == ("auto_reply", "hello", "hi")
+    assert router.route(_message("nothing here")).kind == "message"
+
+
+def test_filters_run_before_commands_and_auto_replies():
+    router = MessageRouter(commands={"/start": "hello"}, auto_replies={"start": "x"},
+                           message_filters={"bad_words": True, "spam": False})
+    route = router.route(_message("/start badword1"))
+    assert route.kind == "filtered"
+    assert route.key.startswith("bad_words")
+    assert router.route(_message("/start")).kind == "command"
+
+
+def test_replace_builds_a_new_router():
+    router = MessageRouter(commands={"/a": "1"})
+    replaced = router.replace(auto_replies={"x": "y"})
+    assert replaced is not router
+    assert replaced.commands == {"/a": "1"}
+    assert router.auto_replies == {}
+
+
+def test_assigning_a_part_swaps_the_router():
+    bot = RoutedBotMixin()
+    old = bot.router
+    bot.auto_replies = {"hi": "hello"}
+    assert bot.router is not old
+    assert bot.router.route(_message("oh hi")).kind == "auto_reply"
+    assert RoutedBotMixin.router is old  # the shared default stays empty
+
+
+def test_automaton_finds_every_occurrence():
+    matcher = AhoCorasick(["he", "she", "his", "hers"])
+    assert matcher.search("ushers") == 0
+    assert sorted(matcher.finditer("ushers")) == [(4, 0), (4, 1), (6, 3)]
+    assert matcher.search("xyz") is None
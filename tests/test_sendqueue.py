@@ -0,0 +1,143 @@
+import threading
+import time
+
+import pytest
+
+from easytgbot import sendqueue
+from easytgbot.aio_runtime import AsyncBotRuntime
+from easytgbot.sendqueue import (BotSendQueue, OutboundItem, SendScheduler, TokenBucket,
+                                 PRIORITY_AUTO_REPLY, PRIORITY_COMMAND)
+
+
+def test_token_bucket_waits_for_refill_and_pause():
+    bucket = TokenBucket(rate=2.0, capacity=1)
+    now = bucket.updated
+    assert bucket.wait_time(now) == 0.0
+    bucket.take(now)
+    assert bucket.wait_time(now) == pytest.approx(0.5)
+    assert bucket.wait_time(now + 0.5) == 0.0
+    bucket.pause(now + 0.5, 3)
+    assert bucket.wait_time(now + 1) == pytest.approx(2.5)
+    assert not bucket.idle(now + 1)
+
+
+def _item(seq, chat_id, priority=PRIORITY_AUTO_REPLY):
+    return OutboundItem(priority, seq, chat_id, None, False, None)
+
+
+def test_next_ready_prefers_commands_and_sends_one_at_a_time_per_chat():
+    queue = BotSendQueue("bot")
+    now = time.monotonic() + 0.01
+    queue.push(_item(1, chat_id=1))
+    queue.push(_item(2, chat_id=1, priority=PRIORITY_COMMAND))
+    queue.push(_item(3, chat_id=2))
+
+    item, _ = queue.next_ready(now)
+    assert (item.chat_id, item.seq) == (1, 2)
+    queue.busy_chats.add(1)
+    item, _ = queue.next_ready(now)
+    assert item.seq == 3
+    queue.busy_chats.add(2)
+    assert queue.next_ready(now) == (None, None)  # only chat 1's reply is left, behind its send
+    assert len(queue) == 1
+    queue.finished(1)
+    item, _ = queue.next_ready(now)
+    assert item.seq == 1
+    assert len(queue) == 0
+
+
+def test_next_ready_keeps_a_rate_limited_chats_order():
+    queue = BotSendQueue("bot")
+    now = time.monotonic() + 0.01
+    queue.chat_bucket(1).pause(now, 1.0)
+    for seq in range(5):
+        queue.push(_item(seq, chat_id=1))
+    item, wait = queue.next_ready(now)
+    assert item is None and wait == pytest.approx(1.0)
+    seqs = []
+    later = now + 1.0
+    while len(queue):
+        item, wait = queue.next_ready(later)
+        assert item is not None
+        seqs.append(item.seq)
+        queue.finished(1)
+        later += 1.0
+    assert seqs == [0, 1, 2, 3, 4]
+
+
+class FloodError(Exception):
+    error_code = 429
+    result_json = {"parameters": {"retry_after": 0.05}}
+
+
+class BadRequest(Exception):
+    error_code = 400
+
+
+@pytest.fixture
+def scheduler(monkeypatch):
+    # Chats are not what these tests are about; let them send at once
+    monkeypatch.setattr(sendqueue, "CHAT_RATE", 1000.0)
+    monkeypatch.setattr(sendqueue, "CHAT_BURST", 100)
+    runtime = AsyncBotRuntime()
+    scheduler = SendScheduler(runtime)
+    yield scheduler
+    runtime.shutdown()
+    scheduler.shutdown()
+
+
+def _sender(log, errors=()):
+    errors = list(errors)
+
+    async def send():
+        if errors:
+            raise errors.pop(0)
+        log.append(time.monotonic())
+    return send
+
+
+def _wait_for(condition, timeout=5):
+    deadline = time.monotonic() + timeout
+    while not condition() and time.monotonic() < deadline:
+        time.sleep(0.01)
+    return condition()
+
+
+def test_scheduler_sends_every_reply(scheduler):
+    sent = []
+    for chat_id in range(50):
+        scheduler.submit("bot", chat_id, _sender(sent))
+    assert _wait_for(lambda: len(sent) == 50)
+    assert _wait_for(lambda: scheduler.stats("bot").depth == 0 and scheduler.stats("bot").in_flight == 0)
+    assert scheduler.stats("bot").sent == 50
+
+
+def test_scheduler_retries_after_a_flood_wait(scheduler):
+    sent = []
+    started = time.monotonic()
+    scheduler.submit("bot", 1, _sender(sent, [FloodError()]))
+    assert _wait_for(lambda: sent)
+    assert sent[0] - started >= 0.05
+    stats = scheduler.stats("bot")
+    assert (stats.sent, stats.rate_limited, stats.failed) == (1, 1, 0)
+
+
+def test_scheduler_gives_up_on_errors_that_cannot_succeed(scheduler):
+    failures = []
+    done = threading.Event()
+
+    def on_error(e):
+        failures.append(e)
+        done.set()
+
+    scheduler.submit("bot", 1, _sender([], [BadRequest()]), on_error=on_error)
+    assert done.wait(5)
+    assert isinstance(failures[0], BadRequest)
+    assert scheduler.stats("bot").failed == 1
+
+
+def test_blocking_sends_run_on_the_thread_pool(scheduler):
+    threads = []
+    scheduler.submit("bot", 1, lambda: threads.append(threading.current_thread().name), blocking=True)
+    assert _wait_for(lambda: threads)
+    assert threads[0].startswith("easytg-send")
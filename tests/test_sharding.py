@@ -0,0 +1,20 @@
+from collections import Counter
+
+from easytgbot.sharding import HashRing
+
+
+def test_every_bot_maps_to_a_shard_and_keeps_it():
+    ring = HashRing(4)
+    names = [f"bot{i}" for i in range(2000)]
+    shards = [ring.shard_for(name) for name in names]
+    assert set(shards) == {0, 1, 2, 3}
+    assert shards == [HashRing(4).shard_for(name) for name in names]
+    assert max(Counter(shards).values()) < 2 * len(names) / 4  # roughly even
+
+
+def test_adding_a_shard_only_moves_bots_to_it():
+    names = [f"bot{i}" for i in range(2000)]
+    before, after = HashRing(4), HashRing(5)
+    moved = [name for name in names if before.shard_for(name) != after.shard_for(name)]
+    assert all(after.shard_for(name) == 4 for name in moved)
+    assert len(moved) < len(names) / 2
@@ -0,0 +1,99 @@
+import pytest
+
+from easytgbot.messagestore import connect
+from easytgbot.userdirectory import SCHEMA, UserDirectory, search_range
+
+
+def _record(user_id, username=None, first_name="First", date=1000.0):
+    return {"user_id": user_id, "username": username, "first_name": first_name, "last_name": None, "date": date}
+
+
+@pytest.fixture
+def directory(tmp_path):
+    directory = UserDirectory(str(tmp_path / "users.db"))
+    conn = connect(directory.path)
+    conn.executescript(SCHEMA)
+    # Drives _write() on the test's thread instead of the writer thread
+    directory.write = lambda: directory._write(conn)
+    yield directory
+    conn.close()
+    directory.close()
+
+
+def _queue(directory, op, bot_name, data):
+    directory._pending.append((op, bot_name, data))
+
+
+def _row(directory, user_id):
+    rows = [row for row in directory.page() if row[1] == user_id]
+    return rows[0] if rows else None
+
+
+def test_messages_of_one_user_fold_into_one_row(directory):
+    _queue(directory, "seen", "a", _record(1, "old", date=1000.0))
+    _queue(directory, "seen", "b", _record(1, "New", date=3000.0))
+    _queue(directory, "seen", "a", _record(1, "New", date=2000.0))
+    directory.write()
+    _, user_id, username, first_name, _, messages, last_seen, bots = _row(directory, 1)
+    assert (user_id, username, messages, last_seen) == (1, "New", 3, 3000.0)
+    assert set(bots.split(", ")) == {"a", "b"}
+    assert directory.written == 1
+
+
+def test_later_writes_add_to_the_counters(directory):
+    _queue(directory, "seen", "a", _record(1, "name", date=1000.0))
+    directory.write()
+    _queue(directory, "seen", "a", _record(1, "name", date=5000.0))  # unchanged profile: counter update only
+    _queue(directory, "seen", "a", _record(1, "name", date=4000.0))
+    directory.write()
+    row = _row(directory, 1)
+    assert (row[5], row[6]) == (3, 5000.0)
+
+    directory._cache.clear()  # profile change on a user that is not cached
+    _queue(directory, "seen", "c", _record(1, "renamed", date=6000.0))
+    directory.write()
+    row = _row(directory, 1)
+    assert (row[2], row[5], set(row[7].split(", "))) == ("renamed", 4, {"a", "c"})
+    assert directory.get(1)["bots"] == {"a", "c"}
+
+
+def test_manual_edits_apply_in_order(directory):
+    _queue(directory, "seen", "a", _record(1, "seen"))
+    _queue(directory, "remove", None, {"user_id": 1})
+    _queue(directory, "set", None, {"user_id": 2, "username": "manual", "first_name": None, "last_name": None})
+    _queue(directory, "seen", "a", _record(2, "manual", first_name=None))
+    directory.write()
+    assert _row(directory, 1) is None
+    row = _row(directory, 2)
+    assert (row[2], row[5]) == ("manual", 1)
+
+
+def test_search_by_id_and_username_prefix(directory):
+    for user_id, username in ((12, "alice"), (123, "Alfred"), (45, "bob")):
+        _queue(directory, "seen", "a", _record(user_id, username))
+    directory.write()
+    assert directory.count() == 3
+    assert directory.count("12") == 2
+    assert [row[1] for row in directory.page("@al")] == [123, 12]
+    first = directory.page(limit=2)
+    rest = directory.page(after=first[-1][0])
+    assert [row[1] for row in first + rest] == [12, 45, 123]
+
+
+def test_search_range():
+    assert search_range("") is None
+    assert search_range("@") is None
+    assert search_range("12") == ("id_key", "12", "13")
+    assert search_range("@Bo") == ("username_key", "bo", "bp")
+
+
+def test_observe_is_written_by_the_background_writer(tmp_path):
+    directory = UserDirectory(str(tmp_path / "users.db"))
+    try:
+        directory.observe("a", _record(7, "seven"))
+        directory.observe("a", {"user_id": None})
+        assert directory.flush()
+        assert directory.get(7)["username"] == "seven"
+        assert directory.count() == 1
+    finally:
+        directory.close()